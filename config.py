@@ -3,6 +3,148 @@ import re
 
 LOGLEVEL = logging.DEBUG
 MAX_ENTITY_COUNT = 100
+MAX_BULK_ENTITY_COUNT = 50000
+
+# Replica
+REPLICA_HOST = "wikidatawiki.web.db.svc.wikimedia.cloud"
+REPLICA_DATABASE = "wikidatawiki_p"
+
+# "async" reads through aiomysql on the event loop,
+# "sync" runs the blocking pymysql path in the threadpool
+DB_MODE = "async"
+
+# "rows" fetches one row per revision and aggregates in Python,
+# "grouped" lets the replica count per (page, user) and pick earliest/latest,
+# "stream" reads through an unbuffered cursor and aggregates batch by batch
+FETCH_STRATEGY = "rows"
+STREAM_BATCH_SIZE = 1000
+
+# Entities fetched per chunk when streaming the response with format=ndjson
+NDJSON_CHUNK_SIZE = 10
+
+# POST /revisions/bulk splits the entities into chunks fetched in parallel.
+# "in_list" sends each chunk as page_title IN (...), "temp_table" loads it
+# into a session temporary table and joins on it
+BULK_STRATEGY = "in_list"
+BULK_CHUNK_SIZE = 1000
+BULK_PARALLELISM = 4
+
+# Windows longer than PARTITION_DAYS are split into ranges of that many days,
+# fetched concurrently on up to PARTITION_PARALLELISM connections and merged.
+# Applies to the "rows" strategy, 0 (the default) disables it
+PARTITION_DAYS = 0
+PARTITION_PARALLELISM = 4
+
+# Connection pool
+POOL_MIN_SIZE = 1
+POOL_MAX_SIZE = 10
+POOL_MAX_USES = 1000  # recycle a connection after this many checkouts
+POOL_MAX_LIFETIME = 3600  # seconds before a connection is recycled
+POOL_TIMEOUT = 10  # seconds to wait for a free connection
+
+# Seconds a /revisions request may take. The replica aborts statements past
+# it through max_statement_time, and queries of requests that time out or
+# whose client disconnects are killed. 0 disables the deadline
+REQUEST_DEADLINE = 30
+# The same for POST /revisions/bulk, which streams chunks for as long as it
+# takes by default. A failing chunk ends the stream with an {"error": ...} line
+BULK_DEADLINE = 0
+# Seconds to connect and send KILL QUERY for a cancelled request, on a
+# connection outside the pool since that is often exhausted by then
+KILL_QUERY_TIMEOUT = 2.0
+
+# Cap on concurrent replica queries, adapted between the min and max limit
+# to the observed latency. Queries over it wait up to ADMISSION_QUEUE_TIMEOUT
+# in a queue of ADMISSION_QUEUE_SIZE, then get a 503 with Retry-After
+ADMISSION_CONTROL = True
+ADMISSION_MIN_LIMIT = 2
+ADMISSION_MAX_LIMIT = POOL_MAX_SIZE
+ADMISSION_QUEUE_SIZE = 20
+ADMISSION_QUEUE_TIMEOUT = 1.0  # seconds
+ADMISSION_TOLERANCE = 2.0  # shrink when latency is this many times the baseline
+
+# Response cache
+CACHE_TTL = 60  # seconds
+# Send an ETag from a cheap probe of the revision index, see
+# Read.build_probe_query, and answer If-None-Match with 304 when nothing
+# changed. Costs one probe query per response cache miss, worth it when
+# clients poll
+CONDITIONAL_GET = False
+
+# "memory" keeps the response cache in each worker process, unbounded.
+# "shared" keeps it in a SQLite file on local disk that all workers of the
+# node share, bounded to SHARED_CACHE_MAX_BYTES of compressed responses
+CACHE_BACKEND = "memory"
+SHARED_CACHE_PATH = "response_cache.sqlite"
+SHARED_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Per-entity cache of aggregated results, shares CACHE_TTL. 0 disables it.
+# It keeps models, so while it is on the "rows" strategy cannot serialize
+# without building them
+ENTITY_CACHE_MAX_BYTES = 0
+
+# Identical concurrent /revisions requests share one fetch
+SINGLE_FLIGHT = True
+
+# Incremental mode keeps per-entity aggregation state between polls and only
+# fetches revisions newer than the high-water mark plus the edge that slid out
+INCREMENTAL_MODE = False
+INCREMENTAL_MAX_ENTITIES = 10000
+INCREMENTAL_OVERLAP = 120  # seconds re-read below the high-water mark for late commits
+
+# Resolve entity ids to page ids once and query revision_compat by rev_page
+# without joining page. Set a path to keep the mapping across restarts
+ENTITY_RESOLVER = False
+ENTITY_RESOLVER_MAX_ENTRIES = 1_000_000
+ENTITY_RESOLVER_PATH: str | None = None  # e.g. "entity_pages.sqlite"
+
+# Bot user ids are loaded at startup and refreshed in the background,
+# no_bots then filters on that list instead of a subquery. 0 disables it
+BOT_REGISTRY_REFRESH = 3600  # seconds
+
+# Keep the last REVISION_STORE_RETENTION_DAYS of revisions in a local SQLite
+# file, tailed from the replica by rev_id. Requests whose window it covers
+# are served from it, the others from the replica
+REVISION_STORE = False
+REVISION_STORE_URI = "file:revisions.sqlite"
+REVISION_STORE_RETENTION_DAYS = 8  # more than DEFAULT_WINDOW_DAYS
+REVISION_STORE_INTERVAL = 10  # seconds between ingestion cycles
+REVISION_STORE_BATCH_SIZE = 5000
+REVISION_STORE_OVERLAP_IDS = 1000  # re-read below the high-water mark for late commits
+REVISION_STORE_MAX_LAG = 60  # seconds a window may end past the last sync
+
+# Time the stages of /revisions requests (split, validate, fetch, aggregate,
+# serialize) and count rows, entities, cache hits and pool waits. Reported in
+# a Server-Timing header and as Prometheus histograms on /metrics
+METRICS = False
+
+# Admin endpoints and the profiler need this token in the X-Admin-Token
+# header. None disables them
+ADMIN_TOKEN: str | None = None
+
+# Queries that take longer are kept with their EXPLAIN plan in a ring buffer,
+# see /api/v1/admin/slow-queries. 0 disables the log
+SLOW_QUERY_THRESHOLD = 1.0  # seconds
+SLOW_QUERY_LOG_SIZE = 100
+
+# Seconds between stack samples of a request sent with the X-Profile header
+PROFILER_INTERVAL = 0.005
+
+# GET /revisions/subscribe streams new revisions of an entity set as
+# server-sent events. One poller queries the union of all subscribed entities
+# every SUBSCRIPTION_INTERVAL seconds, re-reading SUBSCRIPTION_OVERLAP seconds
+# for late commits. Subscribers with SUBSCRIPTION_QUEUE_SIZE unread events
+# are dropped, idle streams get a comment every SUBSCRIPTION_KEEPALIVE seconds
+SUBSCRIPTIONS = False
+SUBSCRIPTION_INTERVAL = 60
+SUBSCRIPTION_OVERLAP = 120
+SUBSCRIPTION_MAX_SUBSCRIBERS = 1000
+SUBSCRIPTION_QUEUE_SIZE = 10
+SUBSCRIPTION_KEEPALIVE = 15
+
+# Default date window when start_date/end_date are omitted
+DEFAULT_WINDOW_DAYS = 7
+DEFAULT_WINDOW_BUCKET = 60  # seconds, requests in the same bucket share the window
 
 # Constants
 ENTITY_ID_PATTERN = re.compile(r"^[QLPE]\d+$")
@@ -1,23 +1,72 @@
 import logging
 import os
-from contextlib import asynccontextmanager
-from datetime import datetime, timedelta, timezone
+import time
+from collections.abc import AsyncIterator, Iterable, Iterator
+from contextlib import asynccontextmanager, contextmanager
 from typing import Any
 
-from fastapi import APIRouter, FastAPI, HTTPException, Query
+import orjson
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse
+from fastapi.responses import (
+    JSONResponse,
+    PlainTextResponse,
+    RedirectResponse,
+    Response,
+    StreamingResponse,
+)
 from fastapi_cache import FastAPICache
 from fastapi_cache.backends.inmemory import InMemoryBackend
-from fastapi_cache.decorator import cache
 from pydantic import ValidationError
 
 import config
-from models.aggregator import Aggregator
-from models.read import Read
+from models.admin import require_admin
+from models.admission import AdmissionController, AdmissionStats
+from models.bot_registry import BotRegistry, BotRegistryStats, load_bot_ids
+from models.bulk_request import BulkRequest
+from models.conditional_get import ConditionalGet, ConditionalGetStats, etag_matches
+from models.deadline import run_until_disconnect
+from models.entity_cache import EntityCache, EntityCacheStats
+from models.entity_resolver import EntityResolver, EntityResolverStats
+from models.exceptions import (
+    ClientDisconnectedError,
+    DeadlineExceededError,
+    OverloadedError,
+    PoolTimeoutError,
+)
+from models.fetcher import Fetcher, revisions_adapter
+from models.incremental import IncrementalCache, IncrementalStats
+from models.metrics import Metrics
+from models.pool import AsyncConnectionPool, ConnectionPool, PoolStats
+from models.profiler import ProfilerMiddleware
+from models.projection import Projection, pages_from_revisions
+from models.read import (
+    TEMP_ENTITY_TABLE,
+    open_replica_connection,
+    open_replica_connection_async,
+)
+from models.response_cache import CacheStats, ResponseCache
+from models.revision_store import (
+    ReplicaSource,
+    RevisionIngester,
+    RevisionStore,
+    RevisionStoreStats,
+)
 from models.revisions import Revisions
+from models.shared_cache import SharedCacheBackend, SharedCacheStats
+from models.single_flight import SingleFlight, SingleFlightStats
+from models.slow_query_log import SlowQuery, SlowQueryLog
 from models.splitter import Splitter
-from models.validator import Validator
+from models.subscriptions import (
+    PoolSource,
+    SubscriptionHub,
+    SubscriptionStats,
+    sse_event,
+    subscribed_event,
+)
+from models.timing import TimingMiddleware, count, timed
+from models.validator import BulkValidator, Validator
+from models.window import default_window
 
 if "USER" not in os.environ:
     os.environ["USER"] = "tools.sparql-rc2-backend"
@@ -30,9 +79,175 @@ logger = logging.getLogger(__name__)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # startup code
-    FastAPICache.init(InMemoryBackend())
+    setup_caches(app)
+    setup_request_controls(app)
+    if config.ENTITY_RESOLVER:
+        app.state.entity_resolver = EntityResolver(
+            max_entries=config.ENTITY_RESOLVER_MAX_ENTRIES,
+            path=config.ENTITY_RESOLVER_PATH,
+        )
+        app.state.entity_resolver.open()
+    await setup_pool(app)
+    if config.BOT_REGISTRY_REFRESH:
+        await setup_bot_registry(app)
+    if config.REVISION_STORE:
+        await open_revision_store(app, pool_settings())
+    if config.SUBSCRIPTIONS:
+        setup_subscriptions(app)
     yield
-    # shutdown code (if needed)
+    # shutdown code
+    if config.SUBSCRIPTIONS:
+        await app.state.subscription_hub.stop()
+    if config.REVISION_STORE:
+        await close_revision_store(app)
+    if config.BOT_REGISTRY_REFRESH:
+        await app.state.bot_registry.stop()
+    if config.ENTITY_RESOLVER:
+        app.state.entity_resolver.close()
+    await close_pool(app.state.pool)
+    if config.CACHE_BACKEND == "shared":
+        app.state.shared_cache.close()
+
+
+def setup_caches(app: FastAPI):
+    if config.CACHE_BACKEND == "shared":
+        app.state.shared_cache = SharedCacheBackend(
+            path=config.SHARED_CACHE_PATH, max_bytes=config.SHARED_CACHE_MAX_BYTES
+        )
+        app.state.shared_cache.open()
+        FastAPICache.init(app.state.shared_cache)
+    else:
+        FastAPICache.init(InMemoryBackend())
+    app.state.response_cache = ResponseCache(
+        backend=FastAPICache.get_backend(), expire=config.CACHE_TTL
+    )
+    if config.ENTITY_CACHE_MAX_BYTES:
+        app.state.entity_cache = EntityCache(
+            max_bytes=config.ENTITY_CACHE_MAX_BYTES, expire=config.CACHE_TTL
+        )
+    if config.INCREMENTAL_MODE:
+        app.state.incremental_cache = IncrementalCache(
+            max_entities=config.INCREMENTAL_MAX_ENTITIES,
+            overlap=config.INCREMENTAL_OVERLAP,
+        )
+
+
+def setup_request_controls(app: FastAPI):
+    """Metrics, coalescing, admission control and the other per request
+    features that need no connection"""
+    if config.METRICS:
+        app.state.metrics = Metrics()
+    if config.SINGLE_FLIGHT:
+        app.state.single_flight = SingleFlight()
+    if config.ADMISSION_CONTROL:
+        app.state.admission = AdmissionController(
+            min_limit=config.ADMISSION_MIN_LIMIT,
+            max_limit=config.ADMISSION_MAX_LIMIT,
+            max_queue=config.ADMISSION_QUEUE_SIZE,
+            queue_timeout=config.ADMISSION_QUEUE_TIMEOUT,
+            tolerance=config.ADMISSION_TOLERANCE,
+        )
+    if config.CONDITIONAL_GET:
+        app.state.conditional_get = ConditionalGet()
+    if config.SLOW_QUERY_THRESHOLD:
+        app.state.slow_query_log = SlowQueryLog(
+            threshold=config.SLOW_QUERY_THRESHOLD,
+            max_entries=config.SLOW_QUERY_LOG_SIZE,
+        )
+
+
+def pool_settings() -> dict[str, Any]:
+    return {
+        "min_size": config.POOL_MIN_SIZE,
+        "max_size": config.POOL_MAX_SIZE,
+        "max_uses": config.POOL_MAX_USES,
+        "max_lifetime": config.POOL_MAX_LIFETIME,
+        "timeout": config.POOL_TIMEOUT,
+    }
+
+
+async def setup_pool(app: FastAPI):
+    if config.DB_MODE == "async":
+        app.state.pool = AsyncConnectionPool(
+            connect=open_replica_connection_async, **pool_settings()
+        )
+        await app.state.pool.open()
+    else:
+        app.state.pool = ConnectionPool(
+            connect=open_replica_connection, **pool_settings()
+        )
+        app.state.pool.open()
+
+
+async def close_pool(pool: ConnectionPool | AsyncConnectionPool):
+    if isinstance(pool, AsyncConnectionPool):
+        await pool.close()
+    else:
+        pool.close()
+
+
+async def setup_bot_registry(app: FastAPI):
+    app.state.bot_registry = BotRegistry(
+        load=lambda: load_bot_ids(app.state.pool),
+        interval=config.BOT_REGISTRY_REFRESH,
+    )
+    await app.state.bot_registry.refresh()
+    app.state.bot_registry.start()
+
+
+def setup_subscriptions(app: FastAPI):
+    app.state.subscription_hub = SubscriptionHub(
+        source=PoolSource(
+            pool=app.state.pool,
+            resolver=getattr(app.state, "entity_resolver", None),
+            chunk_size=config.BULK_CHUNK_SIZE,
+        ),
+        load_bots=lambda: subscription_bot_ids(app),
+        interval=config.SUBSCRIPTION_INTERVAL,
+        overlap=config.SUBSCRIPTION_OVERLAP,
+        max_subscribers=config.SUBSCRIPTION_MAX_SUBSCRIBERS,
+        queue_size=config.SUBSCRIPTION_QUEUE_SIZE,
+    )
+    app.state.subscription_hub.start()
+
+
+async def subscription_bot_ids(app: FastAPI) -> Iterable[int]:
+    """The registry's bot ids, loaded on demand without a registry"""
+    bot_registry: BotRegistry | None = getattr(app.state, "bot_registry", None)
+    if bot_registry is not None and bot_registry.ids is not None:
+        return bot_registry.ids
+    return await load_bot_ids(app.state.pool)
+
+
+async def open_revision_store(app: FastAPI, pool_settings: dict[str, Any]):
+    store = RevisionStore(
+        uri=config.REVISION_STORE_URI, max_lag=config.REVISION_STORE_MAX_LAG
+    )
+    store.open()
+    app.state.revision_store = store
+    if config.DB_MODE == "async":
+        app.state.store_pool = AsyncConnectionPool(
+            connect=store.connect_async, **pool_settings
+        )
+        await app.state.store_pool.open()
+    else:
+        app.state.store_pool = ConnectionPool(connect=store.connect, **pool_settings)
+        app.state.store_pool.open()
+    app.state.revision_ingester = RevisionIngester(
+        store=store,
+        source=ReplicaSource(pool=app.state.pool),
+        interval=config.REVISION_STORE_INTERVAL,
+        batch_size=config.REVISION_STORE_BATCH_SIZE,
+        overlap_ids=config.REVISION_STORE_OVERLAP_IDS,
+        retention_days=config.REVISION_STORE_RETENTION_DAYS,
+    )
+    app.state.revision_ingester.start()
+
+
+async def close_revision_store(app: FastAPI):
+    await app.state.revision_ingester.stop()
+    await close_pool(app.state.store_pool)
+    app.state.revision_store.close()
 
 
 app = FastAPI(title="sparql-rc2-backend", lifespan=lifespan, version="0.2.0")
@@ -40,12 +255,27 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # or list of allowed origins
     allow_credentials=False,
-    allow_methods=["GET"],
+    allow_methods=["GET", "POST"],
     allow_headers=["*"],
 )
+app.add_middleware(TimingMiddleware)
+app.add_middleware(ProfilerMiddleware)
 api_router = APIRouter(prefix="/api/v1")
 
 
+class RevisionsResponse(JSONResponse):
+    """A JSON body that is already serialized, or a list of Revisions
+
+    Returning a Response skips FastAPI's response_model validation and
+    jsonable_encoder. Used as response_class the route keeps its
+    response_model in the OpenAPI schema."""
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return revisions_adapter.dump_json(content)
+
+
 def sanitize_errors(errors: Any) -> list[Any]:
     sanitized_errors_ = []
     for error in errors.errors():
@@ -59,20 +289,21 @@ def sanitize_errors(errors: Any) -> list[Any]:
     return sanitized_errors_
 
 
-@cache(expire=60)
-@api_router.get("/revisions", response_model=list[Revisions])
-def get_revisions(
+@api_router.get(
+    "/revisions", response_model=list[Revisions], response_class=RevisionsResponse
+)
+async def get_revisions(
+    request: Request,
+    *,
     entities: str = Query(
         ..., description="Comma-separated list of entity IDs, e.g. Q42,L1"
     ),
-    start_date: str = Query(
-        default=(datetime.now(timezone.utc) - timedelta(days=7)).strftime(
-            "%Y%m%d%H%M%S"
-        ),
+    start_date: str | None = Query(
+        default=None,
         description='Start of the revision date range in "YYYYMMDDHHMMSS" or "YYYYMMDD" format. Defaults to 7 days before the current UTC time.',
     ),
-    end_date: str = Query(
-        default=datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S"),
+    end_date: str | None = Query(
+        default=None,
         description='Start of the revision date range in "YYYYMMDDHHMMSS" or "YYYYMMDD" format. Defaults to the current UTC time.',
     ),
     no_bots: bool = Query(
@@ -86,6 +317,16 @@ def get_revisions(
         default="",
         description="Comma-separated list of usernames to exclude, e.g. User1,User2",
     ),
+    output_format: str = Query(
+        default="json",
+        alias="format",
+        pattern="^(json|ndjson|columns)$",
+        description='"json" for one array, "ndjson" to stream one Revisions object per line or "columns" for one array per field',
+    ),
+    fields: str = Query(
+        default="",
+        description="Comma-separated list of fields to return, e.g. entity_id,latest.rev_id,user_count",
+    ),
 ):
     """
     Retrieve and aggregate revision data for one or more entities within a specified date range.
@@ -110,6 +351,13 @@ def get_revisions(
     * only_unpatrolled (bool, optional): If True, revisions that are patrolled are excluded. Defaults to False.
     * exclude_users (str, optional): Comma-separated list of usernames to exclude
                     (e.g., "User1,User2"). Defaults to an empty string (no exclusions).
+    * format (str, optional): "json" (default) or "ndjson". With "ndjson" the entities are
+                    fetched in chunks and each Revisions object is streamed as its own line
+                    as soon as its chunk is aggregated. With "columns" the response is one
+                    object with an array per field and the usernames interned.
+    * fields (str, optional): Comma-separated list of fields to return. Fields of earliest and
+                    latest are selected with a dot, e.g. latest.rev_id. user_count and
+                    edit_count give the number of users and of revisions without the users list.
 
     Returns:
     * list[Revisions]: A list of aggregated revision objects matching the query parameters.
@@ -120,50 +368,542 @@ def get_revisions(
     Examples:
     * GET /api/v1/revisions?entities=Q42,L1&start_date=20250701000000&end_date=20250707235959&no_bots=true&exclude_users=So9q -> 200
     * GET /api/v1/revisions?entities=Q42;L1&start_date=20250701000000&end_date=20250707235959&no_bots=true -> 422
+    * GET /api/v1/revisions?entities=Q42,L1&fields=entity_id,latest.rev_id,user_count&format=columns -> 200
 
-    Caching: This endpoint is using an in-memory cached with a
-    timeout of 60s because the underlying data is not changing very often.
+    Caching: Responses are cached for CACHE_TTL seconds (60s by default) because
+    the underlying data is not changing very often. The default date window is
+    rounded to the minute so that clients asking for the last 7 days share hits.
+    With CONDITIONAL_GET responses carry an ETag and If-None-Match is answered
+    with 304 when the revisions did not change.
     """
     # Step 1: split entities string → list
     try:
-        entity_splitter = Splitter(string=entities)
-        entity_splitter.split_comma_separated_string()
-        user_splitter = Splitter(string=exclude_users)
-        user_splitter.split_comma_separated_string()
+        with timed("split"):
+            entity_splitter = Splitter(string=entities)
+            entity_splitter.split_comma_separated_string()
+            user_splitter = Splitter(string=exclude_users)
+            user_splitter.split_comma_separated_string()
+            field_splitter = Splitter(string=fields)
+            field_splitter.split_comma_separated_string()
     except ValidationError as e:
         # Forward the error to the user with status 422
         raise HTTPException(status_code=422, detail=sanitize_errors(e)) from e
     # Step 2: validate all input (entities already split)
+    default_start, default_end = default_window()
+    if start_date is None:
+        start_date = default_start
+    if end_date is None:
+        end_date = default_end
     try:
-        params = Validator(
-            entities=entity_splitter.list_,
-            start_date=start_date,
-            end_date=end_date,
-            no_bots=no_bots,
-            only_unpatrolled=only_unpatrolled,
-            exclude_users=user_splitter.list_,
+        with timed("validate"):
+            params = Validator(
+                entities=entity_splitter.list_,
+                start_date=start_date,
+                end_date=end_date,
+                no_bots=no_bots,
+                only_unpatrolled=only_unpatrolled,
+                exclude_users=user_splitter.list_,
+            )
+            projection = make_projection(field_splitter.list_, output_format)
+    except ValidationError as e:
+        # Forward the error to the user with status 422
+        raise HTTPException(status_code=422, detail=sanitize_errors(e)) from e
+    count("entities", len(params.entities))
+
+    fetcher = make_fetcher(request=request, params=params)
+    if output_format == "ndjson":
+        return await ndjson_response(
+            fetcher.iter_fetch(chunk_size=config.NDJSON_CHUNK_SIZE), projection
         )
+    variant = projection.key if projection is not None else ""
+
+    # Step 3: serve from the response cache or fetch with a pooled connection
+    response_cache: ResponseCache | None = getattr(
+        request.app.state, "response_cache", None
+    )
+    cache_key = response_cache.key(params, variant) if response_cache else ""
+    if response_cache is not None:
+        cached = await cached_response(request, response_cache, cache_key)
+        if cached is not None:
+            return cached
+
+    # Step 3b: answer 304 if the freshness probe shows nothing changed
+    etag = await probe_etag(request, fetcher, variant)
+    unchanged = not_modified_response(request, etag)
+    if unchanged is not None:
+        return unchanged
+
+    # Step 4: fetch the entities missing from the entity cache and aggregate.
+    # Identical requests arriving meanwhile wait for this fetch
+    async def fetch() -> tuple[bytes, float]:
+        with fetch_errors():
+            body_ = await fetcher.fetch_json(projection)
+        count("entity_cache_hits", fetcher.entity_hits)
+        count("entity_cache_misses", fetcher.entity_misses)
+        return body_, fetcher.entity_hit_ratio
+
+    single_flight: SingleFlight | None = getattr(
+        request.app.state, "single_flight", None
+    )
+    shared = (
+        fetch()
+        if single_flight is None
+        else single_flight.run(ResponseCache.canonical_key(params, variant), fetch)
+    )
+    # Cancel the fetch if the client goes away or time runs out
+    with fetch_errors():
+        body, entity_hit_ratio = await run_until_disconnect(
+            shared, request.receive, fetcher.deadline
+        )
+    if response_cache is not None:
+        await response_cache.set(cache_key, body, etag=etag)
+    return revisions_response(
+        body,
+        etag,
+        {"X-Cache": "MISS", "X-Entity-Cache-Hit-Ratio": f"{entity_hit_ratio:.2f}"},
+    )
+
+
+def make_projection(fields: list[str], output_format: str) -> None | Projection:
+    """None without fields and columns, the full Revisions are serialized"""
+    if not fields and output_format != "columns":
+        return None
+    return Projection(fields=fields, columnar=output_format == "columns")
+
+
+async def cached_response(
+    request: Request, response_cache: ResponseCache, cache_key: str
+) -> None | Response:
+    """The cached response, or a 304 if the ETag it was sent with matches"""
+    cached = await response_cache.get_entry(cache_key)
+    if cached is None:
+        return None
+    count("response_cache_hits")
+    body, etag = cached
+    unchanged = not_modified_response(request, etag)
+    if unchanged is not None:
+        return unchanged
+    return revisions_response(body, etag, {"X-Cache": "HIT"})
+
+
+def revisions_response(
+    body: bytes, etag: None | str, headers: dict[str, str]
+) -> RevisionsResponse:
+    if etag is not None:
+        headers["ETag"] = etag
+    return RevisionsResponse(body, headers=headers)
+
+
+async def probe_etag(request: Request, fetcher: Fetcher, variant: str) -> None | str:
+    """The ETag from the freshness probe, None without CONDITIONAL_GET"""
+    conditional_get: ConditionalGet | None = getattr(
+        request.app.state, "conditional_get", None
+    )
+    if conditional_get is None:
+        return None
+    with fetch_errors():
+        return await run_until_disconnect(
+            conditional_get.probe(fetcher, variant), request.receive, fetcher.deadline
+        )
+
+
+def not_modified_response(request: Request, etag: None | str) -> None | Response:
+    """A 304 if the request is conditional and etag matches If-None-Match"""
+    conditional_get: ConditionalGet | None = getattr(
+        request.app.state, "conditional_get", None
+    )
+    if_none_match = request.headers.get("If-None-Match")
+    if etag is None or conditional_get is None or not if_none_match:
+        return None
+    if not_modified(conditional_get, if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
+
+
+def not_modified(
+    conditional_get: ConditionalGet, if_none_match: str, etag: str
+) -> bool:
+    """Whether a conditional request gets a 304, recorded for the stats"""
+    matches = etag_matches(if_none_match, etag)
+    conditional_get.record(not_modified=matches)
+    if matches:
+        count("not_modified")
+    return matches
+
+
+@contextmanager
+def fetch_errors() -> Iterator[None]:
+    """Map errors from fetching and aggregating to HTTP errors"""
+    try:
+        yield
+    except PoolTimeoutError as e:
+        raise HTTPException(
+            status_code=503, detail="No database connection available"
+        ) from e
+    except OverloadedError as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many queries, try again later",
+            headers={"Retry-After": str(e.retry_after)},
+        ) from e
+    except DeadlineExceededError as e:
+        raise HTTPException(
+            status_code=504,
+            detail=f"Request took longer than {config.REQUEST_DEADLINE}s",
+        ) from e
+    except ClientDisconnectedError as e:
+        # Nobody reads this, nginx logs it as 499
+        raise HTTPException(status_code=499, detail="Client disconnected") from e
     except ValidationError as e:
         # Forward the error to the user with status 422
         raise HTTPException(status_code=422, detail=sanitize_errors(e)) from e
 
-    # Step 3: instantiate Read with params (assuming you changed Read to accept params)
-    read = Read(params=params)
+
+def make_fetcher(
+    request: Request, params: Validator, deadline: None | float = None
+) -> Fetcher:
+    """deadline is the seconds the request may take, by default
+    REQUEST_DEADLINE, 0 for no deadline"""
+    seconds = config.REQUEST_DEADLINE if deadline is None else deadline
+    bot_registry: BotRegistry | None = getattr(request.app.state, "bot_registry", None)
+    pool = getattr(request.app.state, "pool", None)
+    # Only queries to the replica are admission controlled
+    admission = getattr(request.app.state, "admission", None)
+    revision_store: RevisionStore | None = getattr(
+        request.app.state, "revision_store", None
+    )
+    if revision_store is not None:
+        if revision_store.covers(params.start_date, params.end_date):
+            pool = request.app.state.store_pool
+            admission = None
+            revision_store.record(served=1)
+        else:
+            revision_store.record(fallbacks=1)
+    return Fetcher(
+        params=params,
+        pool=pool,
+        entity_cache=getattr(request.app.state, "entity_cache", None),
+        incremental_cache=getattr(request.app.state, "incremental_cache", None),
+        bot_ids=bot_registry.ids if bot_registry is not None else None,
+        resolver=getattr(request.app.state, "entity_resolver", None),
+        slow_query_log=getattr(request.app.state, "slow_query_log", None),
+        deadline=time.monotonic() + seconds if seconds else None,
+        admission=admission,
+    )
+
+
+async def ndjson_response(
+    chunks: AsyncIterator[list[Revisions]], projection: None | Projection = None
+) -> StreamingResponse:
+    """Stream one Revisions per line, chunk by chunk, only the fields of
+    projection if given. The first chunk is fetched before responding so
+    that its errors still get a status code, later errors end the stream
+    with an {"error": {"status_code": ..., "detail": ...}} line."""
+    with fetch_errors():
+        first = await anext(chunks, [])
+
+    def chunk_lines(chunk: list[Revisions]) -> Iterator[bytes]:
+        if projection is None:
+            for revisions in chunk:
+                yield revisions.model_dump_json().encode() + b"\n"
+            return
+        for obj in projection.objects(pages_from_revisions(chunk)):
+            yield orjson.dumps(obj) + b"\n"
+
+    async def lines() -> AsyncIterator[bytes]:
+        for line in chunk_lines(first):
+            yield line
+        try:
+            with fetch_errors():
+                async for chunk in chunks:
+                    for line in chunk_lines(chunk):
+                        yield line
+        except HTTPException as e:
+            # The 200 is sent already, without this line a client could not
+            # tell a truncated stream from a complete one
+            error = {"status_code": e.status_code, "detail": e.detail}
+            yield orjson.dumps({"error": error}) + b"\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@api_router.post(
+    "/revisions/bulk",
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            "content": {"application/x-ndjson": {}},
+            "description": "One Revisions object per line",
+        }
+    },
+)
+async def post_revisions_bulk(request: Request, body: BulkRequest):
+    """
+    Like GET /revisions but for up to MAX_BULK_ENTITY_COUNT entities sent as a JSON body.
+
+    The entities are split into chunks of BULK_CHUNK_SIZE that are fetched in
+    parallel on separate connections. Each chunk is either sent as an IN list or
+    loaded into a session temporary table and joined on, see BULK_STRATEGY.
+    Results are streamed as NDJSON, one Revisions object per line, in the order
+    the chunks complete. BULK_DEADLINE applies instead of REQUEST_DEADLINE, if
+    a chunk fails after streaming started the last line is {"error": ...}.
+
+    Examples:
+    * POST /api/v1/revisions/bulk {"entities": ["Q1", "Q2", ...], "no_bots": true} -> 200
+    """
+    default_start, default_end = default_window()
     try:
-        revisions = read.fetch_revisions()
-    finally:
-        read.close()
+        params = BulkValidator(
+            entities=body.entities,
+            start_date=body.start_date or default_start,
+            end_date=body.end_date or default_end,
+            no_bots=body.no_bots,
+            only_unpatrolled=body.only_unpatrolled,
+            exclude_users=body.exclude_users,
+        )
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=sanitize_errors(e)) from e
+    fetcher = make_fetcher(
+        request=request, params=params, deadline=config.BULK_DEADLINE
+    )
+    if config.BULK_STRATEGY == "temp_table":
+        fetcher.entity_table = TEMP_ENTITY_TABLE
+    return await ndjson_response(
+        fetcher.iter_fetch_parallel(
+            chunk_size=config.BULK_CHUNK_SIZE, parallelism=config.BULK_PARALLELISM
+        )
+    )
+
+
+@api_router.get(
+    "/revisions/subscribe",
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            "content": {"text/event-stream": {}},
+            "description": "Server-sent events with the new revisions",
+        }
+    },
+)
+async def subscribe_revisions(
+    request: Request,
+    entities: str = Query(
+        ..., description="Comma-separated list of entity IDs, e.g. Q42,L1"
+    ),
+    no_bots: bool = Query(default=False),
+    only_unpatrolled: bool = Query(default=False),
+    exclude_users: str = Query(default=""),
+):
+    """
+    Subscribe to the new revisions of up to MAX_ENTITY_COUNT entities.
 
-    # Debug
-    # pprint(revisions[0])
+    The response is a stream of server-sent events. A "subscribed" event
+    carries the subscription id and the timestamp from which revisions are
+    sent. Every SUBSCRIPTION_INTERVAL seconds in which entities got new
+    revisions that pass the filters, a "revisions" event carries them
+    aggregated like GET /revisions does: a delta to add to a previous result.
 
-    # Step 4: aggregate and return
+    Examples:
+    * GET /api/v1/revisions/subscribe?entities=Q42,L1&no_bots=true -> 200
+    """
+    hub: SubscriptionHub | None = getattr(request.app.state, "subscription_hub", None)
+    if hub is None:
+        raise HTTPException(status_code=404, detail="Subscriptions are disabled")
+    default_start, default_end = default_window()
     try:
-        aggregator = Aggregator(revisions=revisions)
+        entity_splitter = Splitter(string=entities)
+        entity_splitter.split_comma_separated_string()
+        user_splitter = Splitter(string=exclude_users)
+        user_splitter.split_comma_separated_string()
+        params = Validator(
+            entities=entity_splitter.list_,
+            start_date=default_start,
+            end_date=default_end,
+            no_bots=no_bots,
+            only_unpatrolled=only_unpatrolled,
+            exclude_users=user_splitter.list_,
+        )
     except ValidationError as e:
-        # Forward the error to the user with status 422
         raise HTTPException(status_code=422, detail=sanitize_errors(e)) from e
-    return aggregator.aggregate()
+    if hub.full:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many subscribers",
+            headers={"Retry-After": str(config.SUBSCRIPTION_INTERVAL)},
+        )
+    subscription = hub.subscribe(params)
+
+    async def events() -> AsyncIterator[bytes]:
+        try:
+            yield subscribed_event(subscription)
+            while True:
+                event = await subscription.next_event(config.SUBSCRIPTION_KEEPALIVE)
+                if event is None:
+                    break
+                yield sse_event("revisions", event) if event else b": keepalive\n\n"
+        finally:
+            hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Proxies must pass events on as they come
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@api_router.get("/stats/pool", response_model=PoolStats)
+def get_pool_stats(request: Request):
+    """Connection pool counters, including how long requests waited for a connection"""
+    pool: ConnectionPool | AsyncConnectionPool | None = getattr(
+        request.app.state, "pool", None
+    )
+    if pool is None:
+        return PoolStats()
+    return pool.stats()
+
+
+@api_router.get("/stats/cache", response_model=CacheStats)
+def get_cache_stats(request: Request):
+    """Response cache hit and miss counters"""
+    response_cache: ResponseCache | None = getattr(
+        request.app.state, "response_cache", None
+    )
+    if response_cache is None:
+        return CacheStats()
+    return response_cache.stats()
+
+
+@api_router.get("/stats/conditional-get", response_model=ConditionalGetStats)
+def get_conditional_get_stats(request: Request):
+    """Freshness probe cost and how many conditional requests got a 304"""
+    conditional_get: ConditionalGet | None = getattr(
+        request.app.state, "conditional_get", None
+    )
+    if conditional_get is None:
+        return ConditionalGetStats()
+    return conditional_get.stats()
+
+
+@api_router.get("/stats/subscriptions", response_model=SubscriptionStats)
+def get_subscription_stats(request: Request):
+    """Subscribers, the distinct entities polled for them and events pushed"""
+    hub: SubscriptionHub | None = getattr(request.app.state, "subscription_hub", None)
+    if hub is None:
+        return SubscriptionStats()
+    return hub.stats()
+
+
+@api_router.get("/stats/shared-cache", response_model=SharedCacheStats)
+def get_shared_cache_stats(request: Request):
+    """Size of the cache file shared by the workers and this worker's
+    writes, see CACHE_BACKEND"""
+    shared_cache: SharedCacheBackend | None = getattr(
+        request.app.state, "shared_cache", None
+    )
+    if shared_cache is None:
+        return SharedCacheStats()
+    return shared_cache.stats()
+
+
+@api_router.get("/stats/entity-cache", response_model=EntityCacheStats)
+def get_entity_cache_stats(request: Request):
+    """Per-entity cache counters and memory use"""
+    entity_cache: EntityCache | None = getattr(request.app.state, "entity_cache", None)
+    if entity_cache is None:
+        return EntityCacheStats()
+    return entity_cache.stats()
+
+
+@api_router.get("/stats/incremental", response_model=IncrementalStats)
+def get_incremental_stats(request: Request):
+    """Full fetches, delta fetches and edge trims done by the incremental mode"""
+    incremental_cache: IncrementalCache | None = getattr(
+        request.app.state, "incremental_cache", None
+    )
+    if incremental_cache is None:
+        return IncrementalStats()
+    return incremental_cache.stats()
+
+
+@api_router.get("/stats/bots", response_model=BotRegistryStats)
+def get_bot_registry_stats(request: Request):
+    """Size of the bot registry and how long ago it was refreshed"""
+    bot_registry: BotRegistry | None = getattr(request.app.state, "bot_registry", None)
+    if bot_registry is None:
+        return BotRegistryStats()
+    return bot_registry.stats()
+
+
+@api_router.get("/stats/single-flight", response_model=SingleFlightStats)
+def get_single_flight_stats(request: Request):
+    """Requests that ran their fetch and requests that shared another's"""
+    single_flight: SingleFlight | None = getattr(
+        request.app.state, "single_flight", None
+    )
+    if single_flight is None:
+        return SingleFlightStats()
+    return single_flight.stats()
+
+
+@api_router.get("/stats/admission", response_model=AdmissionStats)
+def get_admission_stats(request: Request):
+    """Current limit on concurrent replica queries, queue and rejections"""
+    admission: AdmissionController | None = getattr(
+        request.app.state, "admission", None
+    )
+    if admission is None:
+        return AdmissionStats()
+    return admission.stats()
+
+
+@api_router.get("/stats/entity-resolver", response_model=EntityResolverStats)
+def get_entity_resolver_stats(request: Request):
+    """Entity to page id resolution hits, misses and lookup latency"""
+    entity_resolver: EntityResolver | None = getattr(
+        request.app.state, "entity_resolver", None
+    )
+    if entity_resolver is None:
+        return EntityResolverStats()
+    return entity_resolver.stats()
+
+
+@api_router.get("/stats/revision-store", response_model=RevisionStoreStats)
+def get_revision_store_stats(request: Request):
+    """Rows, coverage and lag of the local revision store, and how many
+    requests it served or passed on to the replica"""
+    revision_store: RevisionStore | None = getattr(
+        request.app.state, "revision_store", None
+    )
+    if revision_store is None:
+        return RevisionStoreStats()
+    return revision_store.stats()
+
+
+@api_router.get(
+    "/admin/slow-queries",
+    response_model=list[SlowQuery],
+    dependencies=[Depends(require_admin)],
+)
+def get_slow_queries(request: Request):
+    """The slowest recent queries with their EXPLAIN plan, newest first.
+    Needs the X-Admin-Token header."""
+    slow_query_log: SlowQueryLog | None = getattr(
+        request.app.state, "slow_query_log", None
+    )
+    if slow_query_log is None:
+        return []
+    return slow_query_log.entries()
+
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics(request: Request):
+    """Stage timing histograms and counters in the Prometheus text format"""
+    metrics: Metrics | None = getattr(request.app.state, "metrics", None)
+    return PlainTextResponse(
+        metrics.render() if metrics is not None else "",
+        media_type="text/plain; version=0.0.4",
+    )
 
 
 @app.get("/", include_in_schema=False)  # root redirect remains at /
@@ -0,0 +1,20 @@
+import hmac
+
+from fastapi import HTTPException, Request
+
+import config
+
+ADMIN_HEADER = "X-Admin-Token"
+
+
+def is_admin(token: None | str) -> bool:
+    """Whether token matches ADMIN_TOKEN. Nobody is admin without one."""
+    if not config.ADMIN_TOKEN or token is None:
+        return False
+    return hmac.compare_digest(token.encode(), config.ADMIN_TOKEN.encode())
+
+
+def require_admin(request: Request):
+    """Dependency of the admin endpoints"""
+    if not is_admin(request.headers.get(ADMIN_HEADER)):
+        raise HTTPException(status_code=403, detail="Admin token required")
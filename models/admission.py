@@ -0,0 +1,122 @@
+import asyncio
+import math
+import time
+from collections import deque
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+from pydantic import BaseModel, PrivateAttr
+
+from models.exceptions import OverloadedError
+
+
+class AdmissionStats(BaseModel):
+    limit: float = 0.0
+    in_flight: int = 0
+    queued: int = 0
+    admitted: int = 0
+    rejected: int = 0
+    # Smoothed query latency, short term and long term
+    latency_seconds: None | float = None
+    baseline_seconds: None | float = None
+
+
+class AdmissionController(BaseModel):
+    """Caps the number of concurrent replica queries
+
+    Queries over the limit wait in a queue of up to max_queue for at most
+    queue_timeout seconds, after that they are rejected with OverloadedError.
+    The limit adapts between min_limit and max_limit: it grows by one per
+    `limit` fast queries and shrinks by 10% when a query fails or the short
+    term latency exceeds `tolerance` times the long term baseline."""
+
+    min_limit: int = 2
+    max_limit: int = 10
+    max_queue: int = 20
+    queue_timeout: float = 1.0
+    tolerance: float = 2.0
+
+    _limit: float = PrivateAttr(default=0.0)
+    _in_flight: int = PrivateAttr(default=0)
+    _waiters: deque = PrivateAttr(default_factory=deque)
+    _latency: None | float = PrivateAttr(default=None)
+    _baseline: None | float = PrivateAttr(default=None)
+    _stats: AdmissionStats = PrivateAttr(default_factory=AdmissionStats)
+
+    def model_post_init(self, context):
+        self._limit = float(self.max_limit)
+
+    @property
+    def retry_after(self) -> int:
+        """Seconds a rejected client should wait, about one query"""
+        return max(1, math.ceil(self._latency or 1))
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        await self.acquire()
+        started = time.monotonic()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self.release(time.monotonic() - started, ok=ok)
+
+    async def acquire(self):
+        if not self._waiters and self._in_flight < int(self._limit):
+            self._in_flight += 1
+            self._stats.admitted += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self._reject()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except (TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was granted just as we gave up, pass it on
+                self._in_flight -= 1
+                self._wake()
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            if isinstance(e, TimeoutError):
+                self._reject()
+            raise
+        self._stats.admitted += 1
+
+    def release(self, seconds: float, ok: bool = True):
+        self._in_flight -= 1
+        self._adapt(seconds, ok)
+        self._wake()
+
+    def _reject(self):
+        self._stats.rejected += 1
+        raise OverloadedError(retry_after=self.retry_after)
+
+    def _wake(self):
+        while self._waiters and self._in_flight < int(self._limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self._in_flight += 1
+                waiter.set_result(None)
+
+    def _adapt(self, seconds: float, ok: bool):
+        if self._latency is None or self._baseline is None:
+            self._latency = self._baseline = seconds
+        else:
+            self._latency += 0.2 * (seconds - self._latency)
+            self._baseline += 0.01 * (seconds - self._baseline)
+        if not ok or self._latency > self.tolerance * self._baseline:
+            self._limit = max(float(self.min_limit), self._limit * 0.9)
+        else:
+            self._limit = min(float(self.max_limit), self._limit + 1 / self._limit)
+
+    def stats(self) -> AdmissionStats:
+        stats = self._stats.model_copy()
+        stats.limit = self._limit
+        stats.in_flight = self._in_flight
+        stats.queued = len(self._waiters)
+        stats.latency_seconds = self._latency
+        stats.baseline_seconds = self._baseline
+        return stats
@@ -1,65 +1,256 @@
+from collections.abc import Iterable
 from typing import Any
 
-from pydantic import BaseModel
+import orjson
+from pydantic import BaseModel, PrivateAttr
 
+from models.page_aggregate import PageAggregate, as_text, revision_from_row
 from models.revision import Revision
+from models.revision_row import RevisionRow
 from models.revisions import Revisions
 from models.user_count import UserCount
 
 
+def record_fields(record: RevisionRow) -> dict[str, Any]:
+    """The fields of Revision, in the same order"""
+    return {
+        "rev_id": record.rev_id,
+        "rev_page": record.rev_page,
+        "rev_user": record.rev_user,
+        "rev_user_text": record.rev_user_text,
+        "rev_timestamp": record.rev_timestamp,
+        "rc_patrolled": record.rc_patrolled,
+    }
+
+
+def record_revision(record: RevisionRow) -> Revision:
+    return Revision(**record_fields(record))
+
+
 class Aggregator(BaseModel):
+    """Aggregates a fully fetched result set
+
+    Build it with from_rows() on the fetch path, the rows are trusted and
+    validating them would copy every dict."""
+
     revisions: list[dict[str, Any]]
 
-    def aggregate(self):
-        revisions_by_page = {}
-        for revision in self.revisions:
-            page_key = str(revision["rev_page"])
-            user_key = f"{revision['rev_user']}|{revision['rev_user_text']}"
-
-            if page_key not in revisions_by_page:
-                revisions_by_page[page_key] = {
-                    "page_id": revision["rev_page"],
-                    "entity_id": revision["entity_id"],
-                    "earliest": revision.copy(),
-                    "latest": revision.copy(),
-                    "note": "",
-                    "users": {user_key: 1},
-                }
+    @classmethod
+    def from_rows(cls, rows: list[dict[str, Any]]) -> "Aggregator":
+        return cls.model_construct(revisions=rows)
+
+    def aggregate(self) -> list[Revisions]:
+        # page key -> [earliest row, latest row, {(rev_user, rev_user_text): count}]
+        # The rows are referenced, not copied, and only converted once per
+        # page and user when the result is built
+        pages: dict[Any, list] = {}
+        for row in self.revisions:
+            user_key = (row["rev_user"], row["rev_user_text"])
+            page = pages.get(row["rev_page"])
+            if page is None:
+                pages[row["rev_page"]] = [row, row, {user_key: 1}]
                 continue
 
-            if (
-                revisions_by_page[page_key]["earliest"]["rev_timestamp"]
-                > revision["rev_timestamp"]
+            # Ties on the timestamp are broken by rev_id, like the SQL strategy
+            timestamp = row["rev_timestamp"]
+            earliest = page[0]["rev_timestamp"]
+            if earliest > timestamp or (
+                earliest == timestamp and int(page[0]["rev_id"]) > int(row["rev_id"])
             ):
-                revisions_by_page[page_key]["earliest"] = revision.copy()
-            if (
-                revisions_by_page[page_key]["latest"]["rev_timestamp"]
-                < revision["rev_timestamp"]
+                page[0] = row
+            latest = page[1]["rev_timestamp"]
+            if latest < timestamp or (
+                latest == timestamp and int(page[1]["rev_id"]) < int(row["rev_id"])
             ):
-                revisions_by_page[page_key]["latest"] = revision.copy()
+                page[1] = row
+
+            users = page[2]
+            users[user_key] = users.get(user_key, 0) + 1
 
-            revisions_by_page[page_key]["users"][user_key] = (
-                revisions_by_page[page_key]["users"].get(user_key, 0) + 1
+        return [
+            Revisions(
+                page_id=int(page_id),
+                entity_id=as_text(earliest["entity_id"]),
+                earliest=revision_from_row(earliest),
+                latest=revision_from_row(latest),
+                note="",
+                users=[
+                    UserCount(
+                        user_id=int(user_id), username=as_text(username), count=count
+                    )
+                    for (user_id, username), count in users.items()
+                ],
             )
+            for page_id, (earliest, latest, users) in pages.items()
+        ]
 
-        result = []
-        for page_data in revisions_by_page.values():
-            users = [
-                UserCount(user_id=int(uid), username=uname, count=count)
-                for uid, uname, count in (
-                    (u.split("|", 1)[0], u.split("|", 1)[1], c)
-                    for u, c in page_data["users"].items()
-                )
+
+class RecordAggregator(BaseModel):
+    """Same output as Aggregator from RevisionRow records, which are already
+    decoded so the columns are used as they are"""
+
+    records: list[RevisionRow]
+
+    _pages: None | dict[int, list] = PrivateAttr(default=None)
+
+    @classmethod
+    def from_records(cls, records: list[RevisionRow]) -> "RecordAggregator":
+        return cls.model_construct(records=records)
+
+    @classmethod
+    def merge(cls, parts: Iterable["RecordAggregator"]) -> "RecordAggregator":
+        """The aggregation of all parts, see add_pages"""
+        merged = cls.from_records([])
+        for part in parts:
+            merged.add_pages(part.pages())
+        return merged
+
+    def add_pages(self, pages: dict[int, list]):
+        """Merge in the pages() of records that share no revisions with
+        these, e.g. of another time range. Only the pages are kept, so the
+        records behind them can be freed, pages is not modified."""
+        own = self.pages()
+        for page_id, (earliest, latest, users) in pages.items():
+            page = own.get(page_id)
+            if page is None:
+                own[page_id] = [earliest, latest, dict(users)]
+                continue
+            if (earliest.rev_timestamp, earliest.rev_id) < (
+                page[0].rev_timestamp,
+                page[0].rev_id,
+            ):
+                page[0] = earliest
+            if (latest.rev_timestamp, latest.rev_id) > (
+                page[1].rev_timestamp,
+                page[1].rev_id,
+            ):
+                page[1] = latest
+            merged = page[2]
+            for user_key, count in users.items():
+                merged[user_key] = merged.get(user_key, 0) + count
+
+    def pages(self) -> dict[int, list]:
+        """page id -> [earliest, latest, {(user id, username): count}],
+        computed once"""
+        if self._pages is None:
+            self._pages = self._aggregate_pages()
+        return self._pages
+
+    def _aggregate_pages(self) -> dict[int, list]:
+        pages: dict[int, list] = {}
+        for record in self.records:
+            user_key = (record.rev_user, record.rev_user_text)
+            page = pages.get(record.rev_page)
+            if page is None:
+                pages[record.rev_page] = [record, record, {user_key: 1}]
+                continue
+            # Ties on the timestamp are broken by rev_id, like the SQL strategy
+            order = (record.rev_timestamp, record.rev_id)
+            if order < (page[0].rev_timestamp, page[0].rev_id):
+                page[0] = record
+            if order > (page[1].rev_timestamp, page[1].rev_id):
+                page[1] = record
+            users = page[2]
+            users[user_key] = users.get(user_key, 0) + 1
+        return pages
+
+    def aggregate(self) -> list[Revisions]:
+        return [
+            Revisions(
+                page_id=page_id,
+                entity_id=earliest.entity_id,
+                earliest=record_revision(earliest),
+                latest=record_revision(latest),
+                note="",
+                users=[
+                    UserCount(user_id=user_id, username=username, count=count)
+                    for (user_id, username), count in users.items()
+                ],
+            )
+            for page_id, (earliest, latest, users) in self.pages().items()
+        ]
+
+    def dump_json(self) -> bytes:
+        """The JSON of aggregate() without building the models in between.
+        The records are already clean, so there is nothing to validate."""
+        return orjson.dumps(
+            [
+                {
+                    "page_id": page_id,
+                    "entity_id": earliest.entity_id,
+                    "earliest": record_fields(earliest),
+                    "latest": record_fields(latest),
+                    "note": "",
+                    "users": [
+                        {"user_id": user_id, "username": username, "count": count}
+                        for (user_id, username), count in users.items()
+                    ],
+                }
+                for page_id, (earliest, latest, users) in self.pages().items()
             ]
+        )
+
+
+class GroupedAggregator(BaseModel):
+    """Builds the same Revisions as Aggregator from pre-aggregated rows,
+    see Read.build_user_count_query and Read.build_edge_query"""
 
-            result.append(
-                Revisions(
-                    page_id=page_data["page_id"],
-                    entity_id=page_data["entity_id"],
-                    earliest=Revision(**page_data["earliest"]),
-                    latest=Revision(**page_data["latest"]),
-                    note=page_data["note"],
-                    users=users,
+    user_counts: list[dict[str, Any]]
+    edges: list[dict[str, Any]]
+
+    def aggregate(self):
+        pages: dict[int, dict[str, Any]] = {}
+        for edge in self.edges:
+            page = pages.setdefault(
+                int(edge["rev_page"]),
+                {"entity_id": edge["entity_id"], "users": []},
+            )
+            if edge["rn_first"] == 1:
+                page["earliest"] = edge
+            if edge["rn_last"] == 1:
+                page["latest"] = edge
+        for row in self.user_counts:
+            page = pages.get(int(row["rev_page"]))
+            if page is None:
+                continue
+            page["users"].append(
+                UserCount(
+                    user_id=row["rev_user"],
+                    username=row["rev_user_text"],
+                    count=row["count"],
                 )
             )
-        return result
+        return [
+            Revisions(
+                page_id=page_id,
+                entity_id=page["entity_id"],
+                earliest=Revision(**page["earliest"]),
+                latest=Revision(**page["latest"]),
+                note="",
+                users=page["users"],
+            )
+            for page_id, page in pages.items()
+        ]
+
+
+class StreamingAggregator(BaseModel):
+    """Aggregates rows as they arrive, e.g. from Read.iter_revisions
+
+    Only the per-page state is kept, so memory is bounded by the number of
+    distinct pages and users rather than by the number of revisions."""
+
+    pages: dict[int, PageAggregate] = {}
+
+    def consume(self, rows: Iterable[dict[str, Any]]):
+        pages = self.pages
+        for row in rows:
+            page_id = int(row["rev_page"])
+            page = pages.get(page_id)
+            if page is None:
+                pages[page_id] = PageAggregate.from_row(row)
+            else:
+                page.add(row)
+        return self
+
+    def aggregate(self):
+        return [page.to_revisions() for page in self.pages.values()]
@@ -0,0 +1,88 @@
+import asyncio
+import contextlib
+import logging
+import time
+from collections.abc import Awaitable, Callable, Iterable
+
+import pymysql
+from pydantic import BaseModel, PrivateAttr
+
+from models.exceptions import DbConnectionError
+from models.pool import AsyncConnectionPool, ConnectionPool, fetch_all
+
+logger = logging.getLogger(__name__)
+
+BOT_QUERY = "SELECT ug_user FROM user_groups WHERE ug_group='bot'"
+
+
+async def load_bot_ids(pool: ConnectionPool | AsyncConnectionPool) -> set[int]:
+    """The user ids in the bot group, read with a pooled connection"""
+    return {int(row["ug_user"]) for row in await fetch_all(pool, BOT_QUERY, [])}
+
+
+class BotRegistryStats(BaseModel):
+    loaded: bool = False
+    size: int = 0
+    refreshes: int = 0
+    failures: int = 0
+    # Seconds since the ids were last loaded, None if they never were
+    staleness_seconds: float | None = None
+    last_refresh_seconds: float = 0.0
+
+
+class BotRegistry(BaseModel):
+    """Process-wide set of bot user ids, loaded once and then refreshed
+    in the background every `interval` seconds
+
+    Read filters on the loaded ids instead of an anti-join on user_groups
+    in every query. Until the first load succeeds ids is None and Read
+    falls back to the subquery. A failed refresh keeps the previous ids."""
+
+    load: Callable[[], Awaitable[Iterable[int]]]
+    interval: float = 3600.0
+
+    _ids: frozenset[int] | None = PrivateAttr(default=None)
+    _loaded_at: float | None = PrivateAttr(default=None)
+    _task: asyncio.Task | None = PrivateAttr(default=None)
+    _stats: BotRegistryStats = PrivateAttr(default_factory=BotRegistryStats)
+
+    @property
+    def ids(self) -> frozenset[int] | None:
+        return self._ids
+
+    async def refresh(self) -> bool:
+        started = time.monotonic()
+        try:
+            ids = frozenset(await self.load())
+        except (pymysql.err.Error, OSError, DbConnectionError):
+            self._stats.failures += 1
+            logger.warning("Could not refresh the bot registry", exc_info=True)
+            return False
+        self._ids = ids
+        self._loaded_at = time.monotonic()
+        self._stats.refreshes += 1
+        self._stats.last_refresh_seconds = self._loaded_at - started
+        return True
+
+    def start(self):
+        self._task = asyncio.create_task(self._refresh_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def _refresh_forever(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.refresh()
+
+    def stats(self) -> BotRegistryStats:
+        stats = self._stats.model_copy()
+        stats.loaded = self._ids is not None
+        stats.size = len(self._ids or ())
+        if self._loaded_at is not None:
+            stats.staleness_seconds = time.monotonic() - self._loaded_at
+        return stats
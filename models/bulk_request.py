@@ -0,0 +1,21 @@
+from pydantic import BaseModel, Field
+
+
+class BulkRequest(BaseModel):
+    """Body of POST /revisions/bulk, the same filters as GET /revisions
+    but with the entities as a JSON list"""
+
+    entities: list[str] = Field(
+        ..., description="Entity IDs, e.g. ['Q42', 'L1']", min_length=1
+    )
+    start_date: str | None = Field(
+        default=None,
+        description='Start of the range in "YYYYMMDDHHMMSS" or "YYYYMMDD" format. Defaults to 7 days ago.',
+    )
+    end_date: str | None = Field(
+        default=None,
+        description='End of the range in "YYYYMMDDHHMMSS" or "YYYYMMDD" format. Defaults to now.',
+    )
+    no_bots: bool = False
+    only_unpatrolled: bool = False
+    exclude_users: list[str] = []
@@ -0,0 +1,89 @@
+import hashlib
+import time
+from typing import Any
+
+import orjson
+from pydantic import BaseModel, PrivateAttr, computed_field
+
+from models.fetcher import Fetcher
+from models.validator import Validator
+
+
+class ConditionalGetStats(BaseModel):
+    probes: int = 0
+    probe_seconds_total: float = 0.0
+    probe_seconds_max: float = 0.0
+    # Conditional requests answered with 304, and with the full body
+    not_modified: int = 0
+    modified: int = 0
+
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def not_modified_ratio(self) -> float:
+        total = self.not_modified + self.modified
+        return self.not_modified / total if total else 0.0
+
+
+def etag_matches(if_none_match: None | str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header with etag, as RFC 9110
+    requires for If-None-Match"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or any(
+        tag.removeprefix("W/") == etag.removeprefix("W/") for tag in tags
+    )
+
+
+class ConditionalGet(BaseModel):
+    """ETags for /revisions from a freshness probe instead of the response
+
+    The probe reads per page the revision count, highest rev_id and patrol
+    state, see Read.build_probe_query. The ETag is weak: the same data can
+    be serialized with pages and users in another order."""
+
+    _stats: ConditionalGetStats = PrivateAttr(default_factory=ConditionalGetStats)
+
+    async def probe(self, fetcher: Fetcher, variant: str = "") -> str:
+        started = time.perf_counter()
+        rows = await fetcher.probe()
+        seconds = time.perf_counter() - started
+        self._stats.probes += 1
+        self._stats.probe_seconds_total += seconds
+        self._stats.probe_seconds_max = max(self._stats.probe_seconds_max, seconds)
+        return self.etag(fetcher.params, rows, variant)
+
+    @staticmethod
+    def etag(params: Validator, rows: list[dict[str, Any]], variant: str = "") -> str:
+        """The window is left out, so a moving default window keeps its
+        ETag as long as no revision entered or left it. variant tells
+        other representations apart, see Projection.key."""
+        state = sorted(
+            (
+                int(row["rev_page"]),
+                int(row["count"]),
+                int(row["max_rev_id"]),
+                int(row["in_recentchanges"]),
+                int(row["patrolled"] or 0),
+            )
+            for row in rows
+        )
+        filters = [
+            sorted(set(params.entities)),
+            params.no_bots,
+            params.only_unpatrolled,
+            sorted(set(params.exclude_users)),
+        ]
+        if variant:
+            filters.append(variant)
+        digest = hashlib.sha256(orjson.dumps([filters, state])).hexdigest()
+        return f'W/"{digest[:32]}"'
+
+    def record(self, not_modified: bool):
+        if not_modified:
+            self._stats.not_modified += 1
+        else:
+            self._stats.modified += 1
+
+    def stats(self) -> ConditionalGetStats:
+        return self._stats.model_copy()
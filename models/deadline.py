@@ -0,0 +1,53 @@
+"""Request deadlines and cancellation when the client goes away"""
+
+import asyncio
+import time
+from collections.abc import Awaitable
+from typing import Any
+
+from starlette.types import Receive
+
+from models.exceptions import ClientDisconnectedError, DeadlineExceededError
+
+
+def remaining(deadline: None | float) -> None | float:
+    """Seconds left until a time.monotonic() deadline, None without one"""
+    if deadline is None:
+        return None
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise DeadlineExceededError()
+    return left
+
+
+async def wait_for_disconnect(receive: Receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def run_until_disconnect(
+    awaitable: Awaitable[Any], receive: Receive, deadline: None | float
+) -> Any:
+    """Await `awaitable`, cancelling it when the client disconnects or the
+    deadline passes. The cancelled work gets to clean up, e.g. kill its
+    query, before this raises."""
+    task = asyncio.ensure_future(awaitable)
+    watcher = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        done, _ = await asyncio.wait(
+            {task, watcher},
+            timeout=remaining(deadline),
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+    except BaseException:
+        task.cancel()
+        raise
+    finally:
+        watcher.cancel()
+    if task in done:
+        return task.result()
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    if watcher in done:
+        raise ClientDisconnectedError()
+    raise DeadlineExceededError()
@@ -0,0 +1,91 @@
+import time
+from collections import OrderedDict
+
+from pydantic import BaseModel, PrivateAttr, computed_field
+
+from models.revisions import Revisions
+from models.validator import Validator
+
+EntityKey = tuple[str, str, str, bool, bool, tuple[str, ...]]
+
+
+class EntityCacheStats(BaseModel):
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    entries: int = 0
+    bytes: int = 0
+
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class EntityCache(BaseModel):
+    """LRU of aggregated Revisions per entity, bounded by an approximate memory budget
+
+    Entities without revisions in the window are cached as an empty list
+    so they are not queried again either."""
+
+    max_bytes: int = 64 * 1024 * 1024
+    expire: float = 60.0
+
+    # key -> (expires_at, size, revisions)
+    _entries: OrderedDict = PrivateAttr(default_factory=OrderedDict)
+    _bytes: int = PrivateAttr(default=0)
+    _stats: EntityCacheStats = PrivateAttr(default_factory=EntityCacheStats)
+
+    @staticmethod
+    def key(entity: str, params: Validator) -> EntityKey:
+        return (
+            entity,
+            params.start_date,
+            params.end_date,
+            params.no_bots,
+            params.only_unpatrolled,
+            tuple(sorted(set(params.exclude_users))),
+        )
+
+    def get(self, key: EntityKey) -> list[Revisions] | None:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] < time.monotonic():
+            self._remove(key)
+            entry = None
+        if entry is None:
+            self._stats.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self._stats.hits += 1
+        return entry[2]
+
+    def set(self, key: EntityKey, revisions: list[Revisions]):
+        size = self.estimate_size(key, revisions)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + self.expire, size, revisions)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self._stats.evictions += 1
+
+    def stats(self) -> EntityCacheStats:
+        stats = self._stats.model_copy()
+        stats.entries = len(self._entries)
+        stats.bytes = self._bytes
+        return stats
+
+    @staticmethod
+    def estimate_size(key: EntityKey, revisions: list[Revisions]) -> int:
+        """The serialized size is a good enough proxy for the memory used"""
+        return sum(len(r.model_dump_json()) for r in revisions) + sum(
+            len(str(k)) for k in key
+        )
+
+    def _remove(self, key: EntityKey):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
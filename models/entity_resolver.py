@@ -0,0 +1,129 @@
+import asyncio
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from pydantic import BaseModel, PrivateAttr, computed_field
+
+# entity id -> (page id, namespace)
+PageRef = tuple[int, int]
+
+
+class EntityResolverStats(BaseModel):
+    hits: int = 0
+    file_hits: int = 0
+    misses: int = 0
+    lookups: int = 0
+    lookup_seconds_total: float = 0.0
+    lookup_seconds_max: float = 0.0
+    entries: int = 0
+
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.file_hits + self.misses
+        return (self.hits + self.file_hits) / total if total else 0.0
+
+
+class EntityResolver(BaseModel):
+    """LRU of entity id -> (page id, namespace), optionally backed by a
+    SQLite file so the mapping survives restarts
+
+    Pages are practically never renumbered, so entries don't expire.
+    Entities that were not found are not cached, they may be created later.
+    The file is read and written in a thread, off the event loop."""
+
+    max_entries: int = 1_000_000
+    path: None | str = None
+
+    _entries: OrderedDict = PrivateAttr(default_factory=OrderedDict)
+    _db: None | sqlite3.Connection = PrivateAttr(default=None)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _stats: EntityResolverStats = PrivateAttr(default_factory=EntityResolverStats)
+
+    def open(self):
+        if self.path is None:
+            return
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entity_page ("
+            "entity_id TEXT PRIMARY KEY, page_id INTEGER, namespace INTEGER)"
+        )
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            raise sqlite3.ProgrammingError("EntityResolver is not open")
+        return self._db
+
+    async def get_many(
+        self, entities: list[str]
+    ) -> tuple[dict[str, PageRef], list[str]]:
+        """The known pages and the entities that have to be looked up"""
+        found: dict[str, PageRef] = {}
+        unknown = []
+        for entity in entities:
+            page = self._entries.get(entity)
+            if page is None:
+                unknown.append(entity)
+            else:
+                self._entries.move_to_end(entity)
+                found[entity] = page
+        self._stats.hits += len(found)
+        if unknown and self._db is not None:
+            stored = await asyncio.to_thread(self._load, unknown)
+            self._stats.file_hits += len(stored)
+            self._remember(stored)
+            found.update(stored)
+            unknown = [entity for entity in unknown if entity not in stored]
+        self._stats.misses += len(unknown)
+        return found, unknown
+
+    async def add(self, pages: dict[str, PageRef]):
+        self._remember(pages)
+        if self._db is not None and pages:
+            await asyncio.to_thread(self._store, pages)
+
+    def _load(self, entities: list[str]) -> dict[str, PageRef]:
+        placeholders = ",".join(["?"] * len(entities))
+        with self._lock:
+            return {
+                entity: (page_id, namespace)
+                for entity, page_id, namespace in self.db.execute(
+                    # Only placeholders are formatted into the query
+                    "SELECT entity_id, page_id, namespace FROM entity_page "  # noqa: S608
+                    f"WHERE entity_id IN ({placeholders})",
+                    entities,
+                )
+            }
+
+    def _store(self, pages: dict[str, PageRef]):
+        with self._lock:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO entity_page VALUES (?, ?, ?)",
+                [(entity, *page) for entity, page in pages.items()],
+            )
+            self.db.commit()
+
+    def _remember(self, pages: dict[str, PageRef]):
+        self._entries.update(pages)
+        for entity in pages:
+            self._entries.move_to_end(entity)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def record_lookup(self, seconds: float):
+        self._stats.lookups += 1
+        self._stats.lookup_seconds_total += seconds
+        self._stats.lookup_seconds_max = max(self._stats.lookup_seconds_max, seconds)
+
+    def stats(self) -> EntityResolverStats:
+        stats = self._stats.model_copy()
+        stats.entries = len(self._entries)
+        return stats
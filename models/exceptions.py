@@ -1,2 +1,22 @@
 class DbConnectionError(BaseException):
     pass
+
+
+class PoolTimeoutError(DbConnectionError):
+    pass
+
+
+class DeadlineExceededError(Exception):
+    """The request ran out of time, in the app or at the replica"""
+
+
+class ClientDisconnectedError(Exception):
+    pass
+
+
+class OverloadedError(Exception):
+    """Too many replica queries, see AdmissionController"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Overloaded, retry after {retry_after}s")
+        self.retry_after = retry_after
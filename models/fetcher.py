@@ -0,0 +1,574 @@
+import asyncio
+import logging
+import time
+from collections.abc import AsyncIterator, Callable
+from contextlib import AbstractAsyncContextManager, AsyncExitStack, nullcontext
+from typing import Any
+
+import pymysql
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, TypeAdapter
+
+import config
+from models.admission import AdmissionController
+from models.aggregator import GroupedAggregator, RecordAggregator, StreamingAggregator
+from models.entity_cache import EntityCache
+from models.entity_resolver import EntityResolver
+from models.exceptions import DbConnectionError
+from models.incremental import EntityState, IncrementalCache
+from models.page_aggregate import as_text
+from models.pool import execute_unpooled
+from models.projection import (
+    Projection,
+    pages_from_aggregator,
+    pages_from_revisions,
+)
+from models.read import Read
+from models.revision_row import RevisionRow
+from models.revisions import Revisions
+from models.slow_query_log import SlowQueryLog
+from models.timing import count, timed
+from models.validator import Validator
+from models.window import now_timestamp, shift_timestamp, split_window
+
+logger = logging.getLogger(__name__)
+
+QueryBuilder = Callable[[Read], tuple[str, list]]
+revisions_adapter = TypeAdapter(list[Revisions])
+
+
+class Fetcher(BaseModel):
+    """Fetches and aggregates revisions for the validated params,
+    serving entities from the entity cache where possible"""
+
+    params: Validator
+    pool: Any = None
+    entity_cache: None | EntityCache = None
+    incremental_cache: None | IncrementalCache = None
+    # Name of a session temporary table to load the entities into
+    # instead of sending them as an IN list
+    entity_table: None | str = None
+    # See BotRegistry.ids
+    bot_ids: None | frozenset[int] = None
+    resolver: None | EntityResolver = None
+    slow_query_log: None | SlowQueryLog = None
+    # time.monotonic() by which the request must be done, see Read.bounded
+    deadline: None | float = None
+    admission: None | AdmissionController = None
+    entity_hits: int = 0
+    entity_misses: int = 0
+
+    @property
+    def entity_hit_ratio(self) -> float:
+        total = self.entity_hits + self.entity_misses
+        return self.entity_hits / total if total else 0.0
+
+    @property
+    def incremental(self) -> bool:
+        """Patrolling changes revisions below the high-water mark, which the
+        state never re-reads, so only_unpatrolled is always fetched in full"""
+        return self.incremental_cache is not None and not self.params.only_unpatrolled
+
+    async def fetch(self) -> list[Revisions]:
+        if self.incremental:
+            return await self.fetch_incremental()
+        if self.entity_cache is None:
+            return await self.fetch_revisions(self.params)
+        cached: dict[str, list[Revisions]] = {}
+        missing = []
+        for entity in self.params.entities:
+            hit = self.entity_cache.get(EntityCache.key(entity, self.params))
+            if hit is None:
+                missing.append(entity)
+            else:
+                cached[entity] = hit
+        self.entity_hits = len(cached)
+        self.entity_misses = len(missing)
+        if missing:
+            # Only the entities we don't have are sent to the replica
+            partial = self.params.model_copy(update={"entities": missing})
+            fresh: dict[str, list[Revisions]] = {entity: [] for entity in missing}
+            for revisions in await self.fetch_revisions(partial):
+                if revisions.entity_id in fresh:
+                    fresh[revisions.entity_id].append(revisions)
+            for entity, revisions in fresh.items():
+                self.entity_cache.set(EntityCache.key(entity, self.params), revisions)
+            cached.update(fresh)
+        return [
+            revisions
+            for entity in self.params.entities
+            for revisions in cached.get(entity, [])
+        ]
+
+    async def fetch_json(self, projection: None | Projection = None) -> bytes:
+        """fetch() serialized as a JSON array, or as projection selects.
+        Without the entity and incremental caches, which keep models, the
+        "rows" strategy serializes straight from the aggregation state."""
+        if (
+            self.entity_cache is None
+            and not self.incremental
+            and config.FETCH_STRATEGY == "rows"
+        ):
+            aggregator = await self.aggregate_records(self.params)
+            with timed("serialize"):
+                if projection is not None:
+                    return projection.dump_json(
+                        pages_from_aggregator(aggregator.pages())
+                    )
+                return aggregator.dump_json()
+        revisions = await self.fetch()
+        with timed("serialize"):
+            if projection is not None:
+                return projection.dump_json(pages_from_revisions(revisions))
+            return revisions_adapter.dump_json(revisions)
+
+    async def iter_fetch(self, chunk_size: int) -> AsyncIterator[list[Revisions]]:
+        """Fetch chunk_size entities at a time so results can be sent
+        before the remaining entities are queried"""
+        entities = self.params.entities
+        for start in range(0, len(entities), chunk_size):
+            chunk = self.model_copy(
+                update={
+                    "params": self.params.model_copy(
+                        update={"entities": entities[start : start + chunk_size]}
+                    )
+                }
+            )
+            yield await chunk.fetch()
+
+    async def iter_fetch_parallel(
+        self, chunk_size: int, parallelism: int
+    ) -> AsyncIterator[list[Revisions]]:
+        """Like iter_fetch but up to `parallelism` chunks are fetched at once,
+        each on its own connection. Chunks are yielded as they complete."""
+        semaphore = asyncio.Semaphore(parallelism)
+        entities = self.params.entities
+
+        async def fetch_chunk(chunk: list[str]) -> list[Revisions]:
+            async with semaphore:
+                fetcher = self.model_copy(
+                    update={
+                        "params": self.params.model_copy(update={"entities": chunk})
+                    }
+                )
+                return await fetcher.fetch()
+
+        tasks = [
+            asyncio.ensure_future(fetch_chunk(entities[start : start + chunk_size]))
+            for start in range(0, len(entities), chunk_size)
+        ]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def fetch_incremental(self) -> list[Revisions]:
+        """Reuse the state of earlier polls: fetch only revisions newer than
+        each entity's high-water mark and re-query the edge that slid out"""
+        cache = self.incremental_cache
+        if cache is None:
+            raise ValueError("fetch_incremental needs an incremental_cache")
+        # Polls of the same entities wait for each other, in key order so
+        # two requests can't each hold a lock the other one needs
+        keys = sorted(
+            {
+                IncrementalCache.key(e, self.params, self.bot_ids)
+                for e in self.params.entities
+            }
+        )
+        async with AsyncExitStack() as locks:
+            for key in keys:
+                await locks.enter_async_context(cache.lock(key))
+            return await self._advance(cache)
+
+    async def _advance(self, cache: IncrementalCache) -> list[Revisions]:
+        start, end = self.params.start_date, self.params.end_date
+        now = now_timestamp()
+        synced_until = min(end, now)
+        states: dict[str, EntityState] = {}
+        full = []
+        for entity in self.params.entities:
+            state = cache.get(IncrementalCache.key(entity, self.params, self.bot_ids))
+            if state is not None and state.can_advance_to(start, end):
+                states[entity] = state
+            else:
+                full.append(entity)
+        if full:
+            grouped = await self.fetch_grouped(entities=full)
+            cache.record(full_fetches=len(full))
+            for entity in full:
+                state = EntityState(
+                    entity_id=entity,
+                    start_date=start,
+                    end_date=end,
+                    synced_until=synced_until,
+                )
+                for row in grouped.get(entity, []):
+                    state.add(row)
+                state.mark_synced(grouped.get(entity, []), synced_until, cache.overlap)
+                cache.set(
+                    IncrementalCache.key(entity, self.params, self.bot_ids), state
+                )
+                states[entity] = state
+        incremental = {e: s for e, s in states.items() if e not in full}
+        await self._append_delta(incremental, now=now, synced_until=synced_until)
+        await self._trim_start(incremental)
+        for state in incremental.values():
+            state.start_date, state.end_date = start, end
+        return [
+            revisions
+            for entity in self.params.entities
+            for revisions in states[entity].to_revisions()
+        ]
+
+    async def _append_delta(
+        self, states: dict[str, EntityState], now: str, synced_until: str
+    ):
+        cache = self.incremental_cache
+        if cache is None:
+            return
+        start, end = self.params.start_date, self.params.end_date
+        pending = {
+            e: s for e, s in states.items() if not s.is_settled(end, now, cache.overlap)
+        }
+        cache.record(settled=len(states) - len(pending))
+        if not pending:
+            return
+        floors = {
+            e: max(start, shift_timestamp(s.synced_until, -cache.overlap))
+            for e, s in pending.items()
+        }
+        grouped = await self.fetch_grouped(
+            entities=list(pending), start_date=min(floors.values())
+        )
+        cache.record(delta_fetches=len(pending))
+        for entity, state in pending.items():
+            new_rows = [
+                row
+                for row in grouped.get(entity, [])
+                if as_text(row["rev_timestamp"]) >= floors[entity]
+                and int(row["rev_id"]) not in state.recent
+            ]
+            for row in new_rows:
+                state.add(row)
+            state.mark_synced(new_rows, synced_until, cache.overlap)
+
+    async def _trim_start(self, states: dict[str, EntityState]):
+        """Remove the revisions that fell out of the start of the window"""
+        cache = self.incremental_cache
+        start = self.params.start_date
+        trimming = {e: s for e, s in states.items() if s.start_date < start}
+        if cache is None or not trimming:
+            return
+        grouped = await self.fetch_grouped(
+            entities=list(trimming),
+            start_date=min(s.start_date for s in trimming.values()),
+            end_date=shift_timestamp(start, -1),
+        )
+        cache.record(edge_trims=len(trimming))
+        stale = []
+        for entity, state in trimming.items():
+            for row in grouped.get(entity, []):
+                if as_text(row["rev_timestamp"]) >= state.start_date:
+                    state.remove(row)
+            state.pages = {i: p for i, p in state.pages.items() if p.total}
+            if any(
+                as_text(p.earliest["rev_timestamp"]) < start
+                for p in state.pages.values()
+            ):
+                stale.append(entity)
+        if not stale:
+            return
+        # The earliest revision slid out, look up the new one
+        grouped = await self.fetch_grouped(
+            entities=stale, build=Read.build_earliest_query
+        )
+        for entity in stale:
+            for row in grouped.get(entity, []):
+                page = trimming[entity].pages.get(int(row["rev_page"]))
+                if page is not None:
+                    page.earliest = row
+
+    async def fetch_grouped(
+        self, build: QueryBuilder = Read.build_query, **update: Any
+    ) -> dict[str, list[dict[str, Any]]]:
+        """Fetch rows with some params replaced and group them by entity"""
+        rows = await self.fetch_rows(self.params.model_copy(update=update), build)
+        if self.incremental_cache is not None:
+            self.incremental_cache.record(rows_fetched=len(rows))
+        grouped: dict[str, list[dict[str, Any]]] = {}
+        for row in rows:
+            grouped.setdefault(as_text(row["entity_id"]), []).append(row)
+        return grouped
+
+    async def fetch_revisions(self, params: Validator) -> list[Revisions]:
+        """Fetch and aggregate using the configured FETCH_STRATEGY"""
+        if config.FETCH_STRATEGY == "grouped":
+            user_counts, edges = await self.run_queries(
+                params, Read.build_user_count_query, Read.build_edge_query
+            )
+            with timed("aggregate"):
+                return GroupedAggregator(
+                    user_counts=user_counts, edges=edges
+                ).aggregate()
+        if config.FETCH_STRATEGY == "stream":
+            return await self.stream_revisions(params)
+        aggregator = await self.aggregate_records(params)
+        with timed("aggregate"):
+            return aggregator.aggregate()
+
+    async def stream_revisions(self, params: Validator) -> list[Revisions]:
+        """Aggregate batches as they come off an unbuffered cursor"""
+        aggregator = StreamingAggregator()
+        page_titles = await self.resolve(params)
+        if page_titles == {}:
+            return []
+        # Batches are consumed while they are read, that counts as fetch
+        with timed("fetch"):
+            async with self.admitted():
+                await self._stream_into(aggregator, params, page_titles)
+        with timed("aggregate"):
+            return aggregator.aggregate()
+
+    async def _stream_into(
+        self,
+        aggregator: StreamingAggregator,
+        params: Validator,
+        page_titles: None | dict[int, str],
+    ):
+        read = self.make_read(params, page_titles)
+        if config.DB_MODE == "async":
+            try:
+                if read.entity_table:
+                    await read.load_entity_table_async()
+                async for batch in read.aiter_revisions(config.STREAM_BATCH_SIZE):
+                    aggregator.consume(batch)
+                if read.entity_table:
+                    await read.drop_entity_table_async()
+            except asyncio.CancelledError:
+                await self.discard_and_kill(read)
+                raise
+            finally:
+                await read.close_async()
+            return
+
+        def stream():
+            try:
+                if read.entity_table:
+                    read.load_entity_table()
+                aggregator.consume(read.iter_revisions(config.STREAM_BATCH_SIZE))
+                if read.entity_table:
+                    read.drop_entity_table()
+            finally:
+                read.close()
+
+        await self.run_in_thread(stream, read)
+
+    def make_read(
+        self, params: Validator, page_titles: None | dict[int, str] = None
+    ) -> Read:
+        if config.DB_MODE == "async":
+            return Read(
+                params=params,
+                async_pool=self.pool,
+                entity_table=self.entity_table,
+                bot_ids=self.bot_ids,
+                page_titles=page_titles,
+                slow_query_log=self.slow_query_log,
+                deadline=self.deadline,
+            )
+        return Read(
+            params=params,
+            pool=self.pool,
+            entity_table=self.entity_table,
+            bot_ids=self.bot_ids,
+            page_titles=page_titles,
+            slow_query_log=self.slow_query_log,
+            deadline=self.deadline,
+        )
+
+    async def resolve(self, params: Validator) -> None | dict[int, str]:
+        """page id -> entity id for params.entities through the resolver,
+        looking up the unknown entities in one query. None without one."""
+        if self.resolver is None or self.entity_table:
+            return None
+        pages, unknown = await self.resolver.get_many(params.entities)
+        if unknown:
+            started = time.monotonic()
+            (rows,) = await self.run_queries(
+                params.model_copy(update={"entities": unknown}),
+                Read.build_page_query,
+                resolve=False,
+            )
+            self.resolver.record_lookup(time.monotonic() - started)
+            found = {
+                as_text(row["page_title"]): (
+                    int(row["page_id"]),
+                    int(row["page_namespace"]),
+                )
+                for row in rows
+            }
+            await self.resolver.add(found)
+            pages.update(found)
+        return {page_id: entity for entity, (page_id, _) in pages.items()}
+
+    async def aggregate_records(self, params: Validator) -> RecordAggregator:
+        """fetch_records aggregated. Windows longer than PARTITION_DAYS are
+        fetched as consecutive time ranges, up to PARTITION_PARALLELISM at
+        once on their own connections, each aggregated and merged into one
+        aggregation as it arrives."""
+        ranges = [(params.start_date, params.end_date)]
+        if config.PARTITION_DAYS:
+            ranges = split_window(
+                params.start_date, params.end_date, config.PARTITION_DAYS * 86400
+            )
+        if len(ranges) == 1:
+            records = await self.fetch_records(params)
+            with timed("aggregate"):
+                return RecordAggregator.from_records(records)
+        # Resolved once here, the partitions find the titles in the resolver
+        if await self.resolve(params) == {}:
+            return RecordAggregator.from_records([])
+        semaphore = asyncio.Semaphore(config.PARTITION_PARALLELISM)
+        merged = RecordAggregator.from_records([])
+
+        async def fetch_partition(start: str, end: str):
+            async with semaphore:
+                records = await self.fetch_records(
+                    params.model_copy(update={"start_date": start, "end_date": end})
+                )
+            # Nothing awaits in between, so the partitions merge one at a
+            # time and their records are dropped right after
+            with timed("aggregate"):
+                merged.add_pages(RecordAggregator.from_records(records).pages())
+
+        tasks = [asyncio.ensure_future(fetch_partition(*r)) for r in ranges]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+        count("partitions", len(ranges))
+        return merged
+
+    async def probe(self) -> list[dict[str, Any]]:
+        """The freshness probe of self.params, see Read.build_probe_query"""
+        (rows,) = await self.run_queries(
+            self.params, Read.build_probe_query, stage="probe"
+        )
+        return rows
+
+    async def fetch_records(self, params: Validator) -> list[RevisionRow]:
+        (records,) = await self.run_queries(params, Read.build_query, records=True)
+        return records
+
+    async def fetch_rows(
+        self, params: Validator, build: QueryBuilder = Read.build_query
+    ) -> list[dict[str, Any]]:
+        (rows,) = await self.run_queries(params, build)
+        return rows
+
+    async def run_queries(
+        self,
+        params: Validator,
+        *builds: QueryBuilder,
+        records: bool = False,
+        resolve: bool = True,
+        stage: str = "fetch",
+    ) -> list[list[Any]]:
+        """Run the queries on one connection. On the event loop in async mode,
+        in the threadpool in sync mode. See Read.execute for records. They
+        are timed as `stage`."""
+        page_titles = await self.resolve(params) if resolve else None
+        if page_titles == {}:
+            # None of the entities exist
+            return [[] for _ in builds]
+        with timed(stage):
+            async with self.admitted():
+                results = await self._run_queries(params, page_titles, builds, records)
+        count("rows", sum(len(result) for result in results))
+        return results
+
+    def admitted(self) -> AbstractAsyncContextManager:
+        """A slot from the admission controller, if there is one"""
+        if self.admission is None:
+            return nullcontext()
+        return self.admission.slot()
+
+    async def _run_queries(
+        self,
+        params: Validator,
+        page_titles: None | dict[int, str],
+        builds: tuple[QueryBuilder, ...],
+        records: bool,
+    ) -> list[list[Any]]:
+        read = self.make_read(params, page_titles)
+        if config.DB_MODE == "async":
+            try:
+                if read.entity_table:
+                    await read.load_entity_table_async()
+                results = [
+                    await read.execute_async(*build(read), records=records)
+                    for build in builds
+                ]
+                if read.entity_table:
+                    await read.drop_entity_table_async()
+                return results
+            except asyncio.CancelledError:
+                await self.discard_and_kill(read)
+                raise
+            finally:
+                await read.close_async()
+
+        def run() -> list[list[Any]]:
+            try:
+                if read.entity_table:
+                    read.load_entity_table()
+                results = [
+                    read.execute(*build(read), records=records) for build in builds
+                ]
+                if read.entity_table:
+                    read.drop_entity_table()
+                return results
+            finally:
+                read.close()
+
+        return await self.run_in_thread(run, read)
+
+    async def run_in_thread(self, function: Callable[[], Any], read: Read) -> Any:
+        """Run `function`, which owns read's connection, in the threadpool.
+        If we are cancelled its query is killed, the thread then finishes
+        and releases the connection on its own."""
+        work = asyncio.ensure_future(run_in_threadpool(function))
+        try:
+            return await asyncio.shield(work)
+        except asyncio.CancelledError:
+            await self.kill_query(read.server_thread_id())
+            raise
+
+    async def discard_and_kill(self, read: Read):
+        """Give read's connection back to the pool first, unread results
+        may be left on it so it is discarded, then kill its query"""
+        thread_id = read.server_thread_id()
+        await read.close_async(discard=True)
+        await self.kill_query(thread_id)
+
+    async def kill_query(self, thread_id: None | int):
+        """Stop the statement of the session thread_id at the replica, so that
+        a cancelled request does not keep it busy. Cancellations come in
+        bursts when the pool is exhausted, so KILL QUERY is sent on a
+        connection of its own, given up after KILL_QUERY_TIMEOUT."""
+        if thread_id is None or self.pool is None:
+            return
+        try:
+            await execute_unpooled(
+                self.pool,
+                "KILL QUERY %s",
+                [thread_id],
+                timeout=config.KILL_QUERY_TIMEOUT,
+            )
+        except (pymysql.err.Error, OSError, DbConnectionError):
+            # OSError includes TimeoutError
+            logger.warning(f"Could not kill query {thread_id}", exc_info=True)
@@ -0,0 +1,129 @@
+import asyncio
+from collections import OrderedDict
+from typing import Any
+from weakref import WeakValueDictionary
+
+from pydantic import BaseModel, PrivateAttr
+
+from models.page_aggregate import PageAggregate, as_text
+from models.revisions import Revisions
+from models.validator import Validator
+from models.window import shift_timestamp
+
+StateKey = tuple[str, bool, bool, tuple[str, ...], frozenset[int] | None]
+
+
+class EntityState(BaseModel):
+    """Aggregation state for one entity and filter combination
+
+    synced_until is the high-water mark: every revision up to it has been
+    merged in. recent maps the rev_ids seen within the overlap before the
+    mark to their timestamp, so re-reading the overlap doesn't count them twice."""
+
+    entity_id: str
+    start_date: str
+    end_date: str
+    synced_until: str
+    pages: dict[int, PageAggregate] = {}
+    recent: dict[int, str] = {}
+
+    def can_advance_to(self, start_date: str, end_date: str) -> bool:
+        """Whether the new window can be reached by trimming the start
+        and appending to the end, instead of a full fetch"""
+        return self.start_date <= start_date <= self.end_date <= end_date
+
+    def is_settled(self, end_date: str, now: str, overlap: int) -> bool:
+        """A window that ended more than the overlap ago can't get new revisions"""
+        return self.synced_until >= end_date and end_date < shift_timestamp(
+            now, -overlap
+        )
+
+    def add(self, row: dict[str, Any]):
+        page_id = int(row["rev_page"])
+        if page_id in self.pages:
+            self.pages[page_id].add(row)
+        else:
+            self.pages[page_id] = PageAggregate.from_row(row)
+
+    def remove(self, row: dict[str, Any]):
+        page = self.pages.get(int(row["rev_page"]))
+        if page is not None:
+            page.remove(row)
+
+    def mark_synced(self, rows: list[dict[str, Any]], synced_until: str, overlap: int):
+        floor = shift_timestamp(synced_until, -overlap)
+        recent = {rev_id: ts for rev_id, ts in self.recent.items() if ts >= floor}
+        for row in rows:
+            timestamp = as_text(row["rev_timestamp"])
+            if timestamp >= floor:
+                recent[int(row["rev_id"])] = timestamp
+        self.recent = recent
+        self.synced_until = synced_until
+
+    def to_revisions(self) -> list[Revisions]:
+        return [page.to_revisions() for page in self.pages.values() if page.total]
+
+
+class IncrementalStats(BaseModel):
+    full_fetches: int = 0
+    delta_fetches: int = 0
+    edge_trims: int = 0
+    settled: int = 0
+    rows_fetched: int = 0
+    entries: int = 0
+
+
+class IncrementalCache(BaseModel):
+    """LRU of EntityState keyed by entity and filters but not by window,
+    so a sliding window can reuse the state of the previous poll"""
+
+    max_entities: int = 10000
+    overlap: int = 120
+
+    _states: OrderedDict = PrivateAttr(default_factory=OrderedDict)
+    # Only kept while someone holds or waits for them
+    _locks: WeakValueDictionary = PrivateAttr(default_factory=WeakValueDictionary)
+    _stats: IncrementalStats = PrivateAttr(default_factory=IncrementalStats)
+
+    @staticmethod
+    def key(
+        entity: str, params: Validator, bot_ids: frozenset[int] | None = None
+    ) -> StateKey:
+        """bot_ids are the BotRegistry.ids the state was filtered with, after
+        a refresh no_bots states of the old ids are no longer found"""
+        return (
+            entity,
+            params.no_bots,
+            params.only_unpatrolled,
+            tuple(sorted(set(params.exclude_users))),
+            bot_ids if params.no_bots else None,
+        )
+
+    def lock(self, key: StateKey) -> asyncio.Lock:
+        """Held while the state of key is read and updated, a state changes
+        across several queries"""
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        return lock
+
+    def get(self, key: StateKey) -> EntityState | None:
+        state = self._states.get(key)
+        if state is not None:
+            self._states.move_to_end(key)
+        return state
+
+    def set(self, key: StateKey, state: EntityState):
+        self._states[key] = state
+        self._states.move_to_end(key)
+        while len(self._states) > self.max_entities:
+            self._states.popitem(last=False)
+
+    def record(self, **counters: int):
+        for name, value in counters.items():
+            setattr(self._stats, name, getattr(self._stats, name) + value)
+
+    def stats(self) -> IncrementalStats:
+        stats = self._stats.model_copy()
+        stats.entries = len(self._states)
+        return stats
@@ -0,0 +1,116 @@
+"""Aggregated request metrics in the Prometheus text format"""
+
+from bisect import bisect_left
+
+from pydantic import BaseModel, PrivateAttr
+
+from models.timing import RequestTimings
+
+SECONDS_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+ROW_BUCKETS = (0, 10, 100, 1000, 10_000, 100_000, 1_000_000)
+ENTITY_BUCKETS = (1, 5, 10, 25, 50, 100, 1000, 10_000, 50_000)
+WAITER_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100)
+
+# Counts that are observed as histograms, the others are summed as counters
+COUNT_HISTOGRAMS = {
+    "rows": ROW_BUCKETS,
+    "entities": ENTITY_BUCKETS,
+    # Requests that shared the fetch of a request, observed on that request
+    "coalesced_waiters": WAITER_BUCKETS,
+}
+
+
+class Histogram(BaseModel):
+    buckets: tuple[float, ...]
+
+    _counts: list[int] = PrivateAttr(default_factory=list)
+    _sum: float = PrivateAttr(default=0.0)
+
+    def model_post_init(self, context):
+        # The last slot counts observations above the largest bucket
+        self._counts = [0] * (len(self.buckets) + 1)
+
+    def observe(self, value: float):
+        self._counts[bisect_left(self.buckets, value)] += 1
+        self._sum += value
+
+    def render(self, name: str, labels: str = "") -> list[str]:
+        prefix = f"{labels}," if labels else ""
+        lines = []
+        cumulative = 0
+        bounds = [f"{bound:g}" for bound in self.buckets] + ["+Inf"]
+        for bound, bucket_count in zip(bounds, self._counts, strict=True):
+            cumulative += bucket_count
+            lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self._sum}")
+        lines.append(f"{name}_count{suffix} {cumulative}")
+        return lines
+
+
+class Metrics(BaseModel):
+    """Histograms of stage durations, rows and entities per request and
+    counters of requests, cache hits and pool waits"""
+
+    _stages: dict[str, Histogram] = PrivateAttr(default_factory=dict)
+    _counts: dict[str, Histogram] = PrivateAttr(default_factory=dict)
+    _counters: dict[str, int] = PrivateAttr(default_factory=dict)
+    _requests: dict[str, int] = PrivateAttr(default_factory=dict)
+
+    def observe(self, path: str, timings: RequestTimings):
+        self._requests[path] = self._requests.get(path, 0) + 1
+        for stage, seconds in timings.stages.items():
+            histogram = self._stages.get(stage)
+            if histogram is None:
+                histogram = self._stages[stage] = Histogram(buckets=SECONDS_BUCKETS)
+            histogram.observe(seconds)
+        for name, value in timings.counts.items():
+            buckets = COUNT_HISTOGRAMS.get(name)
+            if buckets is None:
+                self._counters[name] = self._counters.get(name, 0) + value
+                continue
+            histogram = self._counts.get(name)
+            if histogram is None:
+                histogram = self._counts[name] = Histogram(buckets=buckets)
+            histogram.observe(value)
+
+    def render(self) -> str:
+        lines = [
+            "# HELP revisions_requests_total Instrumented requests",
+            "# TYPE revisions_requests_total counter",
+        ]
+        for path, value in sorted(self._requests.items()):
+            lines.append(f'revisions_requests_total{{path="{path}"}} {value}')
+        lines += [
+            "# HELP revisions_stage_seconds Time spent per request in each stage",
+            "# TYPE revisions_stage_seconds histogram",
+        ]
+        for stage, histogram in sorted(self._stages.items()):
+            lines += histogram.render("revisions_stage_seconds", f'stage="{stage}"')
+        for name, histogram in sorted(self._counts.items()):
+            lines += [
+                f"# HELP revisions_{name} {name.replace('_', ' ').capitalize()} per request",
+                f"# TYPE revisions_{name} histogram",
+                *histogram.render(f"revisions_{name}"),
+            ]
+        for name, value in sorted(self._counters.items()):
+            lines += [
+                f"# TYPE revisions_{name}_total counter",
+                f"revisions_{name}_total {value}",
+            ]
+        return "\n".join(lines) + "\n"
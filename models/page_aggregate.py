@@ -0,0 +1,96 @@
+from typing import Any
+
+from pydantic import BaseModel
+
+from models.revision import Revision
+from models.revisions import Revisions
+from models.user_count import UserCount
+
+
+def as_text(value: Any) -> str:
+    # The replica returns varbinary columns as bytes
+    if isinstance(value, bytes):
+        return value.decode("utf-8")
+    return str(value)
+
+
+def revision_from_row(row: dict[str, Any]) -> Revision:
+    """Build a Revision from a replica row. Converting the columns up front
+    keeps validation on its fast path and drops the extra columns."""
+    rc_patrolled = row.get("rc_patrolled")
+    return Revision(
+        rev_id=int(row["rev_id"]),
+        rev_page=int(row["rev_page"]),
+        rev_user=int(row["rev_user"]),
+        rev_user_text=as_text(row["rev_user_text"]),
+        rev_timestamp=as_text(row["rev_timestamp"]),
+        rc_patrolled=None if rc_patrolled is None else int(rc_patrolled),
+    )
+
+
+def order_key(row: dict[str, Any]) -> tuple[str, int]:
+    """Revisions are ordered by timestamp, ties broken by rev_id"""
+    return as_text(row["rev_timestamp"]), int(row["rev_id"])
+
+
+class PageAggregate(BaseModel):
+    """Mergeable aggregation state for a single page
+
+    Rows can be added and removed again, which is what incremental
+    refreshes need when the window slides."""
+
+    page_id: int
+    entity_id: str
+    earliest: dict[str, Any]
+    latest: dict[str, Any]
+    users: dict[tuple[int, str], int] = {}
+
+    @classmethod
+    def from_row(cls, row: dict[str, Any]) -> "PageAggregate":
+        page = cls(
+            page_id=int(row["rev_page"]),
+            entity_id=as_text(row["entity_id"]),
+            earliest=row,
+            latest=row,
+        )
+        page.users = {cls.user_key(row): 1}
+        return page
+
+    @staticmethod
+    def user_key(row: dict[str, Any]) -> tuple[int, str]:
+        return int(row["rev_user"]), as_text(row["rev_user_text"])
+
+    @property
+    def total(self) -> int:
+        return sum(self.users.values())
+
+    def add(self, row: dict[str, Any]):
+        if order_key(row) < order_key(self.earliest):
+            self.earliest = row
+        if order_key(row) > order_key(self.latest):
+            self.latest = row
+        key = self.user_key(row)
+        self.users[key] = self.users.get(key, 0) + 1
+
+    def remove(self, row: dict[str, Any]):
+        """Forget a row. earliest/latest are not recomputed here,
+        the caller has to re-query them if they fell out."""
+        key = self.user_key(row)
+        count = self.users.get(key, 0) - 1
+        if count > 0:
+            self.users[key] = count
+        else:
+            self.users.pop(key, None)
+
+    def to_revisions(self) -> Revisions:
+        return Revisions(
+            page_id=self.page_id,
+            entity_id=self.entity_id,
+            earliest=revision_from_row(self.earliest),
+            latest=revision_from_row(self.latest),
+            note="",
+            users=[
+                UserCount(user_id=user_id, username=username, count=count)
+                for (user_id, username), count in self.users.items()
+            ],
+        )
@@ -0,0 +1,397 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterator
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any
+
+import pymysql
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, PrivateAttr
+
+from models.exceptions import PoolTimeoutError
+from models.timing import add_time, count
+
+logger = logging.getLogger(__name__)
+
+
+class PoolStats(BaseModel):
+    """Counters describing the pool, exposed on the stats endpoint"""
+
+    size: int = 0
+    idle: int = 0
+    in_use: int = 0
+    created: int = 0
+    closed: int = 0
+    recycled: int = 0
+    health_check_failures: int = 0
+    checkouts: int = 0
+    waits: int = 0
+    timeouts: int = 0
+    wait_seconds_total: float = 0.0
+    wait_seconds_max: float = 0.0
+
+
+class PooledConnection(BaseModel):
+    """A connection owned by the pool together with its bookkeeping"""
+
+    connection: Any
+    created_at: float
+    uses: int = 0
+
+    def age(self, now: float) -> float:
+        return now - self.created_at
+
+
+class BasePool(BaseModel):
+    """Settings and bookkeeping shared by the sync and async pools
+
+    Connections are pinged before they are handed out and recycled
+    after max_uses checkouts or max_lifetime seconds, whichever comes first."""
+
+    min_size: int = 1
+    max_size: int = 10
+    max_uses: int = 1000
+    max_lifetime: float = 3600.0
+    timeout: float = 10.0
+    ping_on_checkout: bool = True
+
+    _idle: deque = PrivateAttr(default_factory=deque)
+    _size: int = PrivateAttr(default=0)
+    _closed: bool = PrivateAttr(default=False)
+    _stats: PoolStats = PrivateAttr(default_factory=PoolStats)
+
+    def _expired(self, pooled: PooledConnection) -> bool:
+        return (
+            pooled.uses >= self.max_uses
+            or pooled.age(time.monotonic()) >= self.max_lifetime
+        )
+
+    def _snapshot(self) -> PoolStats:
+        stats = self._stats.model_copy()
+        stats.size = self._size
+        stats.idle = len(self._idle)
+        stats.in_use = self._size - len(self._idle)
+        return stats
+
+    def _record_wait(self, start: float, waited: bool):
+        elapsed = time.monotonic() - start
+        if waited:
+            self._stats.waits += 1
+            count("pool_waits")
+        add_time("pool_wait", elapsed)
+        self._stats.wait_seconds_total += elapsed
+        self._stats.wait_seconds_max = max(self._stats.wait_seconds_max, elapsed)
+
+    def _mark_released(self, pooled: PooledConnection, discard: bool) -> bool:
+        """Return the connection to the idle list if it can be kept"""
+        keep = not (discard or self._closed or self._expired(pooled))
+        if keep:
+            self._idle.append(pooled)
+        else:
+            self._size -= 1
+            self._stats.closed += 1
+            if not discard and not self._closed:
+                self._stats.recycled += 1
+        return keep
+
+    @staticmethod
+    def _close_quietly(pooled: PooledConnection):
+        try:
+            pooled.connection.close()
+        except (OSError, pymysql.err.MySQLError) as e:
+            logger.debug(f"Ignoring error while closing connection: {e}")
+
+
+class ConnectionPool(BasePool):
+    """Thread safe pool of replica connections"""
+
+    connect: Callable[[], Any]
+
+    _condition: threading.Condition = PrivateAttr(default_factory=threading.Condition)
+
+    def open(self):
+        """Fill the pool up to min_size. Failures are logged, not raised,
+        so the app can start while the replica is unreachable."""
+        for _ in range(self.min_size - self._size):
+            try:
+                pooled = self._create()
+            except (OSError, pymysql.err.MySQLError) as e:
+                logger.warning(f"Could not prefill connection pool: {e}")
+                return
+            with self._condition:
+                self._idle.append(pooled)
+
+    def acquire(self) -> PooledConnection:
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise PoolTimeoutError("Connection pool is closed")
+                if self._idle:
+                    pooled = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    # Reserve the slot, the handshake happens outside the lock
+                    self._size += 1
+                    pooled = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats.timeouts += 1
+                    raise PoolTimeoutError(
+                        f"No connection available within {self.timeout}s"
+                    )
+                waited = True
+                self._condition.wait(remaining)
+            self._record_wait(start=start, waited=waited)
+        try:
+            pooled = (
+                self._create(reserved=True) if pooled is None else self._check(pooled)
+            )
+        except BaseException:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+        pooled.uses += 1
+        with self._condition:
+            self._stats.checkouts += 1
+        return pooled
+
+    def release(self, pooled: PooledConnection, discard: bool = False):
+        with self._condition:
+            keep = self._mark_released(pooled, discard=discard)
+            self._condition.notify()
+        if not keep:
+            self._close_quietly(pooled)
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        pooled = self.acquire()
+        discard = False
+        try:
+            yield pooled.connection
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+            discard = True
+            raise
+        finally:
+            self.release(pooled, discard=discard)
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._stats.closed += len(idle)
+            self._condition.notify_all()
+        for pooled in idle:
+            self._close_quietly(pooled)
+
+    def stats(self) -> PoolStats:
+        with self._condition:
+            return self._snapshot()
+
+    def _create(self, reserved: bool = False) -> PooledConnection:
+        if not reserved:
+            with self._condition:
+                self._size += 1
+        try:
+            connection = self.connect()
+        except BaseException:
+            if not reserved:
+                with self._condition:
+                    self._size -= 1
+            raise
+        with self._condition:
+            self._stats.created += 1
+        return PooledConnection(connection=connection, created_at=time.monotonic())
+
+    def _check(self, pooled: PooledConnection) -> PooledConnection:
+        """Replace the connection if it is expired or fails the ping"""
+        if self._expired(pooled):
+            with self._condition:
+                self._stats.recycled += 1
+                self._stats.closed += 1
+            self._close_quietly(pooled)
+            return self._create(reserved=True)
+        if self.ping_on_checkout:
+            try:
+                pooled.connection.ping(reconnect=False)
+            except (OSError, pymysql.err.MySQLError):
+                with self._condition:
+                    self._stats.health_check_failures += 1
+                    self._stats.closed += 1
+                self._close_quietly(pooled)
+                return self._create(reserved=True)
+        return pooled
+
+
+class AsyncConnectionPool(BasePool):
+    """Pool of aiomysql connections for the non-blocking read path.
+    Only use it from the event loop it was created on."""
+
+    connect: Callable[[], Awaitable[Any]]
+
+    _condition: asyncio.Condition = PrivateAttr(default_factory=asyncio.Condition)
+
+    async def open(self):
+        for _ in range(self.min_size - self._size):
+            self._size += 1
+            try:
+                pooled = await self._create()
+            except (OSError, pymysql.err.MySQLError) as e:
+                self._size -= 1
+                logger.warning(f"Could not prefill async connection pool: {e}")
+                return
+            self._idle.append(pooled)
+
+    async def acquire(self) -> PooledConnection:
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+        async with self._condition:
+            while True:
+                if self._closed:
+                    raise PoolTimeoutError("Connection pool is closed")
+                if self._idle:
+                    pooled = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    pooled = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats.timeouts += 1
+                    raise PoolTimeoutError(
+                        f"No connection available within {self.timeout}s"
+                    )
+                waited = True
+                try:
+                    await asyncio.wait_for(self._condition.wait(), remaining)
+                except TimeoutError:
+                    continue
+            self._record_wait(start=start, waited=waited)
+        try:
+            pooled = (
+                await self._create() if pooled is None else await self._check(pooled)
+            )
+        except BaseException:
+            async with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+        pooled.uses += 1
+        self._stats.checkouts += 1
+        return pooled
+
+    async def release(self, pooled: PooledConnection, discard: bool = False):
+        async with self._condition:
+            keep = self._mark_released(pooled, discard=discard)
+            self._condition.notify()
+        if not keep:
+            self._close_quietly(pooled)
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[Any]:
+        pooled = await self.acquire()
+        discard = False
+        try:
+            yield pooled.connection
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+            discard = True
+            raise
+        finally:
+            await self.release(pooled, discard=discard)
+
+    async def close(self):
+        async with self._condition:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._stats.closed += len(idle)
+            self._condition.notify_all()
+        for pooled in idle:
+            self._close_quietly(pooled)
+
+    def stats(self) -> PoolStats:
+        return self._snapshot()
+
+    async def _create(self) -> PooledConnection:
+        connection = await self.connect()
+        self._stats.created += 1
+        return PooledConnection(connection=connection, created_at=time.monotonic())
+
+    async def _check(self, pooled: PooledConnection) -> PooledConnection:
+        if self._expired(pooled):
+            self._stats.recycled += 1
+            self._stats.closed += 1
+            self._close_quietly(pooled)
+            return await self._create()
+        if self.ping_on_checkout:
+            try:
+                await pooled.connection.ping(reconnect=False)
+            except (OSError, pymysql.err.MySQLError):
+                self._stats.health_check_failures += 1
+                self._stats.closed += 1
+                self._close_quietly(pooled)
+                return await self._create()
+        return pooled
+
+
+async def fetch_all(
+    pool: ConnectionPool | AsyncConnectionPool, sql: str, params_list: list
+) -> list[dict[str, Any]]:
+    """Run a single query on a pooled connection, for queries outside Read"""
+    if isinstance(pool, AsyncConnectionPool):
+        async with pool.connection() as connection, connection.cursor() as cursor:
+            await cursor.execute(sql, params_list)
+            return await cursor.fetchall()
+
+    def fetch() -> list[dict[str, Any]]:
+        with pool.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(sql, params_list)
+            return cursor.fetchall()
+
+    return await run_in_threadpool(fetch)
+
+
+async def execute_unpooled(
+    pool: ConnectionPool | AsyncConnectionPool,
+    sql: str,
+    params_list: list,
+    timeout: float,
+):
+    """Run a statement on a connection of its own, opened with the pool's
+    connect and closed after it, e.g. KILL QUERY while all pooled
+    connections are busy. Raises TimeoutError after `timeout` seconds."""
+    if isinstance(pool, AsyncConnectionPool):
+
+        async def run_async():
+            connection = await pool.connect()
+            try:
+                async with connection.cursor() as cursor:
+                    await cursor.execute(sql, params_list)
+            finally:
+                connection.close()
+
+        await asyncio.wait_for(run_async(), timeout)
+        return
+
+    def run():
+        connection = pool.connect()
+        try:
+            connection.cursor().execute(sql, params_list)
+        finally:
+            connection.close()
+
+    # A thread can't be cancelled, past the timeout it finishes on its own
+    await asyncio.wait_for(run_in_threadpool(run), timeout)
@@ -0,0 +1,129 @@
+"""Sampling profiler for a single request
+
+An admin sends a request with the X-Profile header. ProfilerMiddleware
+runs it while SamplingProfiler samples the thread stacks, discards the
+response and returns the samples as folded stacks, one "frame;frame;frame
+count" line per distinct stack, which flamegraph.pl and speedscope read."""
+
+import asyncio
+import sys
+import threading
+from collections import Counter
+from pathlib import Path
+
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, PrivateAttr
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+import config
+from models.admin import ADMIN_HEADER, is_admin
+
+PROFILE_HEADER = "X-Profile"
+# Where threads wait for work, idle threads would drown the profile
+IDLE_FILES = ("threading.py", str(Path("concurrent", "futures", "thread.py")))
+
+
+def frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+
+class SamplingProfiler(BaseModel):
+    """Samples the stack of `thread_id`, the event loop, and of the other
+    threads that are not idle, e.g. sync DB calls in the threadpool"""
+
+    thread_id: int
+    interval: float = 0.005
+
+    _stacks: Counter = PrivateAttr(default_factory=Counter)
+    _stop: threading.Event = PrivateAttr(default_factory=threading.Event)
+    _sampler: None | threading.Thread = PrivateAttr(default=None)
+
+    @property
+    def samples(self) -> int:
+        return sum(self._stacks.values())
+
+    def start(self):
+        self._sampler = threading.Thread(target=self._run, daemon=True)
+        self._sampler.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+            self._sampler = None
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            # The only way to see the stacks of other threads
+            for thread_id, frame in sys._current_frames().items():  # noqa: SLF001
+                if thread_id == own:
+                    continue
+                if thread_id != self.thread_id and frame.f_code.co_filename.endswith(
+                    IDLE_FILES
+                ):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self._stacks[";".join(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        return "".join(
+            f"{stack} {count}\n" for stack, count in self._stacks.most_common()
+        )
+
+
+class ProfilerMiddleware:
+    """Profiles requests that carry the X-Profile header and the admin
+    token, one at a time, and responds with the folded stacks"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self._lock = asyncio.Lock()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or PROFILE_HEADER.lower().encode() not in dict(
+            scope["headers"]
+        ):
+            await self.app(scope, receive, send)
+            return
+        if not is_admin(Headers(scope=scope).get(ADMIN_HEADER)):
+            response = PlainTextResponse("Admin token required", status_code=403)
+        elif self._lock.locked():
+            response = PlainTextResponse(
+                "Another request is being profiled", status_code=409
+            )
+        else:
+            async with self._lock:
+                response = await self._profile(scope, receive)
+        await response(scope, receive, send)
+
+    async def _profile(self, scope: Scope, receive: Receive) -> PlainTextResponse:
+        status = 0
+
+        async def discard(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        profiler = SamplingProfiler(
+            thread_id=threading.get_ident(), interval=config.PROFILER_INTERVAL
+        )
+        profiler.start()
+        try:
+            await self.app(scope, receive, discard)
+        finally:
+            profiler.stop()
+        return PlainTextResponse(
+            profiler.folded(),
+            headers={
+                "X-Profiled-Status": str(status),
+                "X-Profile-Samples": str(profiler.samples),
+            },
+        )
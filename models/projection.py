@@ -0,0 +1,172 @@
+"""Sparse fieldsets and the columnar format of /revisions
+
+A Projection picks fields of Revisions, see FIELDS, and serializes pages
+straight from the aggregation state, so the fields that were not asked
+for are never built. The columnar format sends one array per field
+instead of one object per page, with usernames interned:
+
+    {"count": 2,
+     "columns": {"page_id": [1, 2], "latest.rev_user_text": [0, 0],
+                 "users": [[[7, 0, 3]], [[7, 0, 1], [9, 1, 2]]]},
+     "usernames": ["Alice", "Bob"]}
+
+Usernames are indices into "usernames" and each users element is a list
+of [user_id, username, count]."""
+
+from collections.abc import Callable, Iterable
+from operator import attrgetter, itemgetter
+from typing import Any
+
+import orjson
+from pydantic import BaseModel, Field, field_validator
+
+from models.revision import Revision
+from models.revisions import Revisions
+
+REVISION_FIELDS = tuple(Revision.model_fields)
+
+# page_id, entity_id, earliest, latest, note, {(user id, username): count}
+Page = tuple[int, str, Any, Any, str, dict[tuple[int, str], int]]
+
+# All fields in output order. user_count and edit_count are not part of
+# Revisions, they are the number of users and the sum of their counts.
+FIELDS = (
+    "page_id",
+    "entity_id",
+    *(f"earliest.{name}" for name in REVISION_FIELDS),
+    *(f"latest.{name}" for name in REVISION_FIELDS),
+    "note",
+    "users",
+    "user_count",
+    "edit_count",
+)
+DEFAULT_FIELDS = FIELDS[: FIELDS.index("users") + 1]
+INTERNED = {"earliest.rev_user_text", "latest.rev_user_text"}
+
+
+def pages_from_aggregator(pages: dict[int, list]) -> list[Page]:
+    """From RecordAggregator.pages(), no models are built"""
+    return [
+        (page_id, earliest.entity_id, earliest, latest, "", users)
+        for page_id, (earliest, latest, users) in pages.items()
+    ]
+
+
+def pages_from_revisions(revisions: Iterable[Revisions]) -> list[Page]:
+    return [
+        (
+            revision.page_id,
+            revision.entity_id,
+            revision.earliest,
+            revision.latest,
+            revision.note,
+            {(user.user_id, user.username): user.count for user in revision.users},
+        )
+        for revision in revisions
+    ]
+
+
+def getter(field: str) -> Callable[[Page], Any]:
+    if field.startswith(("earliest.", "latest.")):
+        edge, name = field.split(".")
+        get_edge = itemgetter(2 if edge == "earliest" else 3)
+        get_value = attrgetter(name)
+        return lambda page: get_value(get_edge(page))
+    if field == "user_count":
+        return lambda page: len(page[5])
+    if field == "edit_count":
+        return lambda page: sum(page[5].values())
+    return itemgetter(("page_id", "entity_id", "", "", "note").index(field))
+
+
+def column(field: str, pages: list[Page]) -> list[Any]:
+    """The values of field in all pages, map() keeps the loop in C"""
+    if field.startswith(("earliest.", "latest.")):
+        edge, name = field.split(".")
+        edges = map(itemgetter(2 if edge == "earliest" else 3), pages)
+        return list(map(attrgetter(name), edges))
+    return list(map(getter(field), pages))
+
+
+class Projection(BaseModel):
+    """The fields to return, earliest and latest select all their fields.
+    Without fields the columnar format has the fields of Revisions."""
+
+    fields: list[str] = Field(default=[], validate_default=True)
+    columnar: bool = False
+
+    @field_validator("fields")
+    @classmethod
+    def check_fields(cls, fields: list[str]) -> list[str]:
+        chosen = set()
+        for field in fields:
+            if field in ("earliest", "latest"):
+                chosen.update(f"{field}.{name}" for name in REVISION_FIELDS)
+            elif field in FIELDS:
+                chosen.add(field)
+            else:
+                raise ValueError(
+                    f"Unknown field {field!r}, expected one of"
+                    f" {', '.join(('earliest', 'latest', *FIELDS))}"
+                )
+        return [field for field in FIELDS if field in (chosen or DEFAULT_FIELDS)]
+
+    @property
+    def key(self) -> str:
+        """Tells responses of different projections apart in caches"""
+        return ("columns:" if self.columnar else "fields:") + ",".join(self.fields)
+
+    def dump_json(self, pages: list[Page]) -> bytes:
+        if self.columnar:
+            return orjson.dumps(self.columns(pages))
+        return orjson.dumps(self.objects(pages))
+
+    def objects(self, pages: list[Page]) -> list[dict[str, Any]]:
+        """One object per page with the fields nested like in Revisions"""
+        getters = [
+            (field.split(".") if "." in field else [field], self._getter(field))
+            for field in self.fields
+        ]
+        objects = []
+        for page in pages:
+            obj: dict[str, Any] = {}
+            for path, get in getters:
+                if len(path) == 1:
+                    obj[path[0]] = get(page)
+                else:
+                    obj.setdefault(path[0], {})[path[1]] = get(page)
+            objects.append(obj)
+        return objects
+
+    def columns(self, pages: list[Page]) -> dict[str, Any]:
+        # username -> index in the usernames array
+        usernames: dict[str, int] = {}
+        columns: dict[str, list] = {}
+        for field in self.fields:
+            if field == "users":
+                # Tuples are serialized as arrays too and, unlike lists, do
+                # not keep the garbage collector busy
+                columns[field] = [
+                    [
+                        (user_id, usernames.setdefault(username, len(usernames)), n)
+                        for (user_id, username), n in page[5].items()
+                    ]
+                    for page in pages
+                ]
+            elif field in INTERNED:
+                columns[field] = [
+                    usernames.setdefault(username, len(usernames))
+                    for username in column(field, pages)
+                ]
+            else:
+                columns[field] = column(field, pages)
+        return {"count": len(pages), "columns": columns, "usernames": list(usernames)}
+
+    @staticmethod
+    def _getter(field: str) -> Callable[[Page], Any]:
+        if field == "users":
+            return lambda page: [
+                {"user_id": user_id, "username": username, "count": count}
+                for (user_id, username), count in page[5].items()
+            ]
+        return getter(field)
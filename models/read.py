@@ -1,49 +1,135 @@
+import logging
 import os
+import time
+from collections.abc import AsyncIterator, Iterator
+from typing import Any
 
-from models.exceptions import DbConnectionError
+import config
+from models.exceptions import DbConnectionError, DeadlineExceededError
 
 # Fix bug with pymysql
 if "USER" not in os.environ:
     os.environ["USER"] = "tools.sparql-rc2-backend"
+# pymysql reads USER when imported, so it and whatever imports it (aiomysql,
+# models.pool, models.revision_row) come after
+import aiomysql
 import pymysql
 from pydantic import BaseModel
 from pymysql.connections import Connection
-from pymysql.cursors import DictCursor
+from pymysql.constants import ER
+from pymysql.converters import conversions, decoders
+from pymysql.cursors import Cursor, DictCursor, SSDictCursor
 
+from models.deadline import remaining
+from models.page_aggregate import as_text
+from models.pool import AsyncConnectionPool, ConnectionPool, PooledConnection
+from models.revision_row import DECODERS, RevisionRow
+from models.slow_query_log import SlowQueryLog
 from models.validator import Validator  # your Pydantic model
 
+logger = logging.getLogger(__name__)
+
+
+def statement_timed_out(error: pymysql.err.OperationalError) -> bool:
+    return bool(error.args) and error.args[0] == ER.STATEMENT_TIMEOUT
+
+
+# Session temporary table used by the bulk endpoint, see Read.entity_table
+TEMP_ENTITY_TABLE = "tmp_bulk_entities"
+
+
+def open_replica_connection() -> Connection:
+    user = os.environ.get("TOOL_REPLICA_USER")
+    password = os.environ.get("TOOL_REPLICA_PASSWORD")
+    if not password or not user:
+        raise OSError("Could not get environment variables")
+    return pymysql.connect(
+        host=config.REPLICA_HOST,
+        user=user,
+        password=password,
+        database=config.REPLICA_DATABASE,
+        charset="utf8mb4",
+        cursorclass=DictCursor,
+        conv={**conversions, **DECODERS},
+        # Pooled connections are reused, without autocommit the first SELECT
+        # would hold one REPEATABLE READ snapshot until they are recycled
+        autocommit=True,
+    )
+
+
+async def open_replica_connection_async() -> aiomysql.Connection:
+    user = os.environ.get("TOOL_REPLICA_USER")
+    password = os.environ.get("TOOL_REPLICA_PASSWORD")
+    if not password or not user:
+        raise OSError("Could not get environment variables")
+    return await aiomysql.connect(
+        host=config.REPLICA_HOST,
+        user=user,
+        password=password,
+        db=config.REPLICA_DATABASE,
+        charset="utf8mb4",
+        cursorclass=aiomysql.DictCursor,
+        conv={**decoders, **DECODERS},
+        # See open_replica_connection
+        autocommit=True,
+    )
+
 
 class Read(BaseModel):
     params: Validator
-    db: None | Connection = None
+    db: Any = None
+    pool: None | ConnectionPool = None
+    async_pool: None | AsyncConnectionPool = None
+    lease: None | PooledConnection = None
+    entity_table: None | str = None
+    # Bot user ids from the BotRegistry. When set, no_bots filters on this
+    # list instead of an anti-join on user_groups
+    bot_ids: None | frozenset[int] = None
+    # page id -> entity id from the EntityResolver. When set, revisions are
+    # selected by rev_page without joining page
+    page_titles: None | dict[int, str] = None
+    # Queries slower than its threshold are recorded with their EXPLAIN plan
+    slow_query_log: None | SlowQueryLog = None
+    # time.monotonic() by which the request must be done
+    deadline: None | float = None
 
     class Config:
         arbitrary_types_allowed = True
 
     def connect(self):
-        # Opens a new DB connection and assigns to self.db
+        # Borrows a connection from the pool if we have one,
+        # otherwise opens a new DB connection. Assigns it to self.db
         if self.db is None:
-            user = os.environ.get("TOOL_REPLICA_USER")
-            password = os.environ.get("TOOL_REPLICA_PASSWORD")
-            if not password or not user:
-                raise OSError("Could not get environment variables")
-            self.db = pymysql.connect(
-                host="wikidatawiki.web.db.svc.wikimedia.cloud",
-                user=user,
-                password=password,
-                database="wikidatawiki_p",
-                charset="utf8mb4",
-                cursorclass=DictCursor,
-            )
+            if self.pool is not None:
+                self.lease = self.pool.acquire()
+                self.db = self.lease.connection
+            else:
+                self.db = open_replica_connection()
         return self.db
 
-    def fetch_revisions(self):
-        # Make sure we have a DB connection
-        self.connect()
-        if not self.db:
-            raise DbConnectionError()
-        cursor = self.db.cursor()
-        placeholders = ",".join(["%s"] * len(self.params.entities))
+    def build_query(self) -> tuple[str, list]:
+        """Build the revision SQL and its parameters from self.params.
+        Shared by the sync and async fetch paths."""
+        page_join = "JOIN page p ON r.rev_page = p.page_id"
+        entity_column = "p.page_title"
+        scope = "p.page_namespace IN (0,102,120,146)"
+        entity_join = ""
+        entity_filter = ""
+        entity_params: list = []
+        if self.page_titles is not None:
+            # The entities were resolved to page ids, skip the page join.
+            # entity_id holds the page id until add_titles() fills it in
+            page_join = ""
+            entity_column = "r.rev_page"
+            scope = f"r.rev_page IN ({','.join(['%s'] * len(self.page_titles))})"
+            entity_params = list(self.page_titles)
+        elif self.entity_table:
+            # The entities were loaded with load_entity_table, join on them
+            entity_join = f"JOIN {self.entity_table} e ON e.page_title = p.page_title"
+        else:
+            placeholders = ",".join(["%s"] * len(self.params.entities))
+            entity_filter = f"AND p.page_title IN ({placeholders})"
+            entity_params = list(self.params.entities)
         """
         Full content looks like this
          {'entity_id': b'Q1',
@@ -74,14 +160,15 @@ class Read(BaseModel):
                             r.rev_user,
                             r.rev_user_text,
                             r.rev_timestamp,
-                            p.page_title AS entity_id,
+                            {entity_column} AS entity_id,
                             rc.rc_patrolled
                         FROM revision_compat r
-                        JOIN page p ON r.rev_page = p.page_id
+                        {page_join}
+                        {entity_join}
                         JOIN recentchanges rc ON r.rev_id = rc.rc_this_oldid
-                        WHERE p.page_namespace IN (0,102,120,146)
+                        WHERE {scope}
                           AND rc.rc_patrolled = 0
-                          AND p.page_title IN ({placeholders})
+                          {entity_filter}
                           AND r.rev_timestamp BETWEEN %s AND %s
                     """
         else:
@@ -94,27 +181,34 @@ class Read(BaseModel):
                     r.rev_user,
                     r.rev_user_text,
                     r.rev_timestamp,
-                    p.page_title AS entity_id,
+                    {entity_column} AS entity_id,
                     rc.rc_patrolled
                 FROM revision_compat r
-                JOIN page p ON r.rev_page = p.page_id
+                {page_join}
+                {entity_join}
                 LEFT JOIN recentchanges rc ON r.rev_id = rc.rc_this_oldid
-                WHERE p.page_namespace IN (0,102,120,146)
-                  AND p.page_title IN ({placeholders})
+                WHERE {scope}
+                  {entity_filter}
                   AND r.rev_timestamp BETWEEN %s AND %s
             """
         params_list = [
-            *self.params.entities,
+            *entity_params,
             self.params.start_date,
             self.params.end_date,
         ]
 
-        if self.params.no_bots:
+        if self.params.no_bots and self.bot_ids is None:
             sql += """
                 AND r.rev_user NOT IN (
                     SELECT ug_user FROM user_groups WHERE ug_group='bot'
                 )
             """
+        elif self.params.no_bots and self.bot_ids:
+            placeholders_bots = ",".join(["%s"] * len(self.bot_ids))
+            sql += f"""
+                AND r.rev_user NOT IN ({placeholders_bots})
+            """
+            params_list.extend(sorted(self.bot_ids))
         if self.params.exclude_users:
             placeholders_exclude = ",".join(["%s"] * len(self.params.exclude_users))
             sql += f"""
@@ -122,10 +216,358 @@ class Read(BaseModel):
             """
             params_list.extend(self.params.exclude_users)
 
-        cursor.execute(sql, params_list)
-        return cursor.fetchall()
+        return sql, params_list
+
+    def build_page_query(self) -> tuple[str, list]:
+        """Page id and namespace of self.params.entities, see EntityResolver"""
+        placeholders = ",".join(["%s"] * len(self.params.entities))
+        sql = f"""
+            SELECT p.page_id, p.page_namespace, p.page_title
+            FROM page p
+            WHERE p.page_namespace IN (0,102,120,146)
+              AND p.page_title IN ({placeholders})
+        """  # noqa: S608
+        return sql, list(self.params.entities)
+
+    def add_titles(self, rows: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Replace the page ids selected as entity_id, see page_titles.
+        Rows without entity_id, e.g. of the probe, are left as they are."""
+        if self.page_titles is not None and rows and "entity_id" in rows[0]:
+            for row in rows:
+                row["entity_id"] = self.page_titles[row["entity_id"]]
+        return rows
+
+    def to_records(self, rows: list[tuple]) -> list[RevisionRow]:
+        if self.page_titles is None:
+            return list(map(RevisionRow._make, rows))
+        titles = self.page_titles
+        return [RevisionRow(*row[:5], titles[row[5]], row[6]) for row in rows]
+
+    def build_earliest_query(self) -> tuple[str, list]:
+        """Only the earliest revision per page within the params window"""
+        sql, params_list = self.build_query()
+        sql = f"""
+            SELECT * FROM (
+                SELECT t.*, ROW_NUMBER() OVER (
+                    PARTITION BY t.rev_page ORDER BY t.rev_timestamp, t.rev_id
+                ) AS rn
+                FROM ({sql}) t
+            ) ranked
+            WHERE rn = 1
+        """  # noqa: S608
+        return sql, params_list
+
+    def build_user_count_query(self) -> tuple[str, list]:
+        """Number of revisions per (page, user) instead of one row per revision"""
+        sql, params_list = self.build_query()
+        sql = f"""
+            SELECT t.rev_page, t.entity_id, t.rev_user, t.rev_user_text,
+                   COUNT(*) AS count
+            FROM ({sql}) t
+            GROUP BY t.rev_page, t.entity_id, t.rev_user, t.rev_user_text
+        """  # noqa: S608
+        return sql, params_list
+
+    def build_probe_query(self) -> tuple[str, list]:
+        """Per page the number of revisions, the highest rev_id and the
+        patrol state, which change whenever the aggregation would. Only
+        reads the (rev_page, rev_timestamp) index and recentchanges."""
+        sql, params_list = self.build_query()
+        sql = f"""
+            SELECT t.rev_page, COUNT(*) AS count, MAX(t.rev_id) AS max_rev_id,
+                   COUNT(t.rc_patrolled) AS in_recentchanges,
+                   SUM(t.rc_patrolled) AS patrolled
+            FROM ({sql}) t
+            GROUP BY t.rev_page
+        """  # noqa: S608
+        return sql, params_list
+
+    def build_edge_query(self) -> tuple[str, list]:
+        """The earliest and latest revision per page, ties broken by rev_id"""
+        sql, params_list = self.build_query()
+        sql = f"""
+            SELECT * FROM (
+                SELECT t.*,
+                    ROW_NUMBER() OVER (
+                        PARTITION BY t.rev_page ORDER BY t.rev_timestamp, t.rev_id
+                    ) AS rn_first,
+                    ROW_NUMBER() OVER (
+                        PARTITION BY t.rev_page
+                        ORDER BY t.rev_timestamp DESC, t.rev_id DESC
+                    ) AS rn_last
+                FROM ({sql}) t
+            ) ranked
+            WHERE rn_first = 1 OR rn_last = 1
+        """  # noqa: S608
+        return sql, params_list
+
+    def build_entity_table_statements(
+        self, batch_size: int = 1000
+    ) -> list[tuple[str, list]]:
+        """Statements that (re)create the session temporary table and load
+        self.params.entities into it, batch_size rows per INSERT"""
+        entities = self.params.entities
+        statements: list[tuple[str, list]] = [
+            (f"DROP TEMPORARY TABLE IF EXISTS {self.entity_table}", []),
+            (
+                (
+                    f"CREATE TEMPORARY TABLE {self.entity_table} "
+                    "(page_title VARBINARY(255) PRIMARY KEY)"
+                ),
+                [],
+            ),
+        ]
+        for start in range(0, len(entities), batch_size):
+            batch = entities[start : start + batch_size]
+            values = ",".join(["(%s)"] * len(batch))
+            sql = f"INSERT INTO {self.entity_table} (page_title) VALUES {values}"  # noqa: S608
+            statements.append((sql, batch))
+        return statements
+
+    def load_entity_table(self):
+        for sql, params_list in self.build_entity_table_statements():
+            self.execute(sql, params_list)
+
+    async def load_entity_table_async(self):
+        for sql, params_list in self.build_entity_table_statements():
+            await self.execute_async(sql, params_list)
+
+    def drop_entity_table(self):
+        self.execute(f"DROP TEMPORARY TABLE IF EXISTS {self.entity_table}", [])
+
+    async def drop_entity_table_async(self):
+        await self.execute_async(
+            f"DROP TEMPORARY TABLE IF EXISTS {self.entity_table}", []
+        )
+
+    def fetch_revisions(self):
+        return self.execute(*self.build_query())
+
+    def execute(self, sql: str, params_list: list, records: bool = False):
+        """Rows as dicts, or as RevisionRow records read through a tuple
+        cursor if records is set. The latter only fits build_query."""
+        # Make sure we have a DB connection
+        self.connect()
+        if not self.db:
+            raise DbConnectionError()
+        cursor = self.db.cursor(Cursor) if records else self.db.cursor()
+        try:
+            started = time.perf_counter()
+            cursor.execute(self.bounded(sql), params_list)
+            rows = cursor.fetchall()
+            seconds = time.perf_counter() - started
+            if self.slow_query_log and self.slow_query_log.is_slow(seconds):
+                self.record_slow_query(
+                    sql, params_list, seconds, len(rows), self.explain(sql, params_list)
+                )
+            if records:
+                return self.to_records(rows)
+            return self.add_titles(rows)
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError) as e:
+            # The connection is unusable, don't hand it back to the pool
+            self.close(discard=True)
+            if isinstance(e, pymysql.err.OperationalError) and statement_timed_out(e):
+                raise DeadlineExceededError() from e
+            raise
+
+    def iter_revisions(self, batch_size: int = 1000) -> Iterator[dict[str, Any]]:
+        """Stream the rows through an unbuffered server-side cursor,
+        fetching batch_size rows at a time"""
+        self.connect()
+        if not self.db:
+            raise DbConnectionError()
+        sql, params_list = self.build_query()
+        cursor = self.db.cursor(SSDictCursor)
+        try:
+            started = time.perf_counter()
+            rows = 0
+            cursor.execute(self.bounded(sql), params_list)
+            while batch := cursor.fetchmany(batch_size):
+                rows += len(batch)
+                yield from self.add_titles(batch)
+            cursor.close()
+            # Includes the time the caller spent on the rows
+            seconds = time.perf_counter() - started
+            if self.slow_query_log and self.slow_query_log.is_slow(seconds):
+                self.record_slow_query(
+                    sql, params_list, seconds, rows, self.explain(sql, params_list)
+                )
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError) as e:
+            self.close(discard=True)
+            if isinstance(e, pymysql.err.OperationalError) and statement_timed_out(e):
+                raise DeadlineExceededError() from e
+            raise
+        except GeneratorExit:
+            # Unread rows are left on the connection, don't reuse it
+            self.close(discard=True)
+            raise
+
+    async def connect_async(self):
+        # Same as connect() but for the non-blocking aiomysql path
+        if self.db is None:
+            if self.async_pool is not None:
+                self.lease = await self.async_pool.acquire()
+                self.db = self.lease.connection
+            else:
+                self.db = await open_replica_connection_async()
+        return self.db
+
+    async def fetch_revisions_async(self):
+        """Async variant of fetch_revisions. Waiting on the replica
+        only costs a coroutine, not a threadpool slot."""
+        return await self.execute_async(*self.build_query())
+
+    async def aiter_revisions(
+        self, batch_size: int = 1000
+    ) -> AsyncIterator[list[dict[str, Any]]]:
+        """Async variant of iter_revisions, yields batches of rows"""
+        await self.connect_async()
+        if not self.db:
+            raise DbConnectionError()
+        sql, params_list = self.build_query()
+        finished = False
+        try:
+            started = time.perf_counter()
+            rows = 0
+            async with self.db.cursor(aiomysql.SSDictCursor) as cursor:
+                await cursor.execute(self.bounded(sql), params_list)
+                while batch := await cursor.fetchmany(batch_size):
+                    rows += len(batch)
+                    yield self.add_titles(batch)
+            finished = True
+            # Includes the time the caller spent on the batches
+            seconds = time.perf_counter() - started
+            if self.slow_query_log and self.slow_query_log.is_slow(seconds):
+                self.record_slow_query(
+                    sql,
+                    params_list,
+                    seconds,
+                    rows,
+                    await self.explain_async(sql, params_list),
+                )
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError) as e:
+            await self.close_async(discard=True)
+            if isinstance(e, pymysql.err.OperationalError) and statement_timed_out(e):
+                raise DeadlineExceededError() from e
+            raise
+        finally:
+            if not finished and self.db is not None:
+                # Unread rows are left on the connection, don't reuse it
+                await self.close_async(discard=True)
 
-    def close(self):
-        if self.db:
+    async def execute_async(self, sql: str, params_list: list, records: bool = False):
+        await self.connect_async()
+        if not self.db:
+            raise DbConnectionError()
+        cursor = self.db.cursor(aiomysql.Cursor) if records else self.db.cursor()
+        try:
+            async with cursor:
+                started = time.perf_counter()
+                await cursor.execute(self.bounded(sql), params_list)
+                rows = await cursor.fetchall()
+                seconds = time.perf_counter() - started
+            if self.slow_query_log and self.slow_query_log.is_slow(seconds):
+                self.record_slow_query(
+                    sql,
+                    params_list,
+                    seconds,
+                    len(rows),
+                    await self.explain_async(sql, params_list),
+                )
+            if records:
+                return self.to_records(rows)
+            return self.add_titles(rows)
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError) as e:
+            await self.close_async(discard=True)
+            if isinstance(e, pymysql.err.OperationalError) and statement_timed_out(e):
+                raise DeadlineExceededError() from e
+            raise
+
+    def bounded(self, sql: str) -> str:
+        """Have the replica abort a SELECT that runs past the deadline,
+        with MariaDB's max_statement_time set to the seconds left"""
+        left = remaining(self.deadline)
+        if left is None or not sql.lstrip().upper().startswith("SELECT"):
+            return sql
+        return f"SET STATEMENT max_statement_time={left:.3f} FOR {sql}"
+
+    def server_thread_id(self) -> None | int:
+        """Id of the connection's session on the server, for KILL QUERY"""
+        thread_id = getattr(self.db, "thread_id", None)
+        return thread_id() if thread_id is not None else None
+
+    def cardinalities(self, params_list: list) -> dict[str, int]:
+        return {
+            "entities": len(self.params.entities),
+            "exclude_users": len(self.params.exclude_users),
+            "bot_ids": len(self.bot_ids or ()),
+            "params": len(params_list),
+        }
+
+    def record_slow_query(
+        self,
+        sql: str,
+        params_list: list,
+        seconds: float,
+        rows: int,
+        explain: None | list[dict[str, Any]],
+    ):
+        if self.slow_query_log is None:
+            return
+        self.slow_query_log.record(
+            sql=sql,
+            seconds=seconds,
+            cardinalities=self.cardinalities(params_list),
+            rows=rows,
+            explain=explain,
+        )
+
+    @staticmethod
+    def explain_rows(rows: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        return [
+            {
+                key: as_text(value) if isinstance(value, bytes) else value
+                for key, value in row.items()
+            }
+            for row in rows
+        ]
+
+    def explain(self, sql: str, params_list: list) -> None | list[dict[str, Any]]:
+        """EXPLAIN the statement on the same connection, so a temporary
+        entity table is still there. None if that fails."""
+        cursor = self.db.cursor(DictCursor)
+        try:
+            cursor.execute(f"EXPLAIN {sql}", params_list)
+            return self.explain_rows(cursor.fetchall())
+        except pymysql.err.MySQLError as e:
+            logger.debug(f"Could not explain slow query: {e}")
+            return None
+
+    async def explain_async(
+        self, sql: str, params_list: list
+    ) -> None | list[dict[str, Any]]:
+        try:
+            async with self.db.cursor(aiomysql.DictCursor) as cursor:
+                await cursor.execute(f"EXPLAIN {sql}", params_list)
+                return self.explain_rows(await cursor.fetchall())
+        except pymysql.err.MySQLError as e:
+            logger.debug(f"Could not explain slow query: {e}")
+            return None
+
+    def close(self, discard: bool = False):
+        if self.lease is not None and self.pool is not None:
+            self.pool.release(self.lease, discard=discard)
+            self.lease = None
+            self.db = None
+        elif self.db:
+            self.db.close()
+            self.db = None
+
+    async def close_async(self, discard: bool = False):
+        if self.lease is not None and self.async_pool is not None:
+            await self.async_pool.release(self.lease, discard=discard)
+            self.lease = None
+            self.db = None
+        elif self.db:
             self.db.close()
             self.db = None
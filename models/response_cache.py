@@ -0,0 +1,76 @@
+import hashlib
+
+from fastapi_cache.types import Backend
+from pydantic import BaseModel, PrivateAttr, computed_field
+
+from models.validator import Validator
+
+
+class CacheStats(BaseModel):
+    hits: int = 0
+    misses: int = 0
+
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class ResponseCache(BaseModel):
+    """Caches serialized /revisions responses in a fastapi-cache backend
+
+    Keys are built from the validated parameters instead of the raw query
+    string, so equivalent requests share one entry."""
+
+    backend: Backend
+    expire: int = 60
+    prefix: str = "revisions"
+
+    _stats: CacheStats = PrivateAttr(default_factory=CacheStats)
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def key(self, params: Validator, variant: str = "") -> str:
+        return f"{self.prefix}:{self.canonical_key(params, variant)}"
+
+    @staticmethod
+    def canonical_key(params: Validator, variant: str = "") -> str:
+        """Sorted and deduplicated lists so that Q2,Q1 and Q1,Q2 match.
+        variant tells other representations of the same data apart, see
+        Projection.key."""
+        parts = [
+            ",".join(sorted(set(params.entities))),
+            params.start_date,
+            params.end_date,
+            str(int(params.no_bots)),
+            str(int(params.only_unpatrolled)),
+            ",".join(sorted(set(params.exclude_users))),
+        ]
+        if variant:
+            parts.append(variant)
+        canonical = "|".join(parts)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    async def get(self, key: str) -> bytes | None:
+        entry = await self.get_entry(key)
+        return None if entry is None else entry[0]
+
+    async def get_entry(self, key: str) -> tuple[bytes, str | None] | None:
+        """The response and the ETag it was stored with"""
+        value = await self.backend.get(key)
+        if value is None:
+            self._stats.misses += 1
+            return None
+        self._stats.hits += 1
+        etag, _, body = value.partition(b"\n")
+        return body, etag.decode() or None
+
+    async def set(self, key: str, value: bytes, etag: str | None = None):
+        # The ETag goes in a first line, ETags cannot contain line breaks
+        entry = (etag or "").encode() + b"\n" + value
+        await self.backend.set(key, entry, expire=self.expire)
+
+    def stats(self) -> CacheStats:
+        return self._stats.model_copy()
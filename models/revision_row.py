@@ -0,0 +1,35 @@
+from decimal import Decimal
+from typing import NamedTuple
+
+from pymysql.constants import FIELD_TYPE
+
+from models.page_aggregate import as_text
+
+
+def decode_decimal(value: str) -> int | Decimal:
+    # rev_user is a DECIMAL in the revision_compat view
+    return Decimal(value) if "." in value else int(value)
+
+
+# Decoders passed to the replica connections so the varbinary columns
+# arrive as str and rev_user as int, instead of bytes and Decimal
+DECODERS = {
+    FIELD_TYPE.STRING: as_text,
+    FIELD_TYPE.VAR_STRING: as_text,
+    FIELD_TYPE.NEWDECIMAL: decode_decimal,
+}
+
+
+class RevisionRow(NamedTuple):
+    """A row of Read.build_query read through a tuple cursor, see Read.execute
+
+    The fields are in the order of the SELECT, so a fetched tuple becomes a
+    record without copying it into a dict."""
+
+    rev_id: int
+    rev_page: int
+    rev_user: int
+    rev_user_text: str
+    rev_timestamp: str
+    entity_id: str
+    rc_patrolled: int | None
@@ -0,0 +1,425 @@
+"""Local copy of recent revisions, tailed from the replica
+
+RevisionStore keeps the tables and columns that Read queries in a SQLite
+database, so Read runs its SQL on it unchanged through the connections in
+models/sqlite_connection.py. RevisionIngester fills it from a source, by
+default the replica, and prunes what falls out of the retention."""
+
+import asyncio
+import contextlib
+import logging
+import sqlite3
+from typing import Any
+
+from pydantic import BaseModel, PrivateAttr
+
+from models.exceptions import DbConnectionError
+from models.page_aggregate import as_text
+from models.pool import AsyncConnectionPool, ConnectionPool, fetch_all
+from models.sqlite_connection import AsyncSQLiteConnection, SQLiteConnection
+from models.window import now_timestamp, parse_timestamp, shift_timestamp
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS page (
+    page_id INTEGER PRIMARY KEY,
+    page_namespace INTEGER NOT NULL,
+    page_title TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS page_name_title ON page (page_namespace, page_title);
+CREATE TABLE IF NOT EXISTS revision_compat (
+    rev_id INTEGER PRIMARY KEY,
+    rev_page INTEGER NOT NULL,
+    rev_user INTEGER NOT NULL,
+    rev_user_text TEXT NOT NULL,
+    rev_timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS rev_page_timestamp
+    ON revision_compat (rev_page, rev_timestamp);
+CREATE INDEX IF NOT EXISTS rev_timestamp ON revision_compat (rev_timestamp);
+CREATE TABLE IF NOT EXISTS recentchanges (
+    rc_this_oldid INTEGER PRIMARY KEY,
+    rc_patrolled INTEGER NOT NULL
+);
+-- Revisions read before their recentchanges row was written
+CREATE TABLE IF NOT EXISTS rc_pending (
+    rev_id INTEGER PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS user_groups (
+    ug_user INTEGER NOT NULL,
+    ug_group TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS store_state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def seconds_between(earlier: str, later: str) -> float:
+    return (parse_timestamp(later) - parse_timestamp(earlier)).total_seconds()
+
+
+class RevisionStoreStats(BaseModel):
+    rows: int = 0
+    high_water: int = 0
+    covered_from: None | str = None
+    synced_until: None | str = None
+    # Seconds between synced_until and now
+    lag_seconds: None | float = None
+    cycles: int = 0
+    failures: int = 0
+    rows_ingested: int = 0
+    rows_pruned: int = 0
+    served: int = 0
+    fallbacks: int = 0
+
+
+class RevisionStore(BaseModel):
+    """SQLite database with the replica tables that Read queries, holding
+    every revision since covered_from up to synced_until
+
+    uri is a SQLite URI, e.g. "file:revisions.sqlite". Requests whose window
+    falls inside the coverage are served from here, see covers()."""
+
+    uri: str
+    # How far past synced_until a window may end and still be served
+    max_lag: int = 60
+
+    high_water: int = 0
+    covered_from: None | str = None
+    synced_until: None | str = None
+
+    _db: None | sqlite3.Connection = PrivateAttr(default=None)
+    _stats: RevisionStoreStats = PrivateAttr(default_factory=RevisionStoreStats)
+
+    def open(self):
+        self._db = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        state = dict(self._db.execute("SELECT key, value FROM store_state"))
+        self.high_water = int(state.get("high_water", 0))
+        self.covered_from = state.get("covered_from")
+        self.synced_until = state.get("synced_until")
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def connect(self) -> SQLiteConnection:
+        return SQLiteConnection(self.uri)
+
+    async def connect_async(self) -> AsyncSQLiteConnection:
+        return AsyncSQLiteConnection(self.uri)
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            raise DbConnectionError()
+        return self._db
+
+    def covers(self, start_date: str, end_date: str) -> bool:
+        if self.covered_from is None or self.synced_until is None:
+            return False
+        return start_date >= self.covered_from and end_date <= shift_timestamp(
+            self.synced_until, self.max_lag
+        )
+
+    def ingest(self, rows: list[dict[str, Any]]) -> int:
+        """Insert or replace rows shaped like ReplicaSource.fetch_after"""
+        if not rows:
+            return 0
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO page VALUES (?, ?, ?)",
+                {
+                    (
+                        int(row["rev_page"]),
+                        int(row["page_namespace"]),
+                        as_text(row["entity_id"]),
+                    )
+                    for row in rows
+                },
+            )
+            self.db.executemany(
+                "INSERT OR REPLACE INTO revision_compat VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        int(row["rev_id"]),
+                        int(row["rev_page"]),
+                        int(row["rev_user"]),
+                        as_text(row["rev_user_text"]),
+                        as_text(row["rev_timestamp"]),
+                    )
+                    for row in rows
+                ],
+            )
+            self.db.executemany(
+                "INSERT OR REPLACE INTO recentchanges VALUES (?, ?)",
+                [
+                    (int(row["rev_id"]), int(row["rc_patrolled"]))
+                    for row in rows
+                    if row["rc_patrolled"] is not None
+                ],
+            )
+            self.db.executemany(
+                "DELETE FROM rc_pending WHERE rev_id = ?",
+                [
+                    (int(row["rev_id"]),)
+                    for row in rows
+                    if row["rc_patrolled"] is not None
+                ],
+            )
+            self.db.executemany(
+                "INSERT OR IGNORE INTO rc_pending VALUES (?)",
+                [(int(row["rev_id"]),) for row in rows if row["rc_patrolled"] is None],
+            )
+            self.high_water = max(
+                self.high_water, *(int(row["rev_id"]) for row in rows)
+            )
+            self._save_state()
+        return len(rows)
+
+    def prune(self, floor: str) -> int:
+        """Drop revisions older than floor, which becomes covered_from"""
+        with self.db:
+            self.db.execute(
+                "DELETE FROM recentchanges WHERE rc_this_oldid IN "
+                "(SELECT rev_id FROM revision_compat WHERE rev_timestamp < ?)",
+                [floor],
+            )
+            self.db.execute(
+                "DELETE FROM rc_pending WHERE rev_id IN "
+                "(SELECT rev_id FROM revision_compat WHERE rev_timestamp < ?)",
+                [floor],
+            )
+            pruned = self.db.execute(
+                "DELETE FROM revision_compat WHERE rev_timestamp < ?", [floor]
+            ).rowcount
+        return pruned
+
+    def mark_synced(self, covered_from: str, synced_until: str):
+        with self.db:
+            self.covered_from = covered_from
+            self.synced_until = synced_until
+            self._save_state()
+
+    def unpatrolled_rev_ids(self, after: int, limit: int) -> list[int]:
+        """The first `limit` unpatrolled or rc pending rev_ids above `after`,
+        by rev_id"""
+        return [
+            rev_id
+            for (rev_id,) in self.db.execute(
+                "SELECT rev_id FROM ("
+                "SELECT rc_this_oldid AS rev_id FROM recentchanges "
+                "WHERE rc_patrolled = 0 UNION SELECT rev_id FROM rc_pending) "
+                "WHERE rev_id > ? ORDER BY rev_id LIMIT ?",
+                [after, limit],
+            )
+        ]
+
+    def update_patrolled(self, patrolled: dict[int, int | None]):
+        """New rc_patrolled values, None if the change is not in
+        recentchanges: it left, or for rc pending revisions, is not there yet"""
+        known = [
+            (rev_id, value) for rev_id, value in patrolled.items() if value is not None
+        ]
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO recentchanges VALUES (?, ?)", known
+            )
+            self.db.executemany(
+                "DELETE FROM rc_pending WHERE rev_id = ?",
+                [(rev_id,) for rev_id, _ in known],
+            )
+            self.db.executemany(
+                "DELETE FROM recentchanges WHERE rc_this_oldid = ?",
+                [(rev_id,) for rev_id, value in patrolled.items() if value is None],
+            )
+
+    def replace_bots(self, bot_ids: set[int]):
+        with self.db:
+            self.db.execute("DELETE FROM user_groups")
+            self.db.executemany(
+                "INSERT INTO user_groups VALUES (?, 'bot')",
+                [(bot_id,) for bot_id in bot_ids],
+            )
+
+    def _save_state(self):
+        self.db.executemany(
+            "INSERT OR REPLACE INTO store_state VALUES (?, ?)",
+            [
+                (key, str(value))
+                for key, value in (
+                    ("high_water", self.high_water),
+                    ("covered_from", self.covered_from),
+                    ("synced_until", self.synced_until),
+                )
+                if value is not None
+            ],
+        )
+
+    def record(self, **counters: int):
+        for name, value in counters.items():
+            setattr(self._stats, name, getattr(self._stats, name) + value)
+
+    def stats(self) -> RevisionStoreStats:
+        stats = self._stats.model_copy()
+        if self._db is not None:
+            (stats.rows,) = self._db.execute(
+                "SELECT COUNT(*) FROM revision_compat"
+            ).fetchone()
+        stats.high_water = self.high_water
+        stats.covered_from = self.covered_from
+        stats.synced_until = self.synced_until
+        if self.synced_until is not None:
+            stats.lag_seconds = seconds_between(self.synced_until, now_timestamp())
+        return stats
+
+
+class ReplicaSource(BaseModel):
+    """Reads new revisions from the replica for RevisionIngester"""
+
+    pool: ConnectionPool | AsyncConnectionPool
+
+    async def first_rev_id(self, since: str) -> None | int:
+        rows = await fetch_all(
+            self.pool,
+            "SELECT MIN(rev_id) AS rev_id FROM revision_compat "
+            "WHERE rev_timestamp >= %s",
+            [since],
+        )
+        return int(rows[0]["rev_id"]) if rows and rows[0]["rev_id"] else None
+
+    async def fetch_after(self, rev_id: int, limit: int) -> list[dict[str, Any]]:
+        """The columns of Read.build_query plus page_namespace, by rev_id"""
+        return await fetch_all(
+            self.pool,
+            """
+            SELECT
+                r.rev_id,
+                r.rev_page,
+                r.rev_user,
+                r.rev_user_text,
+                r.rev_timestamp,
+                p.page_title AS entity_id,
+                rc.rc_patrolled,
+                p.page_namespace
+            FROM revision_compat r
+            JOIN page p ON r.rev_page = p.page_id
+            LEFT JOIN recentchanges rc ON r.rev_id = rc.rc_this_oldid
+            WHERE r.rev_id > %s
+              AND p.page_namespace IN (0,102,120,146)
+            ORDER BY r.rev_id
+            LIMIT %s
+            """,
+            [rev_id, limit],
+        )
+
+    async def fetch_patrolled(self, rev_ids: list[int]) -> dict[int, int | None]:
+        if not rev_ids:
+            return {}
+        placeholders = ",".join(["%s"] * len(rev_ids))
+        rows = await fetch_all(
+            self.pool,
+            # Only placeholders are formatted into the query
+            "SELECT rc_this_oldid, rc_patrolled FROM recentchanges "  # noqa: S608
+            f"WHERE rc_this_oldid IN ({placeholders})",
+            rev_ids,
+        )
+        patrolled: dict[int, int | None] = dict.fromkeys(rev_ids)
+        for row in rows:
+            patrolled[int(row["rc_this_oldid"])] = int(row["rc_patrolled"])
+        return patrolled
+
+    async def fetch_bot_ids(self) -> set[int]:
+        rows = await fetch_all(
+            self.pool, "SELECT ug_user FROM user_groups WHERE ug_group='bot'", []
+        )
+        return {int(row["ug_user"]) for row in rows}
+
+
+class RevisionIngester(BaseModel):
+    """Tails the source into the store by rev_id high-water mark
+
+    Every cycle re-reads `overlap_ids` below the mark to catch revisions
+    committed out of order, refreshes the patrol state of unpatrolled
+    revisions and the bot list, and prunes what is older than the retention.
+    The patrol state is refreshed `patrol_batch_size` revisions at a time,
+    continuing above the last batch and starting over once all were seen.
+    Revisions read before their recentchanges row existed are kept as rc
+    pending and refreshed the same way until the row shows up.
+
+    synced_until is the newest rev_timestamp read, not the local clock, so
+    a replica that lags behind doesn't make the store claim revisions it
+    has not seen yet."""
+
+    store: RevisionStore
+    source: Any
+    interval: float = 10.0
+    batch_size: int = 5000
+    overlap_ids: int = 1000
+    retention_days: int = 8
+    patrol_batch_size: int = 1000
+
+    _task: asyncio.Task | None = PrivateAttr(default=None)
+    # Highest rev_id of the last patrol batch
+    _patrolled_up_to: int = PrivateAttr(default=0)
+
+    async def run_once(self, now: None | str = None) -> int:
+        """Ingest until caught up. Returns the number of rows read."""
+        now = now or now_timestamp()
+        floor = shift_timestamp(now, -self.retention_days * 24 * 3600)
+        store = self.store
+        if store.high_water == 0:
+            first = await self.source.first_rev_id(floor)
+            if first is not None:
+                store.high_water = first - 1
+        after = max(store.high_water - self.overlap_ids, 0)
+        total = 0
+        synced_until = store.synced_until
+        while True:
+            rows = await self.source.fetch_after(after, self.batch_size)
+            total += await asyncio.to_thread(store.ingest, rows)
+            newest = max((as_text(row["rev_timestamp"]) for row in rows), default=None)
+            if newest is not None and (synced_until is None or newest > synced_until):
+                synced_until = newest
+            if len(rows) < self.batch_size:
+                break
+            after = int(rows[-1]["rev_id"])
+        rev_ids = await asyncio.to_thread(
+            store.unpatrolled_rev_ids, self._patrolled_up_to, self.patrol_batch_size
+        )
+        self._patrolled_up_to = (
+            rev_ids[-1] if len(rev_ids) == self.patrol_batch_size else 0
+        )
+        patrolled = await self.source.fetch_patrolled(rev_ids)
+        await asyncio.to_thread(store.update_patrolled, patrolled)
+        await asyncio.to_thread(store.replace_bots, await self.source.fetch_bot_ids())
+        pruned = await asyncio.to_thread(store.prune, floor)
+        if synced_until is not None:
+            store.mark_synced(covered_from=floor, synced_until=synced_until)
+        store.record(cycles=1, rows_ingested=total, rows_pruned=pruned)
+        return total
+
+    def start(self):
+        self._task = asyncio.create_task(self._run_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def _run_forever(self):
+        while True:
+            # Any error, e.g. from a malformed row, must not end ingestion
+            try:
+                await self.run_once()
+            except Exception:
+                self.store.record(failures=1)
+                logger.exception("Revision ingestion failed")
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,234 @@
+"""Response cache backend shared by the worker processes of a node
+
+Entries live in a SQLite file on local disk in WAL mode, so every worker
+reads the entries any of them wrote while one at a time writes. Values are
+zlib compressed, the JSON of aggregated revisions repeats field names and
+usernames and shrinks several times. The compressed size is bounded by
+max_bytes, expired entries are evicted first, then the least recently used."""
+
+import asyncio
+import math
+import sqlite3
+import threading
+import time
+import zlib
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+from fastapi_cache.types import Backend
+from pydantic import BaseModel, PrivateAttr, computed_field
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entry (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_entry_accessed ON cache_entry (accessed);
+-- Total size kept by triggers, so a set does not have to sum every entry
+CREATE TABLE IF NOT EXISTS cache_size (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    bytes INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO cache_size VALUES (0, 0);
+CREATE TRIGGER IF NOT EXISTS cache_entry_insert AFTER INSERT ON cache_entry
+BEGIN
+    UPDATE cache_size SET bytes = bytes + NEW.size;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_entry_update AFTER UPDATE OF size ON cache_entry
+BEGIN
+    UPDATE cache_size SET bytes = bytes + NEW.size - OLD.size;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_entry_delete AFTER DELETE ON cache_entry
+BEGIN
+    UPDATE cache_size SET bytes = bytes - OLD.size;
+END;
+"""
+
+
+class SharedCacheStats(BaseModel):
+    # Of the shared file
+    entries: int = 0
+    bytes: int = 0
+    # Of this worker
+    sets: int = 0
+    raw_bytes_written: int = 0
+    bytes_written: int = 0
+    evictions: int = 0
+    # Reads and writes given up because other workers held the file too long
+    busy: int = 0
+
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def compression_ratio(self) -> float:
+        return (
+            self.raw_bytes_written / self.bytes_written if self.bytes_written else 0.0
+        )
+
+
+class SharedCacheBackend(BaseModel, Backend):
+    """fastapi-cache backend on a SQLite file, see the module docstring
+
+    The last access is refreshed at most every touch_interval seconds, so
+    hits mostly only read. Operations run in a worker thread, one at a time
+    per process, and wait up to busy_timeout for other processes."""
+
+    path: str
+    max_bytes: int = 256 * 1024 * 1024
+    compression_level: int = 6
+    touch_interval: float = 1.0
+    busy_timeout: float = 1.0
+
+    _db: None | sqlite3.Connection = PrivateAttr(default=None)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _stats: SharedCacheStats = PrivateAttr(default_factory=SharedCacheStats)
+
+    def open(self):
+        self._db = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # Losing the last writes on power loss is fine for a cache
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    async def get_with_ttl(self, key: str) -> tuple[int, None | bytes]:
+        entry = await asyncio.to_thread(self._get, key)
+        if entry is None:
+            return 0, None
+        expires, value = entry
+        ttl = expires - time.time()
+        return (-1 if math.isinf(ttl) else int(ttl)), zlib.decompress(value)
+
+    async def get(self, key: str) -> None | bytes:
+        entry = await asyncio.to_thread(self._get, key)
+        return None if entry is None else zlib.decompress(entry[1])
+
+    async def set(self, key: str, value: bytes, expire: None | int = None) -> None:
+        compressed = zlib.compress(value, self.compression_level)
+        if len(compressed) > self.max_bytes:
+            return
+        await asyncio.to_thread(self._set, key, compressed, expire)
+        self._stats.sets += 1
+        self._stats.raw_bytes_written += len(value)
+        self._stats.bytes_written += len(compressed)
+
+    async def clear(self, namespace: None | str = None, key: None | str = None) -> int:
+        if namespace:
+            sql, params = "DELETE FROM cache_entry WHERE key >= ? AND key < ?", [
+                namespace,
+                namespace + "\U0010ffff",
+            ]
+        elif key:
+            sql, params = "DELETE FROM cache_entry WHERE key = ?", [key]
+        else:
+            return 0
+        return await asyncio.to_thread(self._execute, sql, params)
+
+    def stats(self) -> SharedCacheStats:
+        stats = self._stats.model_copy()
+        if self._db is not None:
+            with self._lock:
+                stats.entries, stats.bytes = self._db.execute(
+                    "SELECT count(*), (SELECT bytes FROM cache_size) FROM cache_entry"
+                ).fetchone()
+        return stats
+
+    def _get(self, key: str) -> None | tuple[float, bytes]:
+        now = time.time()
+        with self._lock:
+            try:
+                row = self.db.execute(
+                    "SELECT value, expires, accessed FROM cache_entry WHERE key = ?",
+                    [key],
+                ).fetchone()
+            except sqlite3.OperationalError:
+                # Locked by other workers past busy_timeout, a miss will do
+                self._stats.busy += 1
+                return None
+            if row is None or row[1] <= now:
+                return None
+            value, expires, accessed = row
+            if accessed < now - self.touch_interval:
+                try:
+                    self.db.execute(
+                        "UPDATE cache_entry SET accessed = ? WHERE key = ?", [now, key]
+                    )
+                except sqlite3.OperationalError:
+                    self._stats.busy += 1
+        return expires, value
+
+    def _set(self, key: str, value: bytes, expire: None | int):
+        now = time.time()
+        with self._lock:
+            try:
+                with self._transaction():
+                    self.db.execute(
+                        "INSERT INTO cache_entry VALUES (?, ?, ?, ?, ?) "
+                        "ON CONFLICT (key) DO UPDATE SET value = excluded.value, "
+                        "size = excluded.size, expires = excluded.expires, "
+                        "accessed = excluded.accessed",
+                        [
+                            key,
+                            value,
+                            len(value),
+                            now + expire if expire else math.inf,
+                            now,
+                        ],
+                    )
+                    self._evict(now)
+            except sqlite3.OperationalError:
+                self._stats.busy += 1
+
+    def _evict(self, now: float):
+        if self._size() <= self.max_bytes:
+            return
+        self._stats.evictions += self.db.execute(
+            "DELETE FROM cache_entry WHERE expires <= ?", [now]
+        ).rowcount
+        excess = self._size() - self.max_bytes
+        victims = []
+        for key, size in self.db.execute(
+            "SELECT key, size FROM cache_entry ORDER BY accessed"
+        ):
+            if excess <= 0:
+                break
+            victims.append((key,))
+            excess -= size
+        self.db.executemany("DELETE FROM cache_entry WHERE key = ?", victims)
+        self._stats.evictions += len(victims)
+
+    def _size(self) -> int:
+        return self.db.execute("SELECT bytes FROM cache_size").fetchone()[0]
+
+    def _execute(self, sql: str, params: list) -> int:
+        with self._lock:
+            return self.db.execute(sql, params).rowcount
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        # BEGIN IMMEDIATE takes the write lock up front, so reading the size
+        # and then deleting waits for other workers instead of failing
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        self.db.execute("COMMIT")
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            raise sqlite3.ProgrammingError("SharedCacheBackend is not open")
+        return self._db
@@ -0,0 +1,72 @@
+import asyncio
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from pydantic import BaseModel, PrivateAttr
+
+from models.timing import count
+
+
+class SingleFlightStats(BaseModel):
+    # Calls that ran, and calls that waited for an identical one instead
+    leaders: int = 0
+    coalesced: int = 0
+    in_flight: int = 0
+    # Most callers that shared a single call
+    max_waiters: int = 0
+
+
+class Flight(BaseModel):
+    task: Any
+    waiters: int = 0
+    # Callers still awaiting the task, it is cancelled when none are left
+    callers: int = 0
+
+
+class SingleFlight(BaseModel):
+    """Concurrent calls with the same key share one execution
+
+    The first caller starts the call as a task, callers arriving while it
+    runs await the same task and get its result or exception. Nothing is
+    kept once it finishes, so results are never older than the call that
+    produced them. The task is only cancelled when all callers are gone."""
+
+    _flights: dict[str, Flight] = PrivateAttr(default_factory=dict)
+    _stats: SingleFlightStats = PrivateAttr(default_factory=SingleFlightStats)
+
+    async def run(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        flight = self._flights.get(key)
+        leader = flight is None
+        if flight is None:
+            flight = Flight(task=asyncio.ensure_future(call()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._finish(key, flight))
+            self._stats.leaders += 1
+        else:
+            flight.waiters += 1
+            self._stats.coalesced += 1
+            self._stats.max_waiters = max(self._stats.max_waiters, flight.waiters)
+        flight.callers += 1
+        try:
+            result = await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            flight.callers -= 1
+            if flight.callers == 0:
+                flight.task.cancel()
+            raise
+        flight.callers -= 1
+        # Per request timings, see models/timing.py
+        if leader:
+            count("coalesced_waiters", flight.waiters)
+        else:
+            count("coalesced")
+        return result
+
+    def _finish(self, key: str, flight: Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def stats(self) -> SingleFlightStats:
+        stats = self._stats.model_copy()
+        stats.in_flight = len(self._flights)
+        return stats
@@ -0,0 +1,66 @@
+import re
+from collections import deque
+from typing import Any
+
+from pydantic import BaseModel, PrivateAttr
+
+from models.window import now_timestamp
+
+IN_LIST = re.compile(r"IN \((?:%s,)*%s\)")
+WHITESPACE = re.compile(r"\s+")
+
+
+def sql_shape(sql: str) -> str:
+    """The statement with IN lists collapsed and whitespace normalized, so
+    queries that only differ in the number of entities or users look alike"""
+    return WHITESPACE.sub(" ", IN_LIST.sub("IN (...)", sql)).strip()
+
+
+class SlowQuery(BaseModel):
+    timestamp: str
+    seconds: float
+    shape: str
+    # Number of entities, excluded users, bot ids and bound parameters
+    cardinalities: dict[str, int]
+    rows: int
+    # Rows of EXPLAIN for the statement, None if it could not be explained
+    explain: None | list[dict[str, Any]] = None
+
+
+class SlowQueryLog(BaseModel):
+    """Ring buffer of the last `max_entries` queries that took at least
+    `threshold` seconds"""
+
+    threshold: float = 1.0
+    max_entries: int = 100
+
+    _entries: deque = PrivateAttr()
+
+    def model_post_init(self, context):
+        self._entries = deque(maxlen=self.max_entries)
+
+    def is_slow(self, seconds: float) -> bool:
+        return seconds >= self.threshold
+
+    def record(
+        self,
+        sql: str,
+        seconds: float,
+        cardinalities: dict[str, int],
+        rows: int,
+        explain: None | list[dict[str, Any]],
+    ):
+        self._entries.append(
+            SlowQuery(
+                timestamp=now_timestamp(),
+                seconds=seconds,
+                shape=sql_shape(sql),
+                cardinalities=cardinalities,
+                rows=rows,
+                explain=explain,
+            )
+        )
+
+    def entries(self) -> list[SlowQuery]:
+        """Newest first"""
+        return list(reversed(self._entries))
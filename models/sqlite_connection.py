@@ -0,0 +1,93 @@
+"""pymysql/aiomysql-like connections to SQLite
+
+Close enough for Read to run its queries unchanged on a SQLite database
+with the replica's tables, see RevisionStore and tests/replica.py."""
+
+import asyncio
+import re
+import sqlite3
+
+import aiomysql
+import pymysql
+
+# Cursors that return tuples in the column order of the SELECT
+TUPLE_CURSORS = (pymysql.cursors.Cursor, aiomysql.Cursor)
+
+
+# SQLite has no statement timeout, see Read.bounded
+STATEMENT_TIMEOUT = re.compile(r"^SET STATEMENT max_statement_time=[\d.]+ FOR ")
+
+
+def translate(sql: str) -> str:
+    sql = STATEMENT_TIMEOUT.sub("", sql)
+    return sql.replace("%s", "?").replace("DROP TEMPORARY TABLE", "DROP TABLE")
+
+
+class SQLiteCursor:
+    def __init__(self, connection: sqlite3.Connection, cursor_class=None):
+        self._cursor = connection.cursor()
+        self._row = tuple if cursor_class in TUPLE_CURSORS else dict
+
+    def execute(self, sql, params=None):
+        self._cursor.execute(translate(sql), list(params or []))
+        return self._cursor.rowcount
+
+    def executemany(self, sql, seq_of_params):
+        self._cursor.executemany(translate(sql), seq_of_params)
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    def fetchmany(self, size=None):
+        return [self._row(row) for row in self._cursor.fetchmany(size or 1000)]
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    def __init__(self, uri: str):
+        self._connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        self.closed = False
+
+    def cursor(self, cursor_class=None):
+        return SQLiteCursor(self._connection, cursor_class)
+
+    def ping(self, reconnect=False):
+        pass
+
+    def commit(self):
+        self._connection.commit()
+
+    def close(self):
+        self.closed = True
+        self._connection.close()
+
+
+class AsyncSQLiteCursor(SQLiteCursor):
+    """Runs the statements in a worker thread to keep the event loop free"""
+
+    async def execute(self, sql, params=None):
+        return await asyncio.to_thread(super().execute, sql, params)
+
+    async def fetchall(self):
+        return await asyncio.to_thread(super().fetchall)
+
+    async def fetchmany(self, size=None):
+        return await asyncio.to_thread(super().fetchmany, size)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+        return False
+
+
+class AsyncSQLiteConnection(SQLiteConnection):
+    def cursor(self, cursor_class=None):
+        return AsyncSQLiteCursor(self._connection, cursor_class)
+
+    async def ping(self, reconnect=False):
+        pass
@@ -0,0 +1,298 @@
+"""Push new revisions of watched entities to subscribers
+
+Clients subscribe to an entity set and filters and keep the connection
+open, see GET /api/v1/revisions/subscribe. One SubscriptionHub poller
+queries the new revisions of the union of all subscribed entities once
+per interval, unfiltered, and every subscriber gets the aggregation of the
+new revisions that match its own entities and filters. Replica load grows
+with the number of distinct entities, not with the number of clients."""
+
+import asyncio
+import contextlib
+import itertools
+import logging
+import time
+from collections import defaultdict
+from collections.abc import Awaitable, Callable, Iterable
+from typing import Any
+
+import orjson
+from pydantic import BaseModel, PrivateAttr
+
+from models.aggregator import RecordAggregator
+from models.entity_resolver import EntityResolver
+from models.fetcher import Fetcher
+from models.revision_row import RevisionRow
+from models.validator import BulkValidator, Validator
+from models.window import now_timestamp, shift_timestamp
+
+logger = logging.getLogger(__name__)
+
+_ids = itertools.count(1)
+
+
+class SubscriptionStats(BaseModel):
+    subscribers: int = 0
+    # Distinct entities over all subscribers, what a poll queries
+    entities: int = 0
+    polls: int = 0
+    failures: int = 0
+    rows: int = 0
+    last_poll_seconds: float = 0.0
+    # Events queued for subscribers, and subscribers dropped for not
+    # reading them fast enough
+    pushed: int = 0
+    dropped: int = 0
+
+
+class PoolSource(BaseModel):
+    """Revisions of a list of entities from a connection pool, unfiltered"""
+
+    pool: Any
+    resolver: None | EntityResolver = None
+    chunk_size: int = 1000
+
+    async def fetch(
+        self, entities: list[str], start: str, end: str
+    ) -> list[RevisionRow]:
+        records: list[RevisionRow] = []
+        for i in range(0, len(entities), self.chunk_size):
+            params = BulkValidator(
+                entities=entities[i : i + self.chunk_size],
+                start_date=start,
+                end_date=end,
+            )
+            fetcher = Fetcher(params=params, pool=self.pool, resolver=self.resolver)
+            records += await fetcher.fetch_records(params)
+        return records
+
+
+class Subscription(BaseModel):
+    """Entities and filters of one subscriber and its queue of events,
+    serialized Revisions deltas. None in the queue ends the stream."""
+
+    params: Validator
+    # Revisions older than the subscription are not pushed
+    since: str
+    queue_size: int = 10
+
+    id: int = 0
+    closed: bool = False
+
+    _queue: asyncio.Queue = PrivateAttr()
+    _entities: frozenset[str] = PrivateAttr()
+    _excluded: frozenset[str] = PrivateAttr()
+
+    def model_post_init(self, context):
+        self.id = next(_ids)
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._entities = frozenset(self.params.entities)
+        self._excluded = frozenset(self.params.exclude_users)
+
+    @property
+    def entities(self) -> frozenset[str]:
+        return self._entities
+
+    @property
+    def pending(self) -> int:
+        """Events queued but not read yet"""
+        return self._queue.qsize()
+
+    def key(self, oldest: str) -> tuple:
+        """Subscribers with the same key get the same events of revisions
+        from `oldest` on. since only matters if it is later than that."""
+        return (
+            self._entities,
+            self.since if self.since > oldest else None,
+            self.params.no_bots,
+            self.params.only_unpatrolled,
+            self._excluded,
+        )
+
+    def matches(self, record: RevisionRow, bot_ids: frozenset[int]) -> bool:
+        """The conditions of Read.build_query, applied in Python"""
+        return (
+            record.entity_id in self._entities
+            and record.rev_timestamp >= self.since
+            and not (self.params.no_bots and record.rev_user in bot_ids)
+            and not (self.params.only_unpatrolled and record.rc_patrolled != 0)
+            and record.rev_user_text not in self._excluded
+        )
+
+    def push(self, event: bytes) -> bool:
+        """Queue an event, or close the subscription if it is full"""
+        if self.closed:
+            return False
+        try:
+            self._queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            self.close()
+            return False
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queue.put_nowait(None)
+
+    async def next_event(self, timeout: float) -> None | bytes:
+        """The next event, b"" if none arrived within timeout, None at the end"""
+        if not self._queue.empty():
+            return self._queue.get_nowait()
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except TimeoutError:
+            return b""
+
+
+class SubscriptionHub(BaseModel):
+    """Polls `source` for the subscribed entities every `interval` seconds
+    and pushes the new revisions to the subscribers
+
+    Each poll re-reads `overlap` seconds before the previous one to catch
+    revisions committed late. Revisions already seen are skipped by rev_id."""
+
+    source: Any
+    load_bots: Callable[[], Awaitable[Iterable[int]]]
+    interval: float = 60.0
+    overlap: int = 120
+    max_subscribers: int = 1000
+    queue_size: int = 10
+
+    _subscriptions: dict[int, Subscription] = PrivateAttr(default_factory=dict)
+    # rev_id -> rev_timestamp of the revisions in the overlap
+    _seen: dict[int, str] = PrivateAttr(default_factory=dict)
+    _last_poll: None | str = PrivateAttr(default=None)
+    _task: asyncio.Task | None = PrivateAttr(default=None)
+    _stats: SubscriptionStats = PrivateAttr(default_factory=SubscriptionStats)
+
+    @property
+    def full(self) -> bool:
+        return len(self._subscriptions) >= self.max_subscribers
+
+    def subscribe(self, params: Validator) -> Subscription:
+        subscription = Subscription(
+            params=params, since=now_timestamp(), queue_size=self.queue_size
+        )
+        self._subscriptions[subscription.id] = subscription
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscriptions.pop(subscription.id, None)
+
+    def subscriptions(self) -> list[Subscription]:
+        return list(self._subscriptions.values())
+
+    def entities(self) -> list[str]:
+        return sorted(
+            {
+                entity
+                for subscription in self._subscriptions.values()
+                for entity in subscription.params.entities
+            }
+        )
+
+    async def poll(self, now: None | str = None) -> int:
+        """Fetch and push the new revisions once, returns how many there were"""
+        now = now or now_timestamp()
+        entities = self.entities()
+        if not entities:
+            self._last_poll = None
+            self._seen.clear()
+            return 0
+        started = time.monotonic()
+        # The first poll goes back as far as the oldest subscription
+        start = shift_timestamp(
+            self._last_poll or min(s.since for s in self._subscriptions.values()),
+            -self.overlap,
+        )
+        records = await self.source.fetch(entities, start, now)
+        new = [record for record in records if record.rev_id not in self._seen]
+        for record in new:
+            self._seen[record.rev_id] = record.rev_timestamp
+        cutoff = shift_timestamp(now, -self.overlap)
+        self._seen = {i: ts for i, ts in self._seen.items() if ts >= cutoff}
+        self._last_poll = now
+        if new:
+            await self._push(new)
+        self._stats.polls += 1
+        self._stats.rows += len(records)
+        self._stats.last_poll_seconds = time.monotonic() - started
+        return len(new)
+
+    async def _push(self, records: list[RevisionRow]):
+        bot_ids: frozenset[int] = frozenset()
+        if any(s.params.no_bots for s in self._subscriptions.values()):
+            bot_ids = frozenset(await self.load_bots())
+        # Subscribers with the same entities and filters share one event
+        oldest = min(record.rev_timestamp for record in records)
+        by_entity: dict[str, list[RevisionRow]] = defaultdict(list)
+        for record in records:
+            by_entity[record.entity_id].append(record)
+        events: dict[tuple, bytes] = {}
+        for subscription in list(self._subscriptions.values()):
+            key = subscription.key(oldest)
+            event = events.get(key)
+            if event is None:
+                matching = [
+                    record
+                    for entity in subscription.entities
+                    for record in by_entity.get(entity, ())
+                    if subscription.matches(record, bot_ids)
+                ]
+                event = events[key] = (
+                    RecordAggregator.from_records(matching).dump_json()
+                    if matching
+                    else b""
+                )
+            if not event:
+                continue
+            if subscription.push(event):
+                self._stats.pushed += 1
+            else:
+                self._stats.dropped += 1
+                self.unsubscribe(subscription)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        for subscription in self._subscriptions.values():
+            subscription.close()
+        self._subscriptions.clear()
+
+    async def _run_forever(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            # Any error, a poll failing must not end the subscriptions
+            try:
+                await self.poll()
+            except Exception:
+                self._stats.failures += 1
+                logger.exception("Polling for subscriptions failed")
+
+    def stats(self) -> SubscriptionStats:
+        stats = self._stats.model_copy()
+        stats.subscribers = len(self._subscriptions)
+        stats.entities = len(self.entities())
+        return stats
+
+
+def sse_event(event: str, data: bytes) -> bytes:
+    """A server-sent event, data is one line of JSON"""
+    return b"event: " + event.encode() + b"\ndata: " + data + b"\n\n"
+
+
+def subscribed_event(subscription: Subscription) -> bytes:
+    return sse_event(
+        "subscribed",
+        orjson.dumps({"id": subscription.id, "since": subscription.since}),
+    )
@@ -0,0 +1,102 @@
+"""Per-request stage timings and counts
+
+TimingMiddleware puts a RequestTimings in a context variable for requests
+to the revisions endpoints, which timed(), add_time() and count() record
+into from anywhere down the call stack, including threadpool calls. They do
+nothing when there is no RequestTimings, i.e. when metrics are disabled."""
+
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from pydantic import BaseModel
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+INSTRUMENTED_PREFIX = "/api/v1/revisions"
+
+
+class RequestTimings(BaseModel):
+    # Seconds spent per stage, summed if a stage runs more than once
+    stages: dict[str, float] = {}
+    counts: dict[str, int] = {}
+
+    def add_time(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def count(self, name: str, value: int):
+        self.counts[name] = self.counts.get(name, 0) + value
+
+    def server_timing(self) -> str:
+        """Server-Timing header value, durations in milliseconds"""
+        return ", ".join(
+            [
+                f"{stage};dur={seconds * 1000:.3f}"
+                for stage, seconds in self.stages.items()
+            ]
+            + [f'{name};desc="{value}"' for name, value in self.counts.items()]
+        )
+
+
+_current: ContextVar[RequestTimings | None] = ContextVar(
+    "request_timings", default=None
+)
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add_time(stage, time.perf_counter() - started)
+
+
+def add_time(stage: str, seconds: float):
+    timings = _current.get()
+    if timings is not None:
+        timings.add_time(stage, seconds)
+
+
+def count(name: str, value: int = 1):
+    timings = _current.get()
+    if timings is not None:
+        timings.count(name, value)
+
+
+class TimingMiddleware:
+    """Times requests to the revisions endpoints when app.state.metrics is
+    set: adds a Server-Timing header and feeds the metrics histograms"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        metrics = None
+        if scope["type"] == "http" and scope["path"].startswith(INSTRUMENTED_PREFIX):
+            metrics = getattr(scope["app"].state, "metrics", None)
+        if metrics is None:
+            await self.app(scope, receive, send)
+            return
+        timings = RequestTimings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+
+        async def send_with_timings(message: Message):
+            if message["type"] == "http.response.start":
+                timings.add_time("total", time.perf_counter() - started)
+                MutableHeaders(scope=message).append(
+                    "Server-Timing", timings.server_timing()
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timings)
+        finally:
+            _current.reset(token)
+            metrics.observe(scope["path"], timings)
@@ -11,11 +11,16 @@ class Validator(BaseModel):
     only_unpatrolled: bool = False
     exclude_users: list[str] = []
 
+    @classmethod
+    def max_entity_count(cls) -> int:
+        return config.MAX_ENTITY_COUNT
+
     # noinspection PyMethodParameters
     @field_validator("entities")
     def validate_entities(cls, v):
-        if len(v) > config.MAX_ENTITY_COUNT:
-            raise ValueError(f"Too many entity IDs (max {config.MAX_ENTITY_COUNT})")
+        max_count = cls.max_entity_count()
+        if len(v) > max_count:
+            raise ValueError(f"Too many entity IDs (max {max_count})")
         if len(v) != len(set(v)):
             raise ValueError("Entity IDs must be unique (no duplicates)")
         for eid in v:
@@ -45,3 +50,11 @@ class Validator(BaseModel):
         if start and end and start > end:
             raise ValueError("start_date must be earlier than or equal to end_date")
         return values
+
+
+class BulkValidator(Validator):
+    """Validator for the bulk endpoint, which accepts far more entities"""
+
+    @classmethod
+    def max_entity_count(cls) -> int:
+        return config.MAX_BULK_ENTITY_COUNT
@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta, timezone
+
+import config
+
+TIMESTAMP_FORMAT = "%Y%m%d%H%M%S"
+
+
+def default_window(
+    now: datetime | None = None,
+    days: int = config.DEFAULT_WINDOW_DAYS,
+    bucket: int = config.DEFAULT_WINDOW_BUCKET,
+) -> tuple[str, str]:
+    """Return (start_date, end_date) for the default "last N days" window.
+
+    Computed per request and rounded to `bucket` seconds so that all clients
+    asking within the same bucket get the same window and share cache entries.
+    The end is the last second of the current bucket, so no edits are missed."""
+    if now is None:
+        now = datetime.now(timezone.utc)
+    epoch = int(now.timestamp())
+    bucket_start = datetime.fromtimestamp(epoch - epoch % bucket, tz=timezone.utc)
+    start = bucket_start - timedelta(days=days)
+    end = bucket_start + timedelta(seconds=bucket - 1)
+    return start.strftime(TIMESTAMP_FORMAT), end.strftime(TIMESTAMP_FORMAT)
+
+
+def now_timestamp() -> str:
+    return datetime.now(timezone.utc).strftime(TIMESTAMP_FORMAT)
+
+
+def parse_timestamp(timestamp: str) -> datetime:
+    """A "YYYYMMDDHHMMSS" timestamp of the replica, which are in UTC"""
+    return datetime.strptime(timestamp, TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc)
+
+
+def shift_timestamp(timestamp: str, seconds: int) -> str:
+    """Move a "YYYYMMDDHHMMSS" timestamp by a number of seconds"""
+    moved = parse_timestamp(timestamp) + timedelta(seconds=seconds)
+    return moved.strftime(TIMESTAMP_FORMAT)
+
+
+def split_window(start: str, end: str, seconds: int) -> list[tuple[str, str]]:
+    """Split the inclusive window [start, end] into consecutive inclusive
+    ranges of equal length, about `seconds` each. At one second resolution
+    they neither overlap nor leave gaps, so BETWEEN on each of them covers
+    the window once."""
+    first = parse_timestamp(start)
+    total = int((parse_timestamp(end) - first).total_seconds()) + 1
+    parts = max(1, round(total / seconds))
+    bounds = [first + timedelta(seconds=total * i // parts) for i in range(parts + 1)]
+    return [
+        (
+            bounds[i].strftime(TIMESTAMP_FORMAT),
+            (bounds[i + 1] - timedelta(seconds=1)).strftime(TIMESTAMP_FORMAT),
+        )
+        for i in range(parts)
+    ]
@@ -0,0 +1,111 @@
+"""Rows/sec of Aggregator before and after the fast path
+
+"before" is the previous implementation, kept here as the reference:
+validating construction, a copy per earliest/latest update, string keys
+and validated output models. "after" is Aggregator.from_rows().aggregate().
+
+    python -m tests.benchmarks.bench_aggregator --rows 1000 10000 100000 1000000
+"""
+
+import argparse
+import time
+from typing import Any
+
+from models.aggregator import Aggregator
+from models.page_aggregate import as_text
+from models.revision import Revision
+from models.revisions import Revisions
+from models.user_count import UserCount
+from tests.synthetic import generate_revisions
+
+ENTITY_COUNT = 100
+
+
+def legacy_aggregate(rows: list[dict[str, Any]]) -> list[Revisions]:
+    revisions_by_page = {}
+    for revision in Aggregator(revisions=rows).revisions:
+        page_key = str(revision["rev_page"])
+        user_key = f"{revision['rev_user']}|{as_text(revision['rev_user_text'])}"
+
+        if page_key not in revisions_by_page:
+            revisions_by_page[page_key] = {
+                "page_id": revision["rev_page"],
+                "entity_id": revision["entity_id"],
+                "earliest": revision.copy(),
+                "latest": revision.copy(),
+                "note": "",
+                "users": {user_key: 1},
+            }
+            continue
+
+        earliest = revisions_by_page[page_key]["earliest"]
+        if earliest["rev_timestamp"] > revision["rev_timestamp"] or (
+            earliest["rev_timestamp"] == revision["rev_timestamp"]
+            and int(earliest["rev_id"]) > int(revision["rev_id"])
+        ):
+            revisions_by_page[page_key]["earliest"] = revision.copy()
+        latest = revisions_by_page[page_key]["latest"]
+        if latest["rev_timestamp"] < revision["rev_timestamp"] or (
+            latest["rev_timestamp"] == revision["rev_timestamp"]
+            and int(latest["rev_id"]) < int(revision["rev_id"])
+        ):
+            revisions_by_page[page_key]["latest"] = revision.copy()
+
+        revisions_by_page[page_key]["users"][user_key] = (
+            revisions_by_page[page_key]["users"].get(user_key, 0) + 1
+        )
+
+    result = []
+    for page_data in revisions_by_page.values():
+        users = [
+            UserCount(user_id=int(uid), username=uname, count=count)
+            for uid, uname, count in (
+                (u.split("|", 1)[0], u.split("|", 1)[1], c)
+                for u, c in page_data["users"].items()
+            )
+        ]
+        result.append(
+            Revisions(
+                page_id=page_data["page_id"],
+                entity_id=page_data["entity_id"],
+                earliest=Revision(**page_data["earliest"]),
+                latest=Revision(**page_data["latest"]),
+                note=page_data["note"],
+                users=users,
+            )
+        )
+    return result
+
+
+def fast_aggregate(rows: list[dict[str, Any]]) -> list[Revisions]:
+    return Aggregator.from_rows(rows).aggregate()
+
+
+def rows_per_second(aggregate, rows: list[dict[str, Any]], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        aggregate(rows)
+        best = min(best, time.perf_counter() - started)
+    return len(rows) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--rows", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    print(f"{'rows':>10} {'before rows/s':>14} {'after rows/s':>13} {'speedup':>8}")
+    for count in args.rows:
+        rows = generate_revisions(
+            entity_count=ENTITY_COUNT, edits_per_entity=max(count // ENTITY_COUNT, 1)
+        )
+        before = rows_per_second(legacy_aggregate, rows, args.repeat)
+        after = rows_per_second(fast_aggregate, rows, args.repeat)
+        print(f"{count:>10} {before:>14,.0f} {after:>13,.0f} {after / before:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
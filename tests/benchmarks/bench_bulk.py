@@ -0,0 +1,65 @@
+"""IN list versus session temporary table for large entity lists
+
+Runs a single revision query for 100, 1k and 10k entities against the
+SQLite stand-in of the replica. The temp table timing includes creating,
+loading and dropping the table.
+
+    python -m tests.benchmarks.bench_bulk --entities 100 1000 10000
+"""
+
+import argparse
+import statistics
+import time
+
+from models.read import TEMP_ENTITY_TABLE, Read
+from models.validator import BulkValidator
+from tests.replica import Replica
+from tests.synthetic import generate_revisions
+
+
+def time_query(replica: Replica, entities: list[str], strategy: str) -> float:
+    params = BulkValidator(
+        entities=entities, start_date="20250801", end_date="20250808"
+    )
+    read = Read(
+        params=params,
+        entity_table=TEMP_ENTITY_TABLE if strategy == "temp_table" else None,
+    )
+    read.db = replica.connect()
+    start = time.perf_counter()
+    if read.entity_table:
+        read.load_entity_table()
+    read.fetch_revisions()
+    if read.entity_table:
+        read.drop_entity_table()
+    elapsed = time.perf_counter() - start
+    read.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entities", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--pages", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    replica = Replica()
+    replica.load(generate_revisions(entity_count=args.pages, edits_per_entity=5))
+    print(f"{'entities':>8} {'in_list ms':>11} {'temp_table ms':>14}")
+    for count in args.entities:
+        # Spread the requested entities over the whole page table
+        step = max(1, args.pages // count)
+        entities = [f"Q{i}" for i in range(1, args.pages + 1, step)][:count]
+        timings = {
+            strategy: statistics.median(
+                time_query(replica, entities, strategy) for _ in range(args.repeat)
+            )
+            * 1000
+            for strategy in ("in_list", "temp_table")
+        }
+        print(f"{count:>8} {timings['in_list']:>11.1f} {timings['temp_table']:>14.1f}")
+    replica.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Cost of the freshness probe versus the full fetch it can save
+
+Times Fetcher.probe, the query a conditional request runs before a 304,
+against Fetcher.fetch_json, the query, aggregation and serialization of a
+200, on the SQLite stand-in of the replica.
+
+    python -m tests.benchmarks.bench_conditional_get --entities 10 100
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from models.fetcher import Fetcher
+from models.pool import AsyncConnectionPool
+from models.validator import Validator
+from tests.replica import Replica
+from tests.synthetic import generate_revisions
+
+
+async def median_ms(call, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await call()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+async def run(args):
+    replica = Replica()
+    replica.load(
+        generate_revisions(entity_count=max(args.entities), edits_per_entity=args.edits)
+    )
+    pool = AsyncConnectionPool(connect=replica.connect_async, min_size=0)
+    print(f"{args.edits} edits per entity")
+    print(f"{'entities':>8} {'probe ms':>9} {'fetch ms':>9} {'ratio':>6}")
+    for count in args.entities:
+        params = Validator(
+            entities=[f"Q{i}" for i in range(1, count + 1)],
+            start_date="20250801",
+            end_date="20250807",
+        )
+        fetcher = Fetcher(params=params, pool=pool)
+        probe = await median_ms(fetcher.probe, args.repeat)
+        fetch = await median_ms(fetcher.fetch_json, args.repeat)
+        print(f"{count:>8} {probe:>9.2f} {fetch:>9.2f} {fetch / probe:>5.1f}x")
+    await pool.close()
+    replica.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entities", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--edits", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Compare the sync (threadpool) and async (event loop) read paths
+
+The replica is replaced by fake connections that sleep for --latency
+seconds per query, so the numbers show how many requests can wait on the
+database at once rather than how fast the database is.
+
+    python -m tests.benchmarks.bench_db_mode --requests 500 --latency 0.05
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+
+import httpx
+
+import config
+import main
+from models.pool import AsyncConnectionPool, ConnectionPool
+from tests.fakes import FakeAsyncConnection, FakeConnection
+from tests.synthetic import generate_revisions
+
+
+async def run(mode: str, requests: int, latency: float, rows: list[dict]) -> float:
+    config.DB_MODE = mode
+    if mode == "async":
+
+        async def connect():
+            return FakeAsyncConnection(rows=rows, latency=latency)
+
+        main.app.state.pool = AsyncConnectionPool(
+            connect=connect, min_size=0, max_size=requests, timeout=60
+        )
+    else:
+        main.app.state.pool = ConnectionPool(
+            connect=lambda: FakeConnection(rows=rows, latency=latency),
+            min_size=0,
+            max_size=requests,
+            timeout=60,
+        )
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        start = time.perf_counter()
+        responses = await asyncio.gather(
+            *(
+                client.get("/api/v1/revisions", params={"entities": "Q1,Q2"})
+                for _ in range(requests)
+            )
+        )
+        elapsed = time.perf_counter() - start
+    assert all(r.status_code == 200 for r in responses)
+    return elapsed
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    rows = generate_revisions(entity_count=2, edits_per_entity=20)
+    for mode in ("sync", "async"):
+        elapsed = asyncio.run(run(mode, args.requests, args.latency, rows))
+        print(
+            f"{mode:>5}: {args.requests} requests in {elapsed:.2f}s "
+            f"({args.requests / elapsed:.0f} req/s)"
+        )
+
+
+if __name__ == "__main__":
+    main_()
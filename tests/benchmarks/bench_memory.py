@@ -0,0 +1,66 @@
+"""Peak RSS of fetchall + Aggregator versus streaming aggregation
+
+Every measurement runs in a fresh process because peak RSS only grows.
+Rows come from the synthetic generator: "fetchall" materializes them as a
+list of dicts like DictCursor.fetchall(), "stream" feeds them to
+StreamingAggregator in batches like Read.iter_revisions.
+
+    python -m tests.benchmarks.bench_memory --rows 10000 100000 1000000
+"""
+
+import argparse
+import itertools
+import resource
+import subprocess
+import sys
+
+from models.aggregator import Aggregator, StreamingAggregator
+from tests.synthetic import iter_revisions
+
+ENTITY_COUNT = 100
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(mode: str, rows: int):
+    baseline = peak_rss_mb()
+    source = iter_revisions(
+        entity_count=ENTITY_COUNT, edits_per_entity=rows // ENTITY_COUNT
+    )
+    if mode == "fetchall":
+        Aggregator(revisions=list(source)).aggregate()
+    else:
+        aggregator = StreamingAggregator()
+        while batch := list(itertools.islice(source, 1000)):
+            aggregator.consume(batch)
+        aggregator.aggregate()
+    print(f"{peak_rss_mb() - baseline:.1f}")
+
+
+def run_child(*args: str) -> str:
+    """This module again in a fresh interpreter, no outside input"""
+    child = [sys.executable, "-m", __spec__.name, "--child", *args]
+    return subprocess.check_output(child, text=True).strip()  # noqa: S603
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "ROWS"))
+    args = parser.parse_args()
+    if args.child:
+        measure(args.child[0], int(args.child[1]))
+        return
+    print(f"{'rows':>10} {'fetchall MB':>12} {'stream MB':>10}")
+    for rows in args.rows:
+        results = [run_child(mode, str(rows)) for mode in ("fetchall", "stream")]
+        print(f"{rows:>10} {results[0]:>12} {results[1]:>10}")
+
+
+if __name__ == "__main__":
+    main()
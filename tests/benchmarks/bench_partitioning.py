@@ -0,0 +1,101 @@
+"""Wall-clock time of a long window fetched in 1 to 28 time partitions
+
+Fetches 28 days of revisions through Fetcher with PARTITION_DAYS set so
+the window splits into the given number of partitions, all fetched at once.
+The replica is the SQLite stand-in, with --row-latency seconds of sleep per
+returned row on top to stand in for the replica scanning and sending them,
+which is where a long window spends its time. With --row-latency 0 the
+numbers only show SQLite and the partitioning overhead.
+
+    python -m tests.benchmarks.bench_partitioning --partitions 1 2 4 7 14
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from models.fetcher import Fetcher
+from models.pool import AsyncConnectionPool
+from models.sqlite_connection import AsyncSQLiteConnection, AsyncSQLiteCursor
+from models.validator import Validator
+from tests.replica import Replica
+from tests.synthetic import generate_revisions
+
+DAYS = 28
+
+
+class SlowCursor(AsyncSQLiteCursor):
+    row_latency = 0.0
+
+    async def fetchall(self):
+        rows = await super().fetchall()
+        await asyncio.sleep(self.row_latency * len(rows))
+        return rows
+
+
+class SlowConnection(AsyncSQLiteConnection):
+    def cursor(self, cursor_class=None):
+        return SlowCursor(self._connection, cursor_class)
+
+
+async def time_fetch(pool, params: Validator, partitions: int) -> float:
+    with (
+        patch("config.DB_MODE", "async"),
+        patch("config.PARTITION_DAYS", DAYS // partitions),
+        patch("config.PARTITION_PARALLELISM", partitions),
+    ):
+        start = time.perf_counter()
+        await Fetcher(params=params, pool=pool).fetch_json()
+        return time.perf_counter() - start
+
+
+async def run(args):
+    replica = Replica()
+    replica.load(
+        generate_revisions(
+            entity_count=args.entities,
+            edits_per_entity=args.edits,
+            start=datetime(2025, 8, 1, tzinfo=timezone.utc),
+            days=DAYS,
+        )
+    )
+    SlowCursor.row_latency = args.row_latency
+
+    async def connect():
+        return SlowConnection(replica.uri)
+
+    pool = AsyncConnectionPool(connect=connect, min_size=0, max_size=DAYS)
+    params = Validator(
+        entities=[f"Q{i}" for i in range(1, args.entities + 1)],
+        start_date="20250801",
+        end_date="20250828",
+    )
+    rows = args.entities * args.edits
+    print(f"{rows} rows, {args.row_latency * 1e6:g}us per row")
+    print(f"{'partitions':>10} {'ms':>8} {'speedup':>8}")
+    baseline = None
+    for partitions in args.partitions:
+        seconds = statistics.median(
+            [await time_fetch(pool, params, partitions) for _ in range(args.repeat)]
+        )
+        baseline = baseline or seconds
+        print(f"{partitions:>10} {seconds * 1000:>8.1f} {baseline / seconds:>7.2f}x")
+    await pool.close()
+    replica.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--partitions", type=int, nargs="+", default=[1, 2, 4, 7, 14])
+    parser.add_argument("--entities", type=int, default=20)
+    parser.add_argument("--edits", type=int, default=2000)
+    parser.add_argument("--row-latency", type=float, default=20e-6)
+    parser.add_argument("--repeat", type=int, default=3)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
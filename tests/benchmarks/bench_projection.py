@@ -0,0 +1,76 @@
+"""Payload size and serialization time of sparse fieldsets and columns
+
+Serializes the same aggregation as full Revisions objects, as what
+`fields=` and `format=columns` return, and reports the bytes, gzipped
+bytes and median time of each. The aggregation itself is not timed, it
+is the same for all of them.
+
+    python -m tests.benchmarks.bench_projection --entities 100 1000 10000
+"""
+
+import argparse
+import gzip
+import statistics
+import time
+
+from models.aggregator import RecordAggregator
+from models.projection import Projection, pages_from_aggregator
+from models.revision_row import RevisionRow
+from tests.synthetic import generate_revisions
+
+SPARSE = ["entity_id", "latest.rev_id", "user_count"]
+
+
+def median_ms(call, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def dumper(projection: Projection, pages: dict[int, list]):
+    return lambda: projection.dump_json(pages_from_aggregator(pages))
+
+
+def run(args):
+    print(f"{args.edits} edits per entity, sparse fields: {','.join(SPARSE)}")
+    print(
+        f"{'entities':>8} {'format':<14} {'KiB':>9} {'gzip KiB':>9}"
+        f" {'ms':>8} {'size':>6}"
+    )
+    for count in args.entities:
+        rows = generate_revisions(entity_count=count, edits_per_entity=args.edits)
+        aggregator = RecordAggregator.from_records(
+            [RevisionRow(**{f: row[f] for f in RevisionRow._fields}) for row in rows]
+        )
+        pages = aggregator.pages()
+        cases = {
+            "revisions": aggregator.dump_json,
+            "columns": dumper(Projection(columnar=True), pages),
+            "fields": dumper(Projection(fields=SPARSE), pages),
+            "fields+columns": dumper(Projection(fields=SPARSE, columnar=True), pages),
+        }
+        baseline = 0
+        for name, call in cases.items():
+            body = call()
+            baseline = baseline or len(body)
+            ms = median_ms(call, args.repeat)
+            print(
+                f"{count:>8} {name:<14} {len(body) / 1024:>9.1f}"
+                f" {len(gzip.compress(body)) / 1024:>9.1f} {ms:>8.2f}"
+                f" {len(body) / baseline:>5.0%}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entities", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--edits", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Per-row memory and decode time of DictCursor rows versus RevisionRow records
+
+Rows are decoded from text-protocol values the way pymysql does it, column by
+column with the connection's converters. "dict" uses the default converters
+(varbinary stays bytes, DECIMAL becomes Decimal) and builds a dict per row
+like DictCursor. "record" uses models.revision_row.DECODERS and a tuple cursor.
+Aggregation times are Aggregator on the dicts and RecordAggregator on the records.
+
+    python -m tests.benchmarks.bench_rows --rows 10000 100000 1000000
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+from decimal import Decimal
+
+from pymysql.constants import FIELD_TYPE
+
+from models.aggregator import Aggregator, RecordAggregator
+from models.revision_row import DECODERS, RevisionRow
+from tests.synthetic import iter_revisions
+
+ENTITY_COUNT = 100
+FIELDS = RevisionRow._fields
+# (encoding, converter) per column, as pymysql's MySQLResult sets them up
+DICT_CONVERTERS = [
+    ("ascii", int),
+    ("ascii", int),
+    ("ascii", Decimal),
+    (None, None),
+    (None, None),
+    (None, None),
+    ("ascii", int),
+]
+RECORD_CONVERTERS = [
+    ("ascii", int),
+    ("ascii", int),
+    ("ascii", DECODERS[FIELD_TYPE.NEWDECIMAL]),
+    (None, DECODERS[FIELD_TYPE.VAR_STRING]),
+    (None, DECODERS[FIELD_TYPE.VAR_STRING]),
+    (None, DECODERS[FIELD_TYPE.VAR_STRING]),
+    ("ascii", int),
+]
+
+
+def wire_rows(count: int) -> list[tuple]:
+    """Rows as the text protocol delivers them, every value as bytes"""
+    return [
+        tuple(
+            None if row[field] is None else str(row[field]).encode() for field in FIELDS
+        )
+        for row in iter_revisions(
+            entity_count=ENTITY_COUNT, edits_per_entity=max(count // ENTITY_COUNT, 1)
+        )
+    ]
+
+
+def decode(raw: tuple, converters: list) -> tuple:
+    values = []
+    for value, (encoding, converter) in zip(raw, converters, strict=True):
+        if value is not None:
+            if encoding is not None:
+                value = value.decode(encoding)
+            if converter is not None:
+                value = converter(value)
+        values.append(value)
+    return tuple(values)
+
+
+def decode_dicts(rows: list[tuple]) -> list[dict]:
+    return [
+        dict(zip(FIELDS, decode(raw, DICT_CONVERTERS), strict=True)) for raw in rows
+    ]
+
+
+def decode_records(rows: list[tuple]) -> list[RevisionRow]:
+    return [RevisionRow._make(decode(raw, RECORD_CONVERTERS)) for raw in rows]
+
+
+def timed(function, *args):
+    # Collections triggered by earlier allocations would dominate at 1M rows
+    gc.collect()
+    gc.disable()
+    try:
+        started = time.perf_counter()
+        result = function(*args)
+        return result, time.perf_counter() - started
+    finally:
+        gc.enable()
+
+
+def measure(decoder, aggregate, rows: list[tuple]) -> tuple[float, float, float]:
+    """Bytes per row, decode µs per row and aggregate µs per row"""
+    # Timed separately, tracemalloc slows allocations down
+    tracemalloc.start()
+    decoded = decoder(rows)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del decoded
+    decoded, decode_seconds = timed(decoder, rows)
+    _, aggregate_seconds = timed(aggregate, decoded)
+    count = len(rows)
+    return size / count, decode_seconds / count * 1e6, aggregate_seconds / count * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    args = parser.parse_args()
+    print(
+        f"{'rows':>10} {'format':>7} {'bytes/row':>10} "
+        f"{'decode µs/row':>14} {'aggregate µs/row':>17}"
+    )
+    for count in args.rows:
+        rows = wire_rows(count)
+        for name, decoder, aggregate in (
+            ("dict", decode_dicts, lambda r: Aggregator.from_rows(r).aggregate()),
+            (
+                "record",
+                decode_records,
+                lambda r: RecordAggregator.from_records(r).aggregate(),
+            ),
+        ):
+            size, decode_us, aggregate_us = measure(decoder, aggregate, rows)
+            print(
+                f"{count:>10} {name:>7} {size:>10.0f} "
+                f"{decode_us:>14.2f} {aggregate_us:>17.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
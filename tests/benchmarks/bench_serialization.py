@@ -0,0 +1,82 @@
+"""Time to turn aggregated records into a /revisions response body
+
+"fastapi" is what returning the models with response_model costs: validate
+against list[Revisions], jsonable_encoder and json.dumps. "models" builds
+the Revisions models and serializes them with pydantic's dump_json, like
+the entity cache path. "direct" is RecordAggregator.dump_json, which goes
+from the aggregation state to bytes with orjson. Aggregation is included
+in every column since "direct" skips the models it would otherwise build.
+
+    python -m tests.benchmarks.bench_serialization --users 100 1000 5000
+"""
+
+import argparse
+import json
+import time
+
+from fastapi.encoders import jsonable_encoder
+
+from models.aggregator import RecordAggregator
+from models.fetcher import revisions_adapter
+from models.revision_row import RevisionRow
+from tests.synthetic import iter_revisions
+
+ENTITY_COUNT = 100
+EDITS_PER_ENTITY = 2000
+
+
+def fastapi_body(aggregator: RecordAggregator) -> bytes:
+    revisions = revisions_adapter.validate_python(aggregator.aggregate())
+    return json.dumps(jsonable_encoder(revisions)).encode()
+
+
+def models_body(aggregator: RecordAggregator) -> bytes:
+    return revisions_adapter.dump_json(aggregator.aggregate())
+
+
+def direct_body(aggregator: RecordAggregator) -> bytes:
+    return aggregator.dump_json()
+
+
+def best_ms(function, aggregator: RecordAggregator, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(aggregator)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    print(
+        f"{'users':>6} {'payload MB':>11} {'fastapi ms':>11} "
+        f"{'models ms':>10} {'direct ms':>10}"
+    )
+    for users in args.users:
+        aggregator = RecordAggregator.from_records(
+            [
+                RevisionRow(**row)
+                for row in iter_revisions(
+                    entity_count=ENTITY_COUNT,
+                    edits_per_entity=EDITS_PER_ENTITY,
+                    user_count=users,
+                )
+            ]
+        )
+        size = len(direct_body(aggregator)) / 1024 / 1024
+        timings = [
+            best_ms(function, aggregator, args.repeat)
+            for function in (fastapi_body, models_body, direct_body)
+        ]
+        print(
+            f"{users:>6} {size:>11.1f} {timings[0]:>11.1f} "
+            f"{timings[1]:>10.1f} {timings[2]:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
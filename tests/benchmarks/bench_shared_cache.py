@@ -0,0 +1,144 @@
+"""Per-worker in-memory versus shared SQLite response cache with N workers
+
+Each worker process serves --requests requests with keys drawn from a Zipf
+distribution over --keys distinct requests: a cache get, and on a miss a
+set of a real aggregated response body. With "memory" every worker warms
+its own cache, with "shared" they all use one file. Reports the overall hit
+ratio, requests per second across workers, mean get latency and how many
+bytes all caches hold together.
+
+    python -m tests.benchmarks.bench_shared_cache --workers 1 2 4 8
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from fastapi_cache.backends.inmemory import InMemoryBackend
+
+from models.aggregator import RecordAggregator
+from models.revision_row import RevisionRow
+from models.shared_cache import SharedCacheBackend
+from tests.fakes import clear_in_memory_cache
+from tests.synthetic import generate_revisions
+
+
+def response_body(entities: int) -> bytes:
+    rows = generate_revisions(entity_count=entities, edits_per_entity=100)
+    return RecordAggregator.from_records(
+        [
+            RevisionRow(**{field: row[field] for field in RevisionRow._fields})
+            for row in rows
+        ]
+    ).dump_json()
+
+
+def zipf_keys(count: int, keys: int, seed: int) -> list[str]:
+    weights = [1 / rank**1.1 for rank in range(1, keys + 1)]
+    rng = random.Random(seed)  # noqa: S311, RUF100
+    return [f"revisions:{key}" for key in rng.choices(range(keys), weights, k=count)]
+
+
+async def serve(backend, keys: list[str], body: bytes) -> tuple[int, float]:
+    hits = 0
+    get_seconds = 0.0
+    for key in keys:
+        started = time.perf_counter()
+        value = await backend.get(key)
+        get_seconds += time.perf_counter() - started
+        if value is None:
+            await backend.set(key, body, expire=600)
+        else:
+            hits += 1
+    return hits, get_seconds
+
+
+def worker(*, kind: str, path: str, keys: list[str], body: bytes, barrier, results):
+    if kind == "shared":
+        backend = SharedCacheBackend(path=path)
+        backend.open()
+    else:
+        clear_in_memory_cache()
+        backend = InMemoryBackend()
+    barrier.wait()
+    started = time.perf_counter()
+    hits, get_seconds = asyncio.run(serve(backend, keys, body))
+    elapsed = time.perf_counter() - started
+    if kind == "shared":
+        held = backend.stats().bytes
+        backend.close()
+    else:
+        # Every miss stored the body under its key
+        held = (len(keys) - hits) * len(body)
+    results.put((hits, get_seconds, elapsed, held))
+
+
+def run(kind: str, workers: int, args, body: bytes) -> dict:
+    context = multiprocessing.get_context("fork")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    with tempfile.TemporaryDirectory() as directory:
+        path = str(Path(directory) / "cache.sqlite")
+        if kind == "shared":
+            # Created up front, like the first worker to start would
+            SharedCacheBackend(path=path).open()
+        processes = [
+            context.Process(
+                target=worker,
+                kwargs={
+                    "kind": kind,
+                    "path": path,
+                    "keys": zipf_keys(args.requests, args.keys, seed),
+                    "body": body,
+                    "barrier": barrier,
+                    "results": results,
+                },
+            )
+            for seed in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        outcomes = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+    requests = workers * args.requests
+    hits = sum(outcome[0] for outcome in outcomes)
+    held = [outcome[3] for outcome in outcomes]
+    return {
+        "hit_ratio": hits / requests,
+        "requests_per_second": requests / max(outcome[2] for outcome in outcomes),
+        "get_ms": sum(outcome[1] for outcome in outcomes) / requests * 1000,
+        # The shared file is counted once
+        "cache_mb": (max(held) if kind == "shared" else sum(held)) / 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--keys", type=int, default=1000)
+    parser.add_argument("--entities", type=int, default=10)
+    args = parser.parse_args()
+    body = response_body(args.entities)
+    print(f"{len(body)} byte responses, {args.keys} keys")
+    print(
+        f"{'backend':>8} {'workers':>7} {'hit %':>6} {'req/s':>8} "
+        f"{'get ms':>7} {'cache MB':>9}"
+    )
+    for workers in args.workers:
+        for kind in ("memory", "shared"):
+            result = run(kind, workers, args, body)
+            print(
+                f"{kind:>8} {workers:>7} {result['hit_ratio'] * 100:>6.1f} "
+                f"{result['requests_per_second']:>8.0f} {result['get_ms']:>7.3f} "
+                f"{result['cache_mb']:>9.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Load test of SubscriptionHub with simulated subscribers
+
+Every subscriber watches a random set of entities out of a shared pool,
+and the fake source returns the synthetic revisions of each hour of a
+week, one hour per poll. Reports what a poll asks of the source, entities
+and fetches, next to what polling per subscriber would, and the time of a
+poll with the fan-out to all subscribers.
+
+    python -m tests.benchmarks.bench_subscriptions --subscribers 10 100 1000
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from models.subscriptions import SubscriptionHub
+from models.validator import Validator
+from models.window import shift_timestamp
+from tests.fakes import FakeEntitySource
+from tests.synthetic import bot_user_ids, generate_revisions
+
+START = "20250801000000"
+
+
+async def run_once(args, rows, subscribers: int):
+    source = FakeEntitySource(rows, latency=args.latency)
+
+    async def bots():
+        return bot_user_ids()
+
+    hub = SubscriptionHub(source=source, load_bots=bots, max_subscribers=subscribers)
+    rng = random.Random(subscribers)  # noqa: S311, RUF100
+    pool = [f"Q{i}" for i in range(1, args.entities + 1)]
+    subscriptions = []
+    for _ in range(subscribers):
+        subscription = hub.subscribe(
+            Validator(
+                entities=rng.sample(pool, args.per_subscriber),
+                start_date="20250801",
+                end_date="20250807",
+                no_bots=rng.random() < 0.5,
+                only_unpatrolled=rng.random() < 0.2,
+            )
+        )
+        subscription.since = START
+        subscriptions.append(subscription)
+    naive = sum(len(s.params.entities) for s in subscriptions)
+
+    timings = []
+    events = size = 0
+    now = START
+    for _ in range(args.polls):
+        now = shift_timestamp(now, 3600)
+        started = time.perf_counter()
+        await hub.poll(now=now)
+        timings.append(time.perf_counter() - started)
+        # The subscribers read their events before the next poll
+        for subscription in subscriptions:
+            while event := await subscription.next_event(timeout=0):
+                events += 1
+                size += len(event)
+
+    stats = hub.stats()
+    assert stats.dropped == 0
+    print(
+        f"{subscribers:>11} {stats.entities:>8} {naive:>8}"
+        f" {len(source.fetches) / args.polls:>7.1f} {subscribers:>7}"
+        f" {statistics.median(timings) * 1000:>8.2f}"
+        f" {events / args.polls:>9.1f} {size / args.polls / 1024:>8.1f}"
+    )
+
+
+async def run(args):
+    rows = generate_revisions(entity_count=args.entities, edits_per_entity=args.edits)
+    print(
+        f"{args.entities} entities with {args.edits} edits each,"
+        f" {args.per_subscriber} entities per subscriber,"
+        f" {args.latency * 1000:.0f} ms per fetch"
+    )
+    print(
+        f"{'subscribers':>11} {'entities':>8} {'naive':>8} {'fetches':>7}"
+        f" {'naive':>7} {'poll ms':>8} {'events':>9} {'KiB':>8}"
+    )
+    for subscribers in args.subscribers:
+        await run_once(args, rows, subscribers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--subscribers", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--entities", type=int, default=200)
+    parser.add_argument("--per-subscriber", type=int, default=5)
+    parser.add_argument("--edits", type=int, default=500)
+    parser.add_argument("--polls", type=int, default=24)
+    parser.add_argument("--latency", type=float, default=0.01)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
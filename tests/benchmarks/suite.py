@@ -0,0 +1,173 @@
+"""Micro-benchmarks of the request pipeline with a regression check
+
+Times Splitter, Validator, Aggregator and a full GET /api/v1/revisions
+through TestClient with Read stubbed to return synthetic rows, so no
+database is involved. Results are written as JSON; pass a previous run as
+--baseline to fail when a case got slower by more than --threshold.
+
+    python -m tests.benchmarks.suite --output bench.json
+    python -m tests.benchmarks.suite --baseline bench.json --threshold 0.2
+"""
+
+import argparse
+import json
+import logging
+import platform
+import sys
+import timeit
+from collections.abc import Callable
+from contextlib import ExitStack
+from typing import Any
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+import main
+from models.aggregator import Aggregator
+from models.read import Read
+from models.revision_row import RevisionRow
+from models.splitter import Splitter
+from models.validator import Validator
+from tests.synthetic import generate_revisions
+
+
+def best_of(function: Callable[[], Any], repeat: int) -> dict:
+    """Best and mean milliseconds per call over `repeat` rounds. Each round
+    makes enough calls to take at least 0.2s, like timeit's autorange."""
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    rounds = [
+        seconds / number * 1000 for seconds in timer.repeat(repeat, number=number)
+    ]
+    return {
+        "best_ms": min(rounds),
+        "mean_ms": sum(rounds) / len(rounds),
+        "repeat": repeat,
+        "number": number,
+    }
+
+
+def endpoint_case(rows: list[dict], entities: str) -> Callable[[], Any]:
+    """GET /revisions with Read.execute_async returning `rows`. The response
+    and entity caches are off so every call runs the whole pipeline."""
+
+    async def execute_async(self, sql, params_list, records=False):
+        if records:
+            return [RevisionRow(**row) for row in rows]
+        return rows
+
+    stack = ExitStack()
+    stack.enter_context(patch("config.DB_MODE", "async"))
+    stack.enter_context(patch("config.FETCH_STRATEGY", "rows"))
+    stack.enter_context(patch.object(Read, "execute_async", execute_async))
+    client = stack.enter_context(TestClient(main.app))
+    main.app.state.response_cache = None
+    main.app.state.entity_cache = None
+
+    def call():
+        response = client.get("/api/v1/revisions", params={"entities": entities})
+        if response.status_code != 200:
+            stack.close()
+            raise RuntimeError(response.text)
+
+    call.close = stack.close  # type: ignore[attr-defined]
+    return call
+
+
+def run(args: argparse.Namespace) -> dict:
+    rows = generate_revisions(
+        entity_count=args.entities,
+        edits_per_entity=args.edits,
+        user_count=args.users,
+        bot_share=args.bot_share,
+    )
+    entity_ids = [f"Q{n}" for n in range(1, args.entities + 1)]
+    entities = ",".join(entity_ids)
+    exclude_users = ",".join(f"User{n}" for n in range(10))
+
+    def split():
+        Splitter(string=entities).split_comma_separated_string()
+        Splitter(string=exclude_users).split_comma_separated_string()
+
+    def validate():
+        Validator(
+            entities=entity_ids,
+            start_date="20250801",
+            end_date="20250808",
+            no_bots=True,
+            exclude_users=exclude_users.split(","),
+        )
+
+    def aggregate():
+        Aggregator.from_rows(rows).aggregate()
+
+    endpoint = endpoint_case(rows, entities)
+    try:
+        cases = {
+            "splitter": best_of(split, args.repeat),
+            "validator": best_of(validate, args.repeat),
+            "aggregator": best_of(aggregate, args.repeat),
+            "endpoint": best_of(endpoint, args.repeat),
+        }
+    finally:
+        endpoint.close()  # type: ignore[attr-defined]
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "entities": args.entities,
+            "edits_per_entity": args.edits,
+            "users": args.users,
+            "bot_share": args.bot_share,
+            "rows": len(rows),
+        },
+        "cases": cases,
+    }
+
+
+def regressions(result: dict, baseline: dict, threshold: float) -> list[str]:
+    """Cases whose best time grew by more than `threshold` (0.2 = 20%)"""
+    slower = []
+    for name, case in result["cases"].items():
+        before = baseline.get("cases", {}).get(name)
+        if before is None:
+            continue
+        ratio = case["best_ms"] / before["best_ms"]
+        if ratio > 1 + threshold:
+            slower.append(
+                f"{name}: {before['best_ms']:.3f} ms -> {case['best_ms']:.3f} ms "
+                f"({ratio - 1:+.0%})"
+            )
+    return slower
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entities", type=int, default=100)
+    parser.add_argument("--edits", type=int, default=100, help="edits per entity")
+    parser.add_argument("--users", type=int, default=50, help="user cardinality")
+    parser.add_argument("--bot-share", type=float, default=0.2)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON file of an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    result = run(args)
+    for name, case in result["cases"].items():
+        print(f"{name:>12} {case['best_ms']:>10.3f} ms")
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(result, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            slower = regressions(result, json.load(file), args.threshold)
+        for line in slower:
+            print(f"REGRESSION {line}")
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,158 @@
+"""Stand-ins for pymysql/aiomysql connections so tests and benchmarks run offline"""
+
+import asyncio
+import time
+
+import pymysql
+from fastapi_cache.backends.inmemory import InMemoryBackend
+
+from models.revision_row import RevisionRow
+from models.sqlite_connection import TUPLE_CURSORS
+
+
+def clear_in_memory_cache():
+    """Empty the store that all InMemoryBackend instances share, its
+    clear() only drops a namespace or a single key"""
+    InMemoryBackend._store.clear()  # noqa: SLF001
+
+
+class FakeCursor:
+    def __init__(self, connection, cursor_class=None):
+        self.connection = connection
+        self.tuples = cursor_class in TUPLE_CURSORS
+        self.rows = []
+
+    def result(self, params=None):
+        rows = self.connection.rows
+        if self.connection.by_entity:
+            rows = [row for row in rows if row["entity_id"] in (params or ())]
+        if self.tuples:
+            return [
+                tuple(row.get(field) for field in RevisionRow._fields) for row in rows
+            ]
+        return list(rows)
+
+    def execute(self, sql, params=None):
+        self.connection.executed.append((sql, params))
+        if self.connection.latency:
+            time.sleep(self.connection.latency)
+        self.rows = self.result(params)
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchmany(self, size=1000):
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """by_entity returns only the rows of entities among the query parameters,
+    otherwise every query returns all rows"""
+
+    def __init__(self, rows=None, latency: float = 0.0, by_entity: bool = False):
+        self.rows = rows or []
+        self.latency = latency
+        self.by_entity = by_entity
+        self.executed = []
+        self.closed = False
+        self.healthy = True
+
+    def cursor(self, cursor_class=None):
+        return FakeCursor(self, cursor_class)
+
+    def ping(self, reconnect=False):
+        if not self.healthy:
+            raise pymysql.err.OperationalError(2006, "MySQL server has gone away")
+
+    def close(self):
+        self.closed = True
+
+
+class FakeAsyncCursor(FakeCursor):
+    async def execute(self, sql, params=None):
+        self.connection.executed.append((sql, params))
+        if self.connection.latency:
+            await asyncio.sleep(self.connection.latency)
+        self.rows = self.result(params)
+
+    async def fetchall(self):
+        return self.rows
+
+    async def fetchmany(self, size=1000):
+        return super().fetchmany(size)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeAsyncConnection(FakeConnection):
+    def cursor(self, cursor_class=None):
+        return FakeAsyncCursor(self, cursor_class)
+
+    async def ping(self, reconnect=False):
+        super().ping(reconnect=reconnect)
+
+
+class FakeRevisionSource:
+    """In-memory source for RevisionIngester, rows as from generate_revisions"""
+
+    def __init__(self, rows=(), bot_ids=()):
+        self.rows = {}
+        self.bot_ids = set(bot_ids)
+        self.add(rows)
+
+    def add(self, rows):
+        for row in rows:
+            self.rows[row["rev_id"]] = {**row, "page_namespace": 0}
+
+    async def first_rev_id(self, since):
+        return min(
+            (r["rev_id"] for r in self.rows.values() if r["rev_timestamp"] >= since),
+            default=None,
+        )
+
+    async def fetch_after(self, rev_id, limit):
+        return [self.rows[i] for i in sorted(self.rows) if i > rev_id][:limit]
+
+    async def fetch_patrolled(self, rev_ids):
+        return {
+            i: self.rows[i]["rc_patrolled"] if i in self.rows else None for i in rev_ids
+        }
+
+    async def fetch_bot_ids(self):
+        return set(self.bot_ids)
+
+
+class FakeEntitySource:
+    """In-memory source for SubscriptionHub, rows as from generate_revisions.
+    Records the entities of every fetch and sleeps `latency` per fetch."""
+
+    def __init__(self, rows=(), latency=0.0):
+        self.rows = []
+        self.latency = latency
+        self.fetches = []
+        self.add(rows)
+
+    def add(self, rows):
+        self.rows += [
+            RevisionRow(**{field: row[field] for field in RevisionRow._fields})
+            for row in rows
+        ]
+
+    async def fetch(self, entities, start, end):
+        self.fetches.append(list(entities))
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        wanted = set(entities)
+        return [
+            row
+            for row in self.rows
+            if row.entity_id in wanted and start <= row.rev_timestamp <= end
+        ]
@@ -0,0 +1,95 @@
+"""SQLite stand-in for the wikidatawiki replica
+
+Only the tables and columns that Read queries are created, see
+models/sqlite_connection.py for the connections."""
+
+import itertools
+import sqlite3
+
+from models.sqlite_connection import AsyncSQLiteConnection, SQLiteConnection
+
+_ids = itertools.count()
+
+SCHEMA = """
+CREATE TABLE page (
+    page_id INTEGER PRIMARY KEY,
+    page_namespace INTEGER NOT NULL,
+    page_title TEXT NOT NULL
+);
+CREATE INDEX page_name_title ON page (page_namespace, page_title);
+CREATE TABLE revision_compat (
+    rev_id INTEGER PRIMARY KEY,
+    rev_page INTEGER NOT NULL,
+    rev_user INTEGER NOT NULL,
+    rev_user_text TEXT NOT NULL,
+    rev_timestamp TEXT NOT NULL
+);
+CREATE INDEX rev_page_timestamp ON revision_compat (rev_page, rev_timestamp);
+CREATE TABLE recentchanges (
+    rc_this_oldid INTEGER PRIMARY KEY,
+    rc_patrolled INTEGER NOT NULL
+);
+CREATE TABLE user_groups (
+    ug_user INTEGER NOT NULL,
+    ug_group TEXT NOT NULL
+);
+"""
+
+
+class Replica:
+    """An in-memory database shared by all connections from this instance"""
+
+    def __init__(self):
+        self.uri = f"file:replica{next(_ids)}?mode=memory&cache=shared"
+        # Keeps the shared in-memory database alive
+        self._anchor = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+        self._anchor.executescript(SCHEMA)
+
+    def load(self, rows: list[dict], bot_ids=(), namespace: int = 0):
+        """Insert synthetic rows, see tests.synthetic.generate_revisions"""
+        pages = {(row["rev_page"], row["entity_id"]) for row in rows}
+        self._anchor.executemany(
+            "INSERT OR IGNORE INTO page VALUES (?, ?, ?)",
+            [(page_id, namespace, title) for page_id, title in pages],
+        )
+        self._anchor.executemany(
+            "INSERT INTO revision_compat VALUES (?, ?, ?, ?, ?)",
+            [
+                (
+                    row["rev_id"],
+                    row["rev_page"],
+                    row["rev_user"],
+                    row["rev_user_text"],
+                    row["rev_timestamp"],
+                )
+                for row in rows
+            ],
+        )
+        self._anchor.executemany(
+            "INSERT INTO recentchanges VALUES (?, ?)",
+            [
+                (row["rev_id"], row["rc_patrolled"])
+                for row in rows
+                if row.get("rc_patrolled") is not None
+            ],
+        )
+        self._anchor.executemany(
+            "INSERT INTO user_groups VALUES (?, 'bot')", [(i,) for i in bot_ids]
+        )
+        self._anchor.commit()
+
+    def patrol(self, rev_id: int, value: int = 1):
+        self._anchor.execute(
+            "UPDATE recentchanges SET rc_patrolled = ? WHERE rc_this_oldid = ?",
+            [value, rev_id],
+        )
+        self._anchor.commit()
+
+    def connect(self) -> SQLiteConnection:
+        return SQLiteConnection(self.uri)
+
+    async def connect_async(self) -> AsyncSQLiteConnection:
+        return AsyncSQLiteConnection(self.uri)
+
+    def close(self):
+        self._anchor.close()
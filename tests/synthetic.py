@@ -0,0 +1,47 @@
+"""Synthetic replica rows for tests and benchmarks"""
+
+import random
+from collections.abc import Iterator
+from datetime import datetime, timedelta, timezone
+
+
+def generate_revisions(**kwargs) -> list[dict]:
+    """Rows shaped like the SELECT in Read.fetch_revisions, already decoded.
+    See iter_revisions for the arguments."""
+    return list(iter_revisions(**kwargs))
+
+
+def iter_revisions(
+    *,
+    entity_count: int = 10,
+    edits_per_entity: int = 100,
+    user_count: int = 50,
+    bot_share: float = 0.2,
+    start: datetime = datetime(2025, 8, 1, tzinfo=timezone.utc),
+    days: int = 7,
+    seed: int = 42,
+) -> Iterator[dict]:
+    """Lazily generate rows, e.g. to simulate an unbuffered cursor.
+    The first bot_share of the user ids are bots, see bot_user_ids()."""
+    rnd = random.Random(seed)  # noqa: S311, RUF100
+    bots = bot_user_ids(user_count=user_count, bot_share=bot_share)
+    span = days * 24 * 3600
+    rev_id = 1
+    for page in range(1, entity_count + 1):
+        for _ in range(edits_per_entity):
+            user = rnd.randint(1, user_count)
+            timestamp = start + timedelta(seconds=rnd.randrange(span))
+            yield {
+                "rev_id": rev_id,
+                "rev_page": page,
+                "rev_user": user,
+                "rev_user_text": f"Bot{user}" if user in bots else f"User{user}",
+                "rev_timestamp": timestamp.strftime("%Y%m%d%H%M%S"),
+                "entity_id": f"Q{page}",
+                "rc_patrolled": rnd.choice((0, 1, 2, None)),
+            }
+            rev_id += 1
+
+
+def bot_user_ids(user_count: int = 50, bot_share: float = 0.2) -> set[int]:
+    return set(range(1, int(user_count * bot_share) + 1))
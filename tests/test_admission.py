@@ -0,0 +1,103 @@
+import asyncio
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+import httpx
+from starlette.datastructures import State
+
+import main
+from models.admission import AdmissionController
+from models.exceptions import OverloadedError
+from models.pool import AsyncConnectionPool
+from tests.fakes import FakeAsyncConnection
+from tests.synthetic import generate_revisions
+
+
+class TestAdmissionController(IsolatedAsyncioTestCase):
+    async def test_queues_over_the_limit(self):
+        admission = AdmissionController(min_limit=1, max_limit=1, queue_timeout=1)
+        await admission.acquire()
+        waiter = asyncio.create_task(admission.acquire())
+        await asyncio.sleep(0)
+        assert admission.stats().queued == 1
+        admission.release(0.01)
+        await waiter
+        stats = admission.stats()
+        assert (stats.in_flight, stats.queued, stats.admitted) == (1, 0, 2)
+
+    async def test_rejects_when_the_queue_is_full(self):
+        admission = AdmissionController(min_limit=1, max_limit=1, max_queue=0)
+        await admission.acquire()
+        with self.assertRaises(OverloadedError) as raised:
+            await admission.acquire()
+        assert raised.exception.retry_after >= 1
+        assert admission.stats().rejected == 1
+
+    async def test_rejects_after_the_queue_timeout(self):
+        admission = AdmissionController(min_limit=1, max_limit=1, queue_timeout=0.01)
+        await admission.acquire()
+        with self.assertRaises(OverloadedError):
+            await admission.acquire()
+        assert admission.stats().queued == 0
+
+    async def test_cancelled_waiters_leave_the_queue(self):
+        admission = AdmissionController(min_limit=1, max_limit=1)
+        await admission.acquire()
+        waiter = asyncio.create_task(admission.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        admission.release(0.01)
+        assert admission.stats().in_flight == 0
+        assert admission.stats().queued == 0
+
+    async def test_limit_follows_latency(self):
+        admission = AdmissionController(min_limit=2, max_limit=10)
+        for _ in range(50):
+            await admission.acquire()
+            admission.release(0.01)
+        assert admission.stats().limit == 10
+        for _ in range(50):
+            await admission.acquire()
+            admission.release(1.0)
+        assert admission.stats().limit == 2
+        for _ in range(500):
+            await admission.acquire()
+            admission.release(1.0)
+        assert admission.stats().limit > 2
+
+    async def test_failures_shrink_the_limit(self):
+        admission = AdmissionController(min_limit=2, max_limit=10)
+        with self.assertRaises(ValueError):
+            async with admission.slot():
+                raise ValueError()
+        assert admission.stats().limit == 9
+
+
+class TestLoadShedding(IsolatedAsyncioTestCase):
+    async def test_503_with_retry_after(self):
+        connection = FakeAsyncConnection(
+            rows=generate_revisions(entity_count=2, edits_per_entity=5), latency=0.1
+        )
+
+        async def connect():
+            return connection
+
+        state = State()
+        state.pool = AsyncConnectionPool(connect=connect, min_size=0)
+        state.admission = AdmissionController(min_limit=1, max_limit=1, max_queue=0)
+        transport = httpx.ASGITransport(app=main.app)
+        with patch.object(main.app, "state", state):
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://test"
+            ) as client:
+                responses = await asyncio.gather(
+                    *[
+                        client.get("/api/v1/revisions", params={"entities": entity})
+                        for entity in ("Q1", "Q2")
+                    ]
+                )
+        statuses = sorted(response.status_code for response in responses)
+        assert statuses == [200, 503]
+        rejected = next(r for r in responses if r.status_code == 503)
+        assert int(rejected.headers["Retry-After"]) >= 1
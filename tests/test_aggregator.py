@@ -1,7 +1,10 @@
+from decimal import Decimal
 from unittest import TestCase
 
 from models.aggregator import Aggregator
 from models.revision import Revision
+from tests.benchmarks.bench_aggregator import legacy_aggregate
+from tests.synthetic import generate_revisions
 
 
 class TestAggregator(TestCase):
@@ -113,3 +116,40 @@ class TestAggregator(TestCase):
 
         assert bob_rev.users[0].username == "Bob"
         assert bob_rev.users[0].count == 1
+
+    def test_aggregate_decodes_bytes_from_the_replica(self):
+        rows = [
+            {
+                "rev_page": 129,
+                "rev_user": 1433337,
+                "rev_user_text": b"MatSuBot",
+                "rev_timestamp": b"20250811025635",
+                "entity_id": b"Q1",
+                "rev_id": 2390482225,
+            }
+        ]
+        result = Aggregator(revisions=rows).aggregate()
+        assert result[0].users[0].username == "MatSuBot"
+        assert result[0].entity_id == "Q1"
+
+    def test_fast_path_matches_previous_output(self):
+        rows = generate_revisions(entity_count=5, edits_per_entity=200, user_count=20)
+        # Replica types: Decimal user ids and varbinary columns
+        rows += [
+            {
+                "rev_page": 6,
+                "rev_user": Decimal(7),
+                "rev_user_text": b"User7",
+                "rev_timestamp": b"20250802000000",
+                "entity_id": b"Q6",
+                "rev_id": rev_id,
+                "rc_patrolled": None,
+            }
+            for rev_id in (10_001, 10_000)
+        ]
+        result = Aggregator.from_rows(rows).aggregate()
+        expected = legacy_aggregate(rows)
+        assert [r.model_dump() for r in result] == [r.model_dump() for r in expected]
+        # Equal timestamps are ordered by rev_id
+        assert result[-1].earliest.rev_id == 10_000
+        assert result[-1].latest.rev_id == 10_001
@@ -0,0 +1,24 @@
+from unittest import TestCase
+
+from tests.benchmarks.suite import regressions
+
+
+def result(**cases):
+    return {"cases": {name: {"best_ms": ms} for name, ms in cases.items()}}
+
+
+class TestRegressions(TestCase):
+    def test_within_threshold(self):
+        assert regressions(result(aggregator=11.0), result(aggregator=10.0), 0.2) == []
+
+    def test_slower_than_threshold(self):
+        (line,) = regressions(
+            result(aggregator=13.0, splitter=1.0),
+            result(aggregator=10.0, splitter=1.0),
+            0.2,
+        )
+        assert line.startswith("aggregator:")
+        assert "+30%" in line
+
+    def test_new_cases_are_skipped(self):
+        assert regressions(result(endpoint=5.0), result(), 0.2) == []
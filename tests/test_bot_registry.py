@@ -0,0 +1,118 @@
+import asyncio
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+import pymysql
+
+from models.bot_registry import BotRegistry, load_bot_ids
+from models.fetcher import Fetcher
+from models.pool import AsyncConnectionPool, ConnectionPool
+from models.read import Read
+from models.validator import Validator
+from tests.replica import Replica
+from tests.synthetic import bot_user_ids, generate_revisions
+from tests.test_grouped import normalize
+
+
+class TestBotRegistry(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.ids = {1, 2}
+        self.fail = False
+
+    async def load(self):
+        if self.fail:
+            raise pymysql.err.OperationalError(2013, "Lost connection")
+        return set(self.ids)
+
+    async def test_refresh(self):
+        registry = BotRegistry(load=self.load)
+        assert registry.ids is None
+        assert registry.stats().staleness_seconds is None
+        assert await registry.refresh()
+        assert registry.ids == {1, 2}
+        stats = registry.stats()
+        assert stats.loaded
+        assert stats.size == 2
+        assert stats.staleness_seconds >= 0
+
+    async def test_failed_refresh_keeps_the_ids(self):
+        registry = BotRegistry(load=self.load)
+        await registry.refresh()
+        self.fail = True
+        assert not await registry.refresh()
+        assert registry.ids == {1, 2}
+        assert registry.stats().failures == 1
+
+    async def test_background_refresh(self):
+        registry = BotRegistry(load=self.load, interval=0.01)
+        await registry.refresh()
+        self.ids = {3}
+        registry.start()
+        await asyncio.sleep(0.05)
+        await registry.stop()
+        assert registry.ids == {3}
+        assert registry.stats().refreshes > 1
+
+
+class TestLoadBotIds(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.replica = Replica()
+        self.replica.load([], bot_ids=[4, 5])
+
+    def tearDown(self):
+        self.replica.close()
+
+    async def test_sync_pool(self):
+        pool = ConnectionPool(connect=self.replica.connect, min_size=0)
+        assert await load_bot_ids(pool) == {4, 5}
+
+    async def test_async_pool(self):
+        pool = AsyncConnectionPool(connect=self.replica.connect_async, min_size=0)
+        assert await load_bot_ids(pool) == {4, 5}
+
+
+class TestBotIdsQuery(TestCase):
+    def params(self, **kwargs):
+        return Validator(
+            entities=["Q1"], start_date="20250801", end_date="20250808", **kwargs
+        )
+
+    def test_no_subquery_with_bot_ids(self):
+        read = Read(params=self.params(no_bots=True), bot_ids=frozenset({9, 3}))
+        sql, params_list = read.build_query()
+        assert "user_groups" not in sql
+        assert params_list[-2:] == [3, 9]
+
+    def test_without_bot_ids_falls_back_to_the_subquery(self):
+        sql, _ = Read(params=self.params(no_bots=True)).build_query()
+        assert "user_groups" in sql
+
+    def test_no_bots_without_any_bots(self):
+        read = Read(params=self.params(no_bots=True), bot_ids=frozenset())
+        assert read.build_query() == Read(params=self.params()).build_query()
+
+
+class TestBotIdsParity(IsolatedAsyncioTestCase):
+    async def test_same_result_as_the_subquery(self):
+        replica = Replica()
+        replica.load(
+            generate_revisions(entity_count=3, edits_per_entity=100),
+            bot_ids=bot_user_ids(),
+        )
+        pool = AsyncConnectionPool(connect=replica.connect_async, min_size=0)
+        params = Validator(
+            entities=["Q1", "Q2", "Q3"],
+            start_date="20250801",
+            end_date="20250808",
+            no_bots=True,
+        )
+        try:
+            expected = await Fetcher(params=params, pool=pool).fetch()
+            result = await Fetcher(
+                params=params, pool=pool, bot_ids=frozenset(bot_user_ids())
+            ).fetch()
+        finally:
+            await pool.close()
+            replica.close()
+        assert result
+        assert normalize(result) == normalize(expected)
+        assert all(not u.username.startswith("Bot") for r in result for u in r.users)
@@ -0,0 +1,66 @@
+import json
+from unittest import TestCase
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+import main
+from models.pool import AsyncConnectionPool
+from tests.fakes import clear_in_memory_cache
+from tests.replica import Replica
+from tests.synthetic import generate_revisions
+
+
+class TestBulkEndpoint(TestCase):
+    def setUp(self):
+        clear_in_memory_cache()
+        self.replica = Replica()
+        self.replica.load(generate_revisions(entity_count=2500, edits_per_entity=2))
+        self.client = TestClient(main.app)
+        self.client.__enter__()
+        main.app.state.pool = AsyncConnectionPool(
+            connect=self.replica.connect_async, min_size=0
+        )
+        # A fresh entity cache per test so both strategies hit the database
+        main.app.state.entity_cache = None
+        self.entities = [f"Q{i}" for i in range(1, 3001)]
+
+    def tearDown(self):
+        self.client.__exit__(None, None, None)
+        self.replica.close()
+
+    def post(self, strategy, entities):
+        with (
+            patch("config.BULK_STRATEGY", strategy),
+            patch("config.BULK_CHUNK_SIZE", 700),
+        ):
+            return self.client.post(
+                "/api/v1/revisions/bulk",
+                json={
+                    "entities": entities,
+                    "start_date": "20250801",
+                    "end_date": "20250808",
+                },
+            )
+
+    def test_strategies_return_the_same_revisions(self):
+        results = {}
+        for strategy in ("in_list", "temp_table"):
+            response = self.post(strategy, self.entities)
+            assert response.status_code == 200
+            assert response.headers["content-type"] == "application/x-ndjson"
+            lines = [json.loads(line) for line in response.text.splitlines()]
+            results[strategy] = sorted(lines, key=lambda r: r["page_id"])
+        assert len(results["in_list"]) == 2500
+        assert results["in_list"] == results["temp_table"]
+
+    def test_more_than_the_get_limit(self):
+        assert len(self.entities) > main.config.MAX_ENTITY_COUNT
+        assert self.post("in_list", self.entities).status_code == 200
+
+    def test_too_many_entities(self):
+        with patch("config.MAX_BULK_ENTITY_COUNT", 10):
+            assert self.post("in_list", self.entities).status_code == 422
+
+    def test_invalid_entity(self):
+        assert self.post("in_list", ["Q1", "X2"]).status_code == 422
@@ -0,0 +1,158 @@
+from typing import ClassVar
+from unittest import IsolatedAsyncioTestCase, TestCase
+from unittest.mock import patch
+
+import httpx
+from fastapi_cache.backends.inmemory import InMemoryBackend
+from starlette.datastructures import State
+
+import main
+from models.conditional_get import ConditionalGet, etag_matches
+from models.entity_resolver import EntityResolver
+from models.fetcher import Fetcher
+from models.pool import AsyncConnectionPool
+from models.response_cache import ResponseCache
+from models.validator import Validator
+from tests.fakes import clear_in_memory_cache
+from tests.replica import Replica
+from tests.synthetic import generate_revisions
+
+PARAMS = {"entities": "Q1,Q2", "start_date": "20250801", "end_date": "20250807"}
+
+
+class TestEtagMatches(TestCase):
+    def test_weak_comparison(self):
+        assert etag_matches('W/"abc"', 'W/"abc"')
+        assert etag_matches('"abc"', 'W/"abc"')
+        assert etag_matches('"x", W/"abc"', 'W/"abc"')
+        assert etag_matches("*", 'W/"abc"')
+        assert not etag_matches('W/"abd"', 'W/"abc"')
+        assert not etag_matches(None, 'W/"abc"')
+
+
+class TestEtag(TestCase):
+    row: ClassVar[dict[str, int]] = {
+        "rev_page": 1,
+        "count": 10,
+        "max_rev_id": 99,
+        "in_recentchanges": 4,
+        "patrolled": 3,
+    }
+
+    def etag(self, rows=None, **params):
+        values = {"entities": ["Q1"], "start_date": "20250801", "end_date": "20250807"}
+        values.update(params)
+        return ConditionalGet.etag(Validator(**values), rows or [self.row])
+
+    def test_window_is_left_out(self):
+        assert self.etag() == self.etag(start_date="20250802")
+
+    def test_changes_with_the_probe(self):
+        for column in ("count", "max_rev_id", "in_recentchanges", "patrolled"):
+            changed = {**self.row, column: self.row[column] + 1}
+            assert self.etag([changed]) != self.etag(), column
+
+    def test_changes_with_the_filters(self):
+        assert self.etag(no_bots=True) != self.etag()
+        assert self.etag(exclude_users=["Bob"]) != self.etag()
+
+    def test_page_order_does_not_matter(self):
+        other = {**self.row, "rev_page": 2}
+        assert self.etag([self.row, other]) == self.etag([other, self.row])
+
+
+class TestConditionalEndpoint(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        clear_in_memory_cache()
+        self.rows = generate_revisions(entity_count=3, edits_per_entity=50)
+        self.replica = Replica()
+        self.replica.load(self.rows)
+        self.state = State()
+        self.state.pool = AsyncConnectionPool(
+            connect=self.replica.connect_async, min_size=0
+        )
+        self.state.response_cache = ResponseCache(backend=InMemoryBackend())
+        self.state.conditional_get = ConditionalGet()
+
+    async def asyncTearDown(self):
+        await self.state.pool.close()
+        self.replica.close()
+        clear_in_memory_cache()
+
+    async def get(self, etag=None) -> httpx.Response:
+        headers = {} if etag is None else {"If-None-Match": etag}
+        transport = httpx.ASGITransport(app=main.app)
+        with patch.object(main.app, "state", self.state):
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://test"
+            ) as client:
+                return await client.get(
+                    "/api/v1/revisions", params=PARAMS, headers=headers
+                )
+
+    async def test_not_modified_from_the_cache(self):
+        first = await self.get()
+        assert first.status_code == 200
+        etag = first.headers["ETag"]
+        assert etag.startswith('W/"')
+        second = await self.get(etag)
+        assert second.status_code == 304
+        assert second.headers["ETag"] == etag
+        assert second.content == b""
+
+    async def test_not_modified_from_the_probe(self):
+        etag = (await self.get()).headers["ETag"]
+        clear_in_memory_cache()
+        with patch.object(Fetcher, "fetch_json") as fetch_json:
+            response = await self.get(etag)
+        assert response.status_code == 304
+        fetch_json.assert_not_called()
+        stats = self.state.conditional_get.stats()
+        assert stats.probes == 2
+        assert stats.not_modified == 1
+        assert stats.probe_seconds_total > 0
+
+    async def test_modified_after_an_edit(self):
+        etag = (await self.get()).headers["ETag"]
+        clear_in_memory_cache()
+        self.replica.load([{**self.rows[0], "rev_id": 10_000}])
+        response = await self.get(etag)
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+        assert sum(u["count"] for r in response.json() for u in r["users"]) == 101
+
+    async def test_modified_after_patrolling(self):
+        unpatrolled = next(row for row in self.rows if row["rc_patrolled"] == 0)
+        etag = (await self.get()).headers["ETag"]
+        clear_in_memory_cache()
+        self.replica.patrol(unpatrolled["rev_id"])
+        assert (await self.get(etag)).status_code == 200
+        stats = self.state.conditional_get.stats()
+        assert stats.modified == 1
+        assert stats.not_modified_ratio == 0.0
+
+    async def test_probe_with_the_entity_resolver(self):
+        params = Validator(
+            entities=["Q1", "Q2"], start_date="20250801", end_date="20250807"
+        )
+        plain = await Fetcher(params=params, pool=self.state.pool).probe()
+        resolved = await Fetcher(
+            params=params, pool=self.state.pool, resolver=EntityResolver()
+        ).probe()
+        assert resolved == plain
+        self.state.entity_resolver = EntityResolver()
+        etag = (await self.get()).headers["ETag"]
+        clear_in_memory_cache()
+        assert (await self.get(etag)).status_code == 304
+
+    async def test_stats_endpoint(self):
+        etag = (await self.get()).headers["ETag"]
+        await self.get(etag)
+        transport = httpx.ASGITransport(app=main.app)
+        with patch.object(main.app, "state", self.state):
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://test"
+            ) as client:
+                stats = (await client.get("/api/v1/stats/conditional-get")).json()
+        assert stats["not_modified"] == 1
+        assert stats["not_modified_ratio"] == 1.0
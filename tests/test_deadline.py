@@ -0,0 +1,243 @@
+import asyncio
+import json
+import time
+from unittest import IsolatedAsyncioTestCase, TestCase
+from unittest.mock import patch
+
+import httpx
+import pymysql
+from starlette.datastructures import State
+
+import main
+from models.deadline import run_until_disconnect
+from models.exceptions import ClientDisconnectedError, DeadlineExceededError
+from models.fetcher import Fetcher
+from models.pool import AsyncConnectionPool
+from models.read import Read
+from models.validator import Validator
+from tests.fakes import FakeAsyncConnection, FakeAsyncCursor
+from tests.synthetic import generate_revisions
+
+
+def params() -> Validator:
+    return Validator(entities=["Q1"], start_date="20250801", end_date="20250808")
+
+
+class TimingOutCursor(FakeAsyncCursor):
+    async def execute(self, sql, params=None):
+        raise pymysql.err.OperationalError(
+            1969, "Query execution was interrupted (max_statement_time exceeded)"
+        )
+
+
+class SessionConnection(FakeAsyncConnection):
+    """Has a server thread id, like aiomysql connections"""
+
+    def __init__(self, *args, thread: int = 7, cursor_class=FakeAsyncCursor, **kw):
+        super().__init__(*args, **kw)
+        self.thread = thread
+        self.cursor_class = cursor_class
+
+    def thread_id(self):
+        return self.thread
+
+    def cursor(self, cursor_class=None):
+        return self.cursor_class(self, cursor_class)
+
+
+class TestStatementDeadline(TestCase):
+    def test_selects_get_the_time_left(self):
+        read = Read(params=params(), deadline=time.monotonic() + 5)
+        prefix, statement = read.bounded("SELECT 1").split(" FOR ")
+        assert prefix.startswith("SET STATEMENT max_statement_time=")
+        assert 4 < float(prefix.split("=")[1]) <= 5
+        assert statement == "SELECT 1"
+        assert read.bounded("CREATE TEMPORARY TABLE t (x INT)").startswith("CREATE")
+
+    def test_no_deadline(self):
+        assert Read(params=params()).bounded("SELECT 1") == "SELECT 1"
+
+    def test_passed_deadline(self):
+        read = Read(params=params(), deadline=time.monotonic() - 1)
+        with self.assertRaises(DeadlineExceededError):
+            read.bounded("SELECT 1")
+
+
+class TestStatementTimeout(IsolatedAsyncioTestCase):
+    async def test_is_a_deadline_error(self):
+        connection = SessionConnection(cursor_class=TimingOutCursor)
+
+        async def connect():
+            return connection
+
+        pool = AsyncConnectionPool(connect=connect, min_size=0)
+        with self.assertRaises(DeadlineExceededError):
+            await Fetcher(params=params(), pool=pool).fetch()
+        assert connection.closed
+
+
+class TestRunUntilDisconnect(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.disconnected = asyncio.Event()
+
+    async def receive(self):
+        await self.disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def test_result(self):
+        async def work():
+            return 1
+
+        assert await run_until_disconnect(work(), self.receive, None) == 1
+
+    async def test_disconnect_cancels(self):
+        cancelled = asyncio.Event()
+
+        async def work():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        asyncio.get_running_loop().call_later(0.01, self.disconnected.set)
+        with self.assertRaises(ClientDisconnectedError):
+            await run_until_disconnect(work(), self.receive, None)
+        assert cancelled.is_set()
+
+    async def test_deadline(self):
+        with self.assertRaises(DeadlineExceededError):
+            await run_until_disconnect(
+                asyncio.sleep(10), self.receive, time.monotonic() + 0.01
+            )
+
+
+class TestKillOnCancel(IsolatedAsyncioTestCase):
+    async def test_query_is_killed(self):
+        connections = [
+            SessionConnection(latency=10, thread=7),
+            SessionConnection(thread=8),
+        ]
+
+        async def connect():
+            return connections.pop(0)
+
+        pool = AsyncConnectionPool(connect=connect, min_size=0, max_size=2)
+        slow, killer = connections
+        task = asyncio.create_task(Fetcher(params=params(), pool=pool).fetch())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert killer.executed == [("KILL QUERY %s", [7])]
+        assert slow.closed
+        assert pool.stats().in_use == 0
+
+    async def test_query_is_killed_with_the_pool_exhausted(self):
+        connections = [
+            SessionConnection(thread=6),
+            SessionConnection(latency=10, thread=7),
+            SessionConnection(thread=8),
+        ]
+
+        async def connect():
+            return connections.pop(0)
+
+        busy, slow, killer = connections
+        pool = AsyncConnectionPool(connect=connect, min_size=0, max_size=2, timeout=5)
+        held = await pool.acquire()
+        task = asyncio.create_task(Fetcher(params=params(), pool=pool).fetch())
+        await asyncio.sleep(0.01)
+        started = time.monotonic()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        # Not after waiting the pool timeout for a connection to send it on
+        assert time.monotonic() - started < 1
+        assert killer.executed == [("KILL QUERY %s", [7])]
+        assert killer.closed
+        assert slow.closed
+        assert pool.stats().in_use == 1
+        await pool.release(held)
+
+    async def test_kill_gives_up_after_the_timeout(self):
+        async def connect():
+            await asyncio.sleep(10)
+
+        fetcher = Fetcher(params=params(), pool=AsyncConnectionPool(connect=connect))
+        started = time.monotonic()
+        with (
+            patch("config.KILL_QUERY_TIMEOUT", 0.01),
+            self.assertLogs("models.fetcher", level="WARNING"),
+        ):
+            await fetcher.kill_query(7)
+        assert time.monotonic() - started < 1
+
+
+class TestDeadlineEndpoint(IsolatedAsyncioTestCase):
+    async def test_504(self):
+        connection = FakeAsyncConnection(
+            rows=generate_revisions(entity_count=1, edits_per_entity=5), latency=1
+        )
+
+        async def connect():
+            return connection
+
+        state = State()
+        state.pool = AsyncConnectionPool(connect=connect, min_size=0)
+        transport = httpx.ASGITransport(app=main.app)
+        with (
+            patch.object(main.app, "state", state),
+            patch("config.REQUEST_DEADLINE", 0.05),
+        ):
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://test"
+            ) as client:
+                response = await client.get(
+                    "/api/v1/revisions", params={"entities": "Q1"}
+                )
+        assert response.status_code == 504
+
+    async def bulk(self, deadline: float) -> list[dict]:
+        """Four chunks of 0.05s each with a 0.08s REQUEST_DEADLINE"""
+        connection = FakeAsyncConnection(
+            rows=generate_revisions(entity_count=4, edits_per_entity=5),
+            latency=0.05,
+            by_entity=True,
+        )
+
+        async def connect():
+            return connection
+
+        state = State()
+        state.pool = AsyncConnectionPool(connect=connect, min_size=0)
+        transport = httpx.ASGITransport(app=main.app)
+        with (
+            patch.object(main.app, "state", state),
+            patch("config.REQUEST_DEADLINE", 0.08),
+            patch("config.BULK_DEADLINE", deadline),
+            patch("config.BULK_STRATEGY", "in_list"),
+            patch("config.BULK_CHUNK_SIZE", 1),
+            patch("config.BULK_PARALLELISM", 1),
+        ):
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://test"
+            ) as client:
+                response = await client.post(
+                    "/api/v1/revisions/bulk",
+                    json={
+                        "entities": ["Q1", "Q2", "Q3", "Q4"],
+                        "start_date": "20250801",
+                        "end_date": "20250808",
+                    },
+                )
+        assert response.status_code == 200
+        return [json.loads(line) for line in response.text.splitlines()]
+
+    async def test_bulk_outlives_the_request_deadline(self):
+        lines = await self.bulk(deadline=0)
+        assert sorted(line["entity_id"] for line in lines) == ["Q1", "Q2", "Q3", "Q4"]
+
+    async def test_bulk_deadline_ends_the_stream_with_an_error(self):
+        *lines, last = await self.bulk(deadline=0.08)
+        assert lines
+        assert all("entity_id" in line for line in lines)
+        assert last["error"]["status_code"] == 504
@@ -0,0 +1,98 @@
+import time
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+from models.aggregator import Aggregator
+from models.entity_cache import EntityCache
+from models.fetcher import Fetcher
+from models.pool import AsyncConnectionPool
+from models.validator import Validator
+from tests.fakes import FakeAsyncConnection
+from tests.synthetic import generate_revisions
+
+
+def params(entities):
+    return Validator(entities=entities, start_date="20250801", end_date="20250808")
+
+
+class TestEntityCache(TestCase):
+    def setUp(self):
+        self.revisions = Aggregator(
+            revisions=generate_revisions(entity_count=3, edits_per_entity=10)
+        ).aggregate()
+
+    def test_get_set(self):
+        cache = EntityCache()
+        key = EntityCache.key("Q1", params(["Q1"]))
+        assert cache.get(key) is None
+        cache.set(key, self.revisions[:1])
+        assert cache.get(key) == self.revisions[:1]
+        stats = cache.stats()
+        assert stats.hits == 1
+        assert stats.misses == 1
+
+    def test_empty_result_is_cached(self):
+        cache = EntityCache()
+        key = EntityCache.key("Q99", params(["Q99"]))
+        cache.set(key, [])
+        assert cache.get(key) == []
+
+    def test_key_depends_on_window(self):
+        other = Validator(entities=["Q1"], start_date="20250802", end_date="20250808")
+        assert EntityCache.key("Q1", params(["Q1"])) != EntityCache.key("Q1", other)
+
+    def test_evicts_least_recently_used(self):
+        one_entry = EntityCache.estimate_size(
+            EntityCache.key("Q1", params(["Q1"])), self.revisions[:1]
+        )
+        cache = EntityCache(max_bytes=int(one_entry * 2.5))
+        keys = [EntityCache.key(f"Q{i}", params([f"Q{i}"])) for i in (1, 2, 3)]
+        cache.set(keys[0], self.revisions[0:1])
+        cache.set(keys[1], self.revisions[1:2])
+        cache.get(keys[0])
+        cache.set(keys[2], self.revisions[2:3])
+        assert cache.get(keys[1]) is None
+        assert cache.get(keys[0]) is not None
+        assert cache.stats().evictions == 1
+        assert cache.stats().bytes <= cache.max_bytes
+
+    def test_expired_entry_is_a_miss(self):
+        cache = EntityCache(expire=0.01)
+        key = EntityCache.key("Q1", params(["Q1"]))
+        cache.set(key, [])
+        time.sleep(0.02)
+        assert cache.get(key) is None
+
+
+class TestFetcherPartialHits(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.connection = FakeAsyncConnection(
+            rows=generate_revisions(entity_count=3, edits_per_entity=10)
+        )
+
+        async def connect():
+            return self.connection
+
+        self.pool = AsyncConnectionPool(connect=connect, min_size=0)
+        self.cache = EntityCache()
+
+    async def fetch(self, entities):
+        fetcher = Fetcher(
+            params=params(entities), pool=self.pool, entity_cache=self.cache
+        )
+        return fetcher, await fetcher.fetch()
+
+    async def test_only_missing_entities_are_queried(self):
+        await self.fetch(["Q1", "Q2"])
+        fetcher, result = await self.fetch(["Q2", "Q3"])
+        _, query_params = self.connection.executed[-1]
+        assert "Q3" in query_params
+        assert "Q2" not in query_params
+        assert [r.entity_id for r in result] == ["Q2", "Q3"]
+        assert fetcher.entity_hit_ratio == 0.5
+
+    async def test_full_hit_skips_the_replica(self):
+        await self.fetch(["Q1", "Q2"])
+        fetcher, result = await self.fetch(["Q1", "Q2"])
+        assert len(self.connection.executed) == 1
+        assert fetcher.entity_hit_ratio == 1.0
+        assert [r.entity_id for r in result] == ["Q1", "Q2"]
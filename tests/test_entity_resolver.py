@@ -0,0 +1,108 @@
+import tempfile
+from pathlib import Path
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+from models.entity_resolver import EntityResolver
+from models.fetcher import Fetcher
+from models.pool import AsyncConnectionPool
+from models.read import Read
+from models.validator import Validator
+from tests.replica import Replica
+from tests.synthetic import generate_revisions
+from tests.test_grouped import normalize
+
+
+class TestEntityResolver(IsolatedAsyncioTestCase):
+    async def test_get_many(self):
+        resolver = EntityResolver()
+        await resolver.add({"Q1": (1, 0), "P2": (2, 120)})
+        found, unknown = await resolver.get_many(["Q1", "P2", "Q3"])
+        assert found == {"Q1": (1, 0), "P2": (2, 120)}
+        assert unknown == ["Q3"]
+        stats = resolver.stats()
+        assert stats.hits == 2
+        assert stats.misses == 1
+        assert stats.entries == 2
+
+    async def test_lru_eviction(self):
+        resolver = EntityResolver(max_entries=2)
+        await resolver.add({"Q1": (1, 0), "Q2": (2, 0)})
+        await resolver.get_many(["Q1"])
+        await resolver.add({"Q3": (3, 0)})
+        _, unknown = await resolver.get_many(["Q1", "Q2", "Q3"])
+        assert unknown == ["Q2"]
+
+    async def test_file_survives_restarts(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = str(Path(directory) / "entity_pages.sqlite")
+            resolver = EntityResolver(path=path)
+            resolver.open()
+            await resolver.add({"Q1": (1, 0)})
+            resolver.close()
+
+            restarted = EntityResolver(path=path)
+            restarted.open()
+            found, unknown = await restarted.get_many(["Q1", "Q2"])
+            restarted.close()
+        assert found == {"Q1": (1, 0)}
+        assert unknown == ["Q2"]
+        assert restarted.stats().file_hits == 1
+        assert restarted.stats().entries == 1
+
+    def test_query_without_page_join(self):
+        params = Validator(
+            entities=["Q1", "Q2"], start_date="20250801", end_date="20250808"
+        )
+        sql, params_list = Read(
+            params=params, page_titles={1: "Q1", 2: "Q2"}
+        ).build_query()
+        assert "JOIN page" not in sql
+        assert params_list[:2] == [1, 2]
+
+
+class TestResolvedFetch(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.replica = Replica()
+        self.replica.load(generate_revisions(entity_count=4, edits_per_entity=100))
+        self.pool = AsyncConnectionPool(connect=self.replica.connect_async, min_size=0)
+        self.params = Validator(
+            entities=["Q1", "Q2", "Q3", "Q404"],
+            start_date="20250801",
+            end_date="20250808",
+        )
+
+    async def asyncTearDown(self):
+        await self.pool.close()
+        self.replica.close()
+
+    async def test_same_result_as_the_page_join(self):
+        for strategy in ("rows", "grouped", "stream"):
+            with (
+                self.subTest(strategy=strategy),
+                patch("config.FETCH_STRATEGY", strategy),
+            ):
+                resolver = EntityResolver()
+                expected = await Fetcher(params=self.params, pool=self.pool).fetch()
+                result = await Fetcher(
+                    params=self.params, pool=self.pool, resolver=resolver
+                ).fetch()
+                assert {r.entity_id for r in result} == {"Q1", "Q2", "Q3"}
+                assert normalize(result) == normalize(expected)
+
+    async def test_only_unknown_entities_are_looked_up(self):
+        resolver = EntityResolver()
+        await Fetcher(params=self.params, pool=self.pool, resolver=resolver).fetch()
+        await Fetcher(params=self.params, pool=self.pool, resolver=resolver).fetch()
+        stats = resolver.stats()
+        # Q404 doesn't exist, so it is looked up again
+        assert stats.lookups == 2
+        assert stats.hits == 3
+        assert stats.misses == 5
+        assert stats.lookup_seconds_max > 0
+
+    async def test_no_query_when_nothing_resolves(self):
+        params = self.params.model_copy(update={"entities": ["Q404"]})
+        fetcher = Fetcher(params=params, pool=self.pool, resolver=EntityResolver())
+        assert await fetcher.fetch() == []
+        assert self.pool.stats().checkouts == 1
@@ -0,0 +1,117 @@
+import itertools
+from unittest import IsolatedAsyncioTestCase, TestCase
+from unittest.mock import patch
+
+from models.aggregator import Aggregator, GroupedAggregator
+from models.fetcher import Fetcher
+from models.pool import AsyncConnectionPool
+from models.validator import Validator
+from tests.replica import Replica
+from tests.synthetic import bot_user_ids, generate_revisions
+
+
+def normalize(revisions):
+    """Page and user order are not part of the contract"""
+    return sorted(
+        (
+            r.page_id,
+            r.entity_id,
+            r.earliest.model_dump(),
+            r.latest.model_dump(),
+            sorted((u.user_id, u.username, u.count) for u in r.users),
+        )
+        for r in revisions
+    )
+
+
+class TestGroupedAggregator(TestCase):
+    def test_same_output_as_aggregator(self):
+        rows = [
+            {
+                "rev_page": 1,
+                "rev_user": 1,
+                "rev_user_text": "Alice",
+                "rev_timestamp": "20220101000000",
+                "entity_id": "Q1",
+                "rev_id": 1,
+            },
+            {
+                "rev_page": 1,
+                "rev_user": 2,
+                "rev_user_text": "Bob",
+                "rev_timestamp": "20220102000000",
+                "entity_id": "Q1",
+                "rev_id": 2,
+            },
+        ]
+        user_counts = [
+            {
+                "rev_page": 1,
+                "entity_id": "Q1",
+                "rev_user": 1,
+                "rev_user_text": "Alice",
+                "count": 1,
+            },
+            {
+                "rev_page": 1,
+                "entity_id": "Q1",
+                "rev_user": 2,
+                "rev_user_text": "Bob",
+                "count": 1,
+            },
+        ]
+        edges = [
+            {**rows[0], "rn_first": 1, "rn_last": 2},
+            {**rows[1], "rn_first": 2, "rn_last": 1},
+        ]
+        assert normalize(
+            GroupedAggregator(user_counts=user_counts, edges=edges).aggregate()
+        ) == normalize(Aggregator(revisions=rows).aggregate())
+
+
+class TestStrategyParity(IsolatedAsyncioTestCase):
+    """Both fetch strategies run against the SQLite stand-in"""
+
+    async def asyncSetUp(self):
+        self.replica = Replica()
+        rows = generate_revisions(
+            entity_count=5, edits_per_entity=300, user_count=40, days=7
+        )
+        # Force a tie on the earliest timestamp to check the rev_id tie break
+        earliest = min(row["rev_timestamp"] for row in rows[:300])
+        rows[0]["rev_timestamp"] = rows[1]["rev_timestamp"] = earliest
+        self.replica.load(rows, bot_ids=bot_user_ids(user_count=40))
+        self.pool = AsyncConnectionPool(connect=self.replica.connect_async, min_size=0)
+
+    async def asyncTearDown(self):
+        await self.pool.close()
+        self.replica.close()
+
+    async def fetch(self, strategy, **kwargs):
+        params = Validator(
+            entities=["Q1", "Q2", "Q3", "Q5", "Q404"],
+            start_date="20250801",
+            end_date="20250805",
+            **kwargs,
+        )
+        with patch("config.FETCH_STRATEGY", strategy):
+            return await Fetcher(params=params, pool=self.pool).fetch()
+
+    async def test_parity(self):
+        for no_bots, only_unpatrolled, exclude_users in itertools.product(
+            (False, True), (False, True), ([], ["User20", "User21"])
+        ):
+            with self.subTest(
+                no_bots=no_bots,
+                only_unpatrolled=only_unpatrolled,
+                exclude_users=exclude_users,
+            ):
+                kwargs = {
+                    "no_bots": no_bots,
+                    "only_unpatrolled": only_unpatrolled,
+                    "exclude_users": exclude_users,
+                }
+                rows = await self.fetch("rows", **kwargs)
+                grouped = await self.fetch("grouped", **kwargs)
+                assert rows
+                assert normalize(rows) == normalize(grouped)
@@ -0,0 +1,159 @@
+import asyncio
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+from models.aggregator import Aggregator
+from models.bot_registry import BotRegistry
+from models.fetcher import Fetcher
+from models.incremental import IncrementalCache
+from models.pool import AsyncConnectionPool
+from models.validator import Validator
+from tests.replica import Replica
+from tests.synthetic import generate_revisions
+
+
+def summary(revisions):
+    return {
+        r.entity_id: (
+            r.earliest.rev_timestamp,
+            r.latest.rev_timestamp,
+            sorted((u.user_id, u.username, u.count) for u in r.users),
+        )
+        for r in revisions
+    }
+
+
+class TestIncrementalFetch(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.rows = generate_revisions(entity_count=3, edits_per_entity=200, days=10)
+        self.replica = Replica()
+        self.replica.load(self.rows)
+        self.pool = AsyncConnectionPool(connect=self.replica.connect_async, min_size=0)
+        self.cache = IncrementalCache(overlap=120)
+
+    async def asyncTearDown(self):
+        await self.pool.close()
+        self.replica.close()
+
+    async def fetch(
+        self,
+        start,
+        end,
+        cache=True,
+        entities=("Q1", "Q2", "Q3"),
+        bot_ids=None,
+        **kwargs,
+    ):
+        params = Validator(
+            entities=list(entities), start_date=start, end_date=end, **kwargs
+        )
+        fetcher = Fetcher(
+            params=params,
+            pool=self.pool,
+            incremental_cache=self.cache if cache else None,
+            bot_ids=bot_ids,
+        )
+        return await fetcher.fetch()
+
+    async def test_sliding_window_matches_full_fetch(self):
+        await self.fetch("20250801000000", "20250805000000")
+        result = await self.fetch("20250802120000", "20250806120000")
+        expected = await self.fetch("20250802120000", "20250806120000", cache=False)
+        assert summary(result) == summary(expected)
+        stats = self.cache.stats()
+        assert stats.full_fetches == 3
+        assert stats.edge_trims == 3
+
+    async def test_filters_are_part_of_the_state(self):
+        await self.fetch("20250801000000", "20250805000000")
+        result = await self.fetch(
+            "20250801000000", "20250805000000", exclude_users=["User1"]
+        )
+        assert all(u.username != "User1" for r in result for u in r.users)
+        assert self.cache.stats().full_fetches == 6
+
+    async def test_new_revisions_are_merged(self):
+        with patch("models.fetcher.now_timestamp", return_value="20250805000000"):
+            await self.fetch("20250801000000", "20250806000000")
+        self.replica.load(
+            [
+                {
+                    "rev_id": 100000 + i,
+                    "rev_page": 1,
+                    "rev_user": 999,
+                    "rev_user_text": "Late",
+                    "rev_timestamp": f"2025080500{30 + i:02d}00",
+                    "entity_id": "Q1",
+                    "rc_patrolled": None,
+                }
+                for i in range(3)
+            ]
+        )
+        with patch("models.fetcher.now_timestamp", return_value="20250805010000"):
+            result = await self.fetch("20250801000000", "20250806000000")
+        expected = await self.fetch("20250801000000", "20250806000000", cache=False)
+        assert summary(result) == summary(expected)
+        q1 = next(r for r in result if r.entity_id == "Q1")
+        assert {u.username: u.count for u in q1.users}["Late"] == 3
+        assert self.cache.stats().delta_fetches == 3
+
+    async def test_overlap_is_not_counted_twice(self):
+        with patch("models.fetcher.now_timestamp", return_value="20250805000000"):
+            first = await self.fetch("20250801000000", "20250806000000")
+        with patch("models.fetcher.now_timestamp", return_value="20250805000100"):
+            second = await self.fetch("20250801000000", "20250806000000")
+        assert summary(first) == summary(second)
+
+    async def test_settled_window_is_not_queried_again(self):
+        await self.fetch("20250801000000", "20250805000000")
+        rows_before = self.cache.stats().rows_fetched
+        await self.fetch("20250801000000", "20250805000000")
+        stats = self.cache.stats()
+        assert stats.rows_fetched == rows_before
+        assert stats.settled == 3
+
+    async def test_aggregator_parity_on_window(self):
+        result = await self.fetch("20250801000000", "20250811000000")
+        expected = Aggregator(revisions=self.rows).aggregate()
+        assert summary(result) == summary(expected)
+
+    async def test_concurrent_polls_of_an_entity(self):
+        await self.fetch("20250801000000", "20250805000000", entities=["Q1"])
+        window = ("20250802120000", "20250806120000")
+        alone, both = await asyncio.gather(
+            self.fetch(*window, entities=["Q1"]),
+            self.fetch(*window, entities=["Q1", "Q2"]),
+        )
+        expected = summary(await self.fetch(*window, cache=False))
+        assert summary(alone) == {"Q1": expected["Q1"]}
+        assert summary(both) == {"Q1": expected["Q1"], "Q2": expected["Q2"]}
+
+    async def test_only_unpatrolled_is_fetched_in_full(self):
+        await self.fetch("20250801000000", "20250805000000", only_unpatrolled=True)
+        result = await self.fetch(
+            "20250802120000", "20250806120000", only_unpatrolled=True
+        )
+        expected = await self.fetch(
+            "20250802120000", "20250806120000", cache=False, only_unpatrolled=True
+        )
+        assert summary(result) == summary(expected)
+        assert self.cache.stats().full_fetches == 0
+
+    async def test_bot_registry_refresh_drops_no_bots_states(self):
+        bots = [{1}, {1, 2}]
+
+        async def load():
+            return bots.pop(0)
+
+        registry = BotRegistry(load=load)
+        await registry.refresh()
+        window = ("20250801000000", "20250805000000")
+        await self.fetch(*window, no_bots=True, bot_ids=registry.ids)
+        await registry.refresh()
+        result = await self.fetch(*window, no_bots=True, bot_ids=registry.ids)
+        assert all(u.user_id not in (1, 2) for r in result for u in r.users)
+        expected = await self.fetch(
+            *window, cache=False, no_bots=True, bot_ids=registry.ids
+        )
+        assert summary(result) == summary(expected)
+        assert self.cache.stats().full_fetches == 6
@@ -0,0 +1,88 @@
+import json
+from unittest import TestCase
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+import main
+from models.pool import AsyncConnectionPool
+from tests.fakes import FakeAsyncConnection, clear_in_memory_cache
+from tests.synthetic import generate_revisions
+
+
+class TestRevisionsEndpoint(TestCase):
+    def setUp(self):
+        clear_in_memory_cache()
+        self.rows = generate_revisions(entity_count=2, edits_per_entity=5)
+        self.connection = FakeAsyncConnection(rows=self.rows)
+        self.client = TestClient(main.app)
+        self.client.__enter__()
+
+        async def connect():
+            return self.connection
+
+        main.app.state.pool = AsyncConnectionPool(connect=connect, min_size=0)
+
+    def tearDown(self):
+        self.client.__exit__(None, None, None)
+        clear_in_memory_cache()
+
+    def get(self, **params):
+        return self.client.get("/api/v1/revisions", params=params)
+
+    def test_revisions(self):
+        response = self.get(entities="Q1,Q2")
+        assert response.status_code == 200
+        body = response.json()
+        assert {r["entity_id"] for r in body} == {"Q1", "Q2"}
+        assert sum(u["count"] for r in body for u in r["users"]) == len(self.rows)
+
+    def test_invalid_entity(self):
+        assert self.get(entities="Q1;L1").status_code == 422
+
+    def test_response_is_cached(self):
+        first = self.get(entities="Q1,Q2", start_date="20250801")
+        second = self.get(entities="Q2,Q1", start_date="20250801")
+        assert first.headers["X-Cache"] == "MISS"
+        assert second.headers["X-Cache"] == "HIT"
+        assert first.json() == second.json()
+        assert len(self.connection.executed) == 1
+        stats = self.client.get("/api/v1/stats/cache").json()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+
+    def test_default_window_is_fresh(self):
+        self.get(entities="Q1")
+        _, params = self.connection.executed[0]
+        start_date, end_date = params[-2:]
+        assert end_date > start_date
+        assert end_date.endswith("59")
+
+    def test_ndjson(self):
+        self.connection.by_entity = True
+        with patch("config.NDJSON_CHUNK_SIZE", 1):
+            response = self.get(entities="Q1,Q2", format="ndjson")
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert [line["entity_id"] for line in lines] == ["Q1", "Q2"]
+        # One query per chunk
+        assert len(self.connection.executed) == 2
+
+    def test_invalid_format(self):
+        assert self.get(entities="Q1", format="xml").status_code == 422
+
+    def test_body_without_entity_cache_is_the_same(self):
+        with_models = self.get(entities="Q1,Q2", start_date="20250801")
+        clear_in_memory_cache()
+        main.app.state.entity_cache = None
+        direct = self.get(entities="Q1,Q2", start_date="20250801")
+        assert direct.headers["content-type"] == "application/json"
+        assert direct.content == with_models.content
+
+    def test_openapi_keeps_the_response_model(self):
+        schema = self.client.get("/openapi.json").json()
+        response = schema["paths"]["/api/v1/revisions"]["get"]["responses"]["200"]
+        assert response["content"]["application/json"]["schema"]["items"] == {
+            "$ref": "#/components/schemas/Revisions"
+        }
@@ -0,0 +1,176 @@
+import asyncio
+import random
+from itertools import pairwise
+from unittest import IsolatedAsyncioTestCase, TestCase
+from unittest.mock import patch
+
+import orjson
+
+from models.aggregator import RecordAggregator
+from models.fetcher import Fetcher
+from models.pool import AsyncConnectionPool, ConnectionPool
+from models.revision_row import RevisionRow
+from models.revisions import Revisions
+from models.timing import RequestTimings, _current
+from models.validator import Validator
+from models.window import split_window
+from tests.replica import Replica
+from tests.synthetic import bot_user_ids, generate_revisions
+from tests.test_grouped import normalize
+
+
+def records(rows: list[dict]) -> list[RevisionRow]:
+    return [
+        RevisionRow(**{field: row[field] for field in RevisionRow._fields})
+        for row in rows
+    ]
+
+
+def revisions(body: bytes) -> list[Revisions]:
+    return [Revisions.model_validate(obj) for obj in orjson.loads(body)]
+
+
+class TestSplitWindow(TestCase):
+    def test_ranges_are_contiguous(self):
+        ranges = split_window("20250801000000", "20250831235959", 7 * 86400)
+        assert len(ranges) == 4
+        assert ranges[0][0] == "20250801000000"
+        assert ranges[-1][1] == "20250831235959"
+        for (_, end), (start, _) in pairwise(ranges):
+            assert start > end
+            assert int(start[-2:]) == (int(end[-2:]) + 1) % 60
+
+    def test_short_window_is_one_range(self):
+        window = ("20250801000000", "20250801000000")
+        assert split_window(*window, 86400) == [window]
+        # A little over one partition is not split off into a sliver
+        window = ("20250801000000", "20250808005959")
+        assert split_window(*window, 7 * 86400) == [window]
+
+
+class TestMerge(TestCase):
+    def test_same_as_aggregating_everything(self):
+        rows = records(generate_revisions(entity_count=5, edits_per_entity=200))
+        random.Random(1).shuffle(rows)  # noqa: S311, RUF100
+        parts = [rows[i::3] for i in range(3)]
+        merged = RecordAggregator.merge(
+            RecordAggregator.from_records(part) for part in parts
+        )
+        expected = RecordAggregator.from_records(rows)
+        assert normalize(merged.aggregate()) == normalize(expected.aggregate())
+        # The records of the parts are not kept alive
+        assert merged.records == []
+
+    def test_ties_across_parts_use_rev_id(self):
+        row = generate_revisions(entity_count=1, edits_per_entity=1)[0]
+        rows = records(
+            [
+                {**row, "rev_id": rev_id, "rev_timestamp": "20250801000000"}
+                for rev_id in (5, 3, 9, 7)
+            ]
+        )
+        merged = RecordAggregator.merge(
+            [
+                RecordAggregator.from_records(rows[:2]),
+                RecordAggregator.from_records(rows[2:]),
+            ]
+        )
+        (revisions,) = merged.aggregate()
+        assert revisions.earliest.rev_id == 3
+        assert revisions.latest.rev_id == 9
+        assert revisions.users[0].count == 4
+
+    def test_parts_are_not_modified(self):
+        rows = records(generate_revisions(entity_count=1, edits_per_entity=10))
+        first = RecordAggregator.from_records(rows[:5])
+        RecordAggregator.merge([first, RecordAggregator.from_records(rows[5:])])
+        assert sum(first.pages()[1][2].values()) == 5
+
+
+class TestPartitionedFetch(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.replica = Replica()
+        self.replica.load(
+            generate_revisions(entity_count=5, edits_per_entity=300),
+            bot_ids=bot_user_ids(),
+        )
+
+    async def asyncTearDown(self):
+        self.replica.close()
+
+    async def fetch(self, params, pool, db_mode, partition_days) -> tuple[list, dict]:
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            with (
+                patch("config.DB_MODE", db_mode),
+                patch("config.PARTITION_DAYS", partition_days),
+            ):
+                result = await Fetcher(params=params, pool=pool).fetch()
+        finally:
+            _current.reset(token)
+        return result, timings.counts
+
+    async def check_parity(self, pool, db_mode):
+        for options in ({}, {"no_bots": True}, {"only_unpatrolled": True}):
+            params = Validator(
+                entities=["Q1", "Q2", "Q4"],
+                start_date="20250801",
+                end_date="20250807",
+                **options,
+            )
+            expected, counts = await self.fetch(params, pool, db_mode, 0)
+            assert "partitions" not in counts
+            result, counts = await self.fetch(params, pool, db_mode, 1)
+            assert counts["partitions"] == 7
+            assert result
+            assert normalize(result) == normalize(expected)
+
+    async def test_parity_async(self):
+        pool = AsyncConnectionPool(connect=self.replica.connect_async, min_size=0)
+        try:
+            await self.check_parity(pool, "async")
+        finally:
+            await pool.close()
+
+    async def test_parity_sync(self):
+        pool = ConnectionPool(connect=self.replica.connect, min_size=0)
+        try:
+            await self.check_parity(pool, "sync")
+        finally:
+            pool.close()
+
+    async def test_fetch_json(self):
+        pool = AsyncConnectionPool(connect=self.replica.connect_async, min_size=0)
+        params = Validator(entities=["Q3"], start_date="20250801", end_date="20250807")
+        try:
+            with patch("config.PARTITION_DAYS", 0):
+                expected = await Fetcher(params=params, pool=pool).fetch_json()
+            with patch("config.PARTITION_DAYS", 2):
+                result = await Fetcher(params=params, pool=pool).fetch_json()
+        finally:
+            await pool.close()
+        # Partitions are merged as they arrive, so the user order varies
+        assert normalize(revisions(result)) == normalize(revisions(expected))
+
+    async def test_failed_partition_cancels_the_others(self):
+        cancelled = []
+
+        async def fetch_records(self, params):
+            if params.start_date.startswith("20250802"):
+                raise RuntimeError("replica went away")
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(params.start_date)
+                raise
+
+        params = Validator(entities=["Q1"], start_date="20250801", end_date="20250804")
+        with (
+            patch("config.PARTITION_DAYS", 1),
+            patch.object(Fetcher, "fetch_records", fetch_records),
+            self.assertRaises(RuntimeError),
+        ):
+            await Fetcher(params=params, pool=None).fetch()
+        await asyncio.sleep(0)
+        assert len(cancelled) == 3
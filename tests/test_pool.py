@@ -0,0 +1,181 @@
+import asyncio
+import os
+import threading
+import time
+from typing import ClassVar
+from unittest import IsolatedAsyncioTestCase, TestCase
+from unittest.mock import AsyncMock, patch
+
+import pymysql
+
+from models.exceptions import PoolTimeoutError
+from models.pool import AsyncConnectionPool, ConnectionPool
+from models.read import open_replica_connection, open_replica_connection_async
+from tests.fakes import FakeAsyncConnection, FakeConnection
+
+
+class TestConnectionPool(TestCase):
+    def setUp(self):
+        self.connections = []
+
+    def connect(self):
+        connection = FakeConnection()
+        self.connections.append(connection)
+        return connection
+
+    def pool(self, **kwargs):
+        return ConnectionPool(connect=self.connect, **kwargs)
+
+    def test_open_prefills_min_size(self):
+        pool = self.pool(min_size=2, max_size=4)
+        pool.open()
+        stats = pool.stats()
+        assert stats.size == 2
+        assert stats.idle == 2
+        assert len(self.connections) == 2
+
+    def test_connection_is_reused(self):
+        pool = self.pool(min_size=0)
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            pass
+        assert first is second
+        assert pool.stats().created == 1
+        assert pool.stats().checkouts == 2
+
+    def test_recycle_after_max_uses(self):
+        pool = self.pool(min_size=0, max_uses=2)
+        for _ in range(3):
+            with pool.connection():
+                pass
+        assert len(self.connections) == 2
+        assert self.connections[0].closed
+        assert pool.stats().recycled == 1
+
+    def test_recycle_after_max_lifetime(self):
+        pool = self.pool(min_size=0, max_lifetime=0.01)
+        with pool.connection():
+            pass
+        time.sleep(0.02)
+        with pool.connection():
+            pass
+        assert len(self.connections) == 2
+        assert self.connections[0].closed
+
+    def test_failed_ping_replaces_connection(self):
+        pool = self.pool(min_size=1)
+        pool.open()
+        self.connections[0].healthy = False
+        with pool.connection() as connection:
+            assert connection is self.connections[1]
+        assert pool.stats().health_check_failures == 1
+        assert pool.stats().size == 1
+
+    def test_timeout_when_exhausted(self):
+        pool = self.pool(min_size=0, max_size=1, timeout=0.05)
+        pooled = pool.acquire()
+        with self.assertRaises(PoolTimeoutError):
+            pool.acquire()
+        pool.release(pooled)
+        assert pool.stats().timeouts == 1
+
+    def test_waiter_gets_released_connection(self):
+        pool = self.pool(min_size=0, max_size=1, timeout=1)
+        pooled = pool.acquire()
+        threading.Timer(0.05, pool.release, args=(pooled,)).start()
+        second = pool.acquire()
+        assert second is pooled
+        stats = pool.stats()
+        assert stats.waits == 1
+        assert stats.wait_seconds_max > 0
+
+    def test_discard_on_operational_error(self):
+        pool = self.pool(min_size=0)
+        with self.assertRaises(pymysql.err.OperationalError):  # noqa: SIM117
+            with pool.connection():
+                raise pymysql.err.OperationalError(2013, "Lost connection")
+        assert self.connections[0].closed
+        assert pool.stats().size == 0
+
+    def test_close(self):
+        pool = self.pool(min_size=2)
+        pool.open()
+        pool.close()
+        assert all(c.closed for c in self.connections)
+        with self.assertRaises(PoolTimeoutError):
+            pool.acquire()
+
+
+class TestAsyncConnectionPool(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.connections = []
+
+    async def connect(self):
+        connection = FakeAsyncConnection()
+        self.connections.append(connection)
+        return connection
+
+    async def test_connection_is_reused(self):
+        pool = AsyncConnectionPool(connect=self.connect, min_size=1)
+        await pool.open()
+        async with pool.connection() as first:
+            pass
+        async with pool.connection() as second:
+            pass
+        assert first is second
+        assert pool.stats().created == 1
+
+    async def test_failed_ping_replaces_connection(self):
+        pool = AsyncConnectionPool(connect=self.connect, min_size=1)
+        await pool.open()
+        self.connections[0].healthy = False
+        async with pool.connection() as connection:
+            assert connection is self.connections[1]
+        assert pool.stats().health_check_failures == 1
+
+    async def test_waiters_share_max_size(self):
+        pool = AsyncConnectionPool(connect=self.connect, min_size=0, max_size=2)
+
+        async def borrow():
+            async with pool.connection():
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(borrow() for _ in range(10)))
+        stats = pool.stats()
+        assert stats.created == 2
+        assert stats.checkouts == 10
+        assert stats.waits > 0
+
+    async def test_timeout_when_exhausted(self):
+        pool = AsyncConnectionPool(
+            connect=self.connect, min_size=0, max_size=1, timeout=0.05
+        )
+        pooled = await pool.acquire()
+        with self.assertRaises(PoolTimeoutError):
+            await pool.acquire()
+        await pool.release(pooled)
+        assert pool.stats().timeouts == 1
+
+
+class TestReplicaConnection(IsolatedAsyncioTestCase):
+    """Pooled connections must not keep a transaction, and with it a
+    snapshot of the replica, open between checkouts"""
+
+    env: ClassVar[dict[str, str]] = {
+        "TOOL_REPLICA_USER": "user",
+        "TOOL_REPLICA_PASSWORD": "password",
+    }
+
+    def test_autocommit(self):
+        with patch.dict(os.environ, self.env), patch("pymysql.connect") as connect:
+            open_replica_connection()
+        assert connect.call_args.kwargs["autocommit"] is True
+
+    async def test_autocommit_async(self):
+        with (
+            patch.dict(os.environ, self.env),
+            patch("aiomysql.connect", new_callable=AsyncMock) as connect,
+        ):
+            await open_replica_connection_async()
+        assert connect.call_args.kwargs["autocommit"] is True
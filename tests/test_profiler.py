@@ -0,0 +1,75 @@
+import threading
+import time
+from unittest import TestCase
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+import main
+from models.pool import AsyncConnectionPool
+from models.profiler import SamplingProfiler
+from tests.fakes import FakeAsyncConnection
+from tests.synthetic import generate_revisions
+
+
+def busy_loop(seconds: float):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+class TestSamplingProfiler(TestCase):
+    def test_samples_the_thread(self):
+        profiler = SamplingProfiler(thread_id=threading.get_ident(), interval=0.001)
+        profiler.start()
+        busy_loop(0.1)
+        profiler.stop()
+        assert profiler.samples > 0
+        stack, count = profiler.folded().splitlines()[0].rsplit(" ", 1)
+        assert stack.startswith("MainThread;")
+        assert "busy_loop (test_profiler.py" in stack
+        assert int(count) > 0
+
+
+class TestProfilerMiddleware(TestCase):
+    def setUp(self):
+        rows = generate_revisions(entity_count=2, edits_per_entity=5)
+        self.client = TestClient(main.app)
+        self.client.__enter__()
+
+        async def connect():
+            return FakeAsyncConnection(rows=rows)
+
+        main.app.state.pool = AsyncConnectionPool(connect=connect, min_size=0)
+        main.app.state.response_cache = None
+
+    def tearDown(self):
+        self.client.__exit__(None, None, None)
+
+    def get(self, **headers):
+        return self.client.get(
+            "/api/v1/revisions", params={"entities": "Q1,Q2"}, headers=headers
+        )
+
+    def test_returns_folded_stacks(self):
+        with (
+            patch("config.ADMIN_TOKEN", "secret"),
+            patch("config.PROFILER_INTERVAL", 0.0005),
+        ):
+            response = self.get(**{"X-Profile": "1", "X-Admin-Token": "secret"})
+        assert response.status_code == 200
+        assert response.headers["X-Profiled-Status"] == "200"
+        assert response.headers["content-type"].startswith("text/plain")
+        for line in response.text.splitlines():
+            stack, count = line.rsplit(" ", 1)
+            assert ";" in stack
+            assert int(count) > 0
+
+    def test_needs_the_admin_token(self):
+        with patch("config.ADMIN_TOKEN", "secret"):
+            assert self.get(**{"X-Profile": "1"}).status_code == 403
+
+    def test_other_requests_pass_through(self):
+        response = self.get()
+        assert response.status_code == 200
+        assert response.json()
@@ -0,0 +1,155 @@
+from unittest import IsolatedAsyncioTestCase, TestCase
+from unittest.mock import patch
+
+import httpx
+import orjson
+from fastapi_cache.backends.inmemory import InMemoryBackend
+from pydantic import ValidationError
+from starlette.datastructures import State
+
+import main
+from models.aggregator import RecordAggregator
+from models.pool import AsyncConnectionPool
+from models.projection import (
+    DEFAULT_FIELDS,
+    Projection,
+    pages_from_aggregator,
+    pages_from_revisions,
+)
+from models.response_cache import ResponseCache
+from models.revision_row import RevisionRow
+from tests.fakes import clear_in_memory_cache
+from tests.replica import Replica
+from tests.synthetic import generate_revisions
+
+PARAMS = {"entities": "Q1,Q2,Q3", "start_date": "20250801", "end_date": "20250807"}
+
+
+def aggregator(rows) -> RecordAggregator:
+    return RecordAggregator.from_records(
+        [RevisionRow(**{f: row[f] for f in RevisionRow._fields}) for row in rows]
+    )
+
+
+def from_columns(body: dict) -> list[dict]:
+    """The objects of a columnar response, with the usernames looked up"""
+    usernames = body["usernames"]
+    objects = []
+    for i in range(body["count"]):
+        obj: dict = {}
+        for field, column in body["columns"].items():
+            value = column[i]
+            if field == "users":
+                value = [
+                    {"user_id": user_id, "username": usernames[name], "count": count}
+                    for user_id, name, count in value
+                ]
+            elif field.endswith(".rev_user_text"):
+                value = usernames[value]
+            if "." in field:
+                edge, name = field.split(".")
+                obj.setdefault(edge, {})[name] = value
+            else:
+                obj[field] = value
+        objects.append(obj)
+    return objects
+
+
+class TestProjection(TestCase):
+    def setUp(self):
+        self.aggregator = aggregator(
+            generate_revisions(entity_count=5, edits_per_entity=40)
+        )
+        self.pages = pages_from_aggregator(self.aggregator.pages())
+
+    def test_fields(self):
+        projection = Projection(fields=["user_count", "latest", "page_id"])
+        assert projection.fields[0] == "page_id"
+        assert projection.fields[1].startswith("latest.")
+        assert projection.fields[-1] == "user_count"
+        assert Projection().fields == list(DEFAULT_FIELDS)
+        with self.assertRaises(ValidationError):
+            Projection(fields=["latest.nope"])
+
+    def test_all_fields_are_revisions(self):
+        full = orjson.loads(self.aggregator.dump_json())
+        assert Projection().objects(self.pages) == full
+        revisions = self.aggregator.aggregate()
+        assert Projection().objects(pages_from_revisions(revisions)) == full
+
+    def test_sparse(self):
+        first, *_ = Projection(
+            fields=["entity_id", "latest.rev_id", "user_count", "edit_count"]
+        ).objects(self.pages)
+        assert set(first) == {"entity_id", "latest", "user_count", "edit_count"}
+        assert set(first["latest"]) == {"rev_id"}
+        full = orjson.loads(self.aggregator.dump_json())[0]
+        assert first["latest"]["rev_id"] == full["latest"]["rev_id"]
+        assert first["user_count"] == len(full["users"])
+        assert first["edit_count"] == sum(u["count"] for u in full["users"])
+
+    def test_columns(self):
+        body = Projection(columnar=True).columns(self.pages)
+        assert from_columns(body) == orjson.loads(self.aggregator.dump_json())
+        assert body["count"] == len(self.pages)
+        assert len(body["usernames"]) == len(set(body["usernames"]))
+        projection = Projection(fields=["page_id", "edit_count"], columnar=True)
+        body = orjson.loads(projection.dump_json(self.pages))
+        assert list(body["columns"]) == ["page_id", "edit_count"]
+        assert body["usernames"] == []
+
+    def test_key(self):
+        keys = {
+            Projection(fields=["page_id"]).key,
+            Projection(fields=["page_id"], columnar=True).key,
+            Projection(fields=["entity_id"]).key,
+        }
+        assert len(keys) == 3
+
+
+class TestProjectionEndpoint(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        clear_in_memory_cache()
+        self.replica = Replica()
+        self.replica.load(generate_revisions(entity_count=3, edits_per_entity=50))
+        self.state = State()
+        self.state.pool = AsyncConnectionPool(
+            connect=self.replica.connect_async, min_size=0
+        )
+        self.state.response_cache = ResponseCache(backend=InMemoryBackend())
+
+    async def asyncTearDown(self):
+        await self.state.pool.close()
+        self.replica.close()
+        clear_in_memory_cache()
+
+    async def get(self, **params) -> httpx.Response:
+        transport = httpx.ASGITransport(app=main.app)
+        with patch.object(main.app, "state", self.state):
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://test"
+            ) as client:
+                return await client.get(
+                    "/api/v1/revisions", params={**PARAMS, **params}
+                )
+
+    async def test_formats(self):
+        full = (await self.get()).json()
+        sparse = (await self.get(fields="entity_id,latest.rev_id")).json()
+        assert sparse == [
+            {"entity_id": r["entity_id"], "latest": {"rev_id": r["latest"]["rev_id"]}}
+            for r in full
+        ]
+        columns = (await self.get(format="columns")).json()
+        assert from_columns(columns) == full
+        lines = (await self.get(format="ndjson", fields="page_id")).text.splitlines()
+        assert sorted(orjson.loads(line)["page_id"] for line in lines) == sorted(
+            r["page_id"] for r in full
+        )
+        # Each representation is cached on its own
+        assert (await self.get(format="columns")).headers["X-Cache"] == "HIT"
+        assert (await self.get()).json() == full
+
+    async def test_unknown_field(self):
+        response = await self.get(fields="entity_id,color")
+        assert response.status_code == 422
@@ -0,0 +1,61 @@
+from datetime import datetime, timezone
+from unittest import TestCase
+
+from fastapi_cache.backends.inmemory import InMemoryBackend
+
+from models.response_cache import ResponseCache
+from models.validator import Validator
+from models.window import default_window
+
+
+class TestResponseCache(TestCase):
+    def setUp(self):
+        self.cache = ResponseCache(backend=InMemoryBackend())
+
+    def params(self, **kwargs):
+        values = {
+            "entities": ["Q1", "Q2"],
+            "start_date": "20250101",
+            "end_date": "20250107",
+        }
+        values.update(kwargs)
+        return Validator(**values)
+
+    def test_key_ignores_order(self):
+        assert self.cache.key(self.params(entities=["Q1", "Q2"])) == self.cache.key(
+            self.params(entities=["Q2", "Q1"])
+        )
+
+    def test_key_deduplicates_users(self):
+        assert self.cache.key(
+            self.params(exclude_users=["Bob", "Alice", "Bob"])
+        ) == self.cache.key(self.params(exclude_users=["Alice", "Bob"]))
+
+    def test_key_depends_on_filters(self):
+        assert self.cache.key(self.params()) != self.cache.key(
+            self.params(no_bots=True)
+        )
+        assert self.cache.key(self.params()) != self.cache.key(
+            self.params(end_date="20250108")
+        )
+
+
+class TestDefaultWindow(TestCase):
+    def test_same_bucket_same_window(self):
+        first = default_window(
+            now=datetime(2025, 8, 11, 12, 3, 1, tzinfo=timezone.utc), bucket=60
+        )
+        second = default_window(
+            now=datetime(2025, 8, 11, 12, 3, 59, tzinfo=timezone.utc), bucket=60
+        )
+        assert first == second
+        assert first == ("20250804120300", "20250811120359")
+
+    def test_next_bucket_moves_window(self):
+        first = default_window(
+            now=datetime(2025, 8, 11, 12, 3, 59, tzinfo=timezone.utc), bucket=60
+        )
+        second = default_window(
+            now=datetime(2025, 8, 11, 12, 4, 0, tzinfo=timezone.utc), bucket=60
+        )
+        assert first != second
@@ -0,0 +1,68 @@
+from decimal import Decimal
+from unittest import TestCase
+
+from pymysql.constants import FIELD_TYPE
+
+from models.aggregator import Aggregator, RecordAggregator
+from models.fetcher import revisions_adapter
+from models.read import Read
+from models.revision_row import DECODERS, RevisionRow, decode_decimal
+from models.validator import Validator
+from tests.replica import Replica
+from tests.synthetic import generate_revisions
+
+
+def to_records(rows):
+    return [RevisionRow(**row) for row in rows]
+
+
+class TestDecoders(TestCase):
+    def test_varbinary_becomes_str(self):
+        assert DECODERS[FIELD_TYPE.VAR_STRING](b"MatSuBot") == "MatSuBot"
+        assert DECODERS[FIELD_TYPE.STRING]("Q1") == "Q1"
+
+    def test_integral_decimal_becomes_int(self):
+        assert decode_decimal("1433337") == 1433337
+        assert decode_decimal("1.5") == Decimal("1.5")
+
+
+class TestRecordAggregator(TestCase):
+    def test_same_output_as_aggregator(self):
+        rows = generate_revisions(entity_count=4, edits_per_entity=250)
+        # Force a tie on the timestamp
+        rows[1]["rev_timestamp"] = rows[0]["rev_timestamp"]
+        expected = Aggregator(revisions=rows).aggregate()
+        assert RecordAggregator.from_records(to_records(rows)).aggregate() == expected
+
+    def test_dump_json_matches_the_models(self):
+        rows = generate_revisions(entity_count=3, edits_per_entity=50)
+        rows[0]["rev_user_text"] = 'Zoë "quoted" \\ 東京'
+        aggregator = RecordAggregator.from_records(to_records(rows))
+        assert aggregator.dump_json() == revisions_adapter.dump_json(
+            aggregator.aggregate()
+        )
+
+
+class TestRecordCursor(TestCase):
+    def setUp(self):
+        self.rows = generate_revisions(entity_count=2, edits_per_entity=20)
+        self.replica = Replica()
+        self.replica.load(self.rows)
+        self.read = Read(
+            params=Validator(
+                entities=["Q1", "Q2"], start_date="20250801", end_date="20250808"
+            ),
+            db=self.replica.connect(),
+        )
+
+    def tearDown(self):
+        self.read.close()
+        self.replica.close()
+
+    def test_select_order_matches_record_fields(self):
+        row, *_ = self.read.execute(*self.read.build_query())
+        assert tuple(row) == RevisionRow._fields
+
+    def test_records(self):
+        records = self.read.execute(*self.read.build_query(), records=True)
+        assert sorted(records) == sorted(to_records(self.rows))
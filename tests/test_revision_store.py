@@ -0,0 +1,287 @@
+import asyncio
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+import main
+from models.fetcher import Fetcher
+from models.pool import AsyncConnectionPool, ConnectionPool
+from models.revision_store import ReplicaSource, RevisionIngester, RevisionStore
+from models.validator import Validator
+from tests.fakes import FakeRevisionSource
+from tests.replica import Replica
+from tests.synthetic import bot_user_ids, generate_revisions
+from tests.test_grouped import normalize
+
+NOW = "20250809000000"
+
+
+def revision(rev_id, timestamp, page=1, rc_patrolled=0):
+    return {
+        "rev_id": rev_id,
+        "rev_page": page,
+        "rev_user": 100,
+        "rev_user_text": "User100",
+        "rev_timestamp": timestamp,
+        "entity_id": f"Q{page}",
+        "rc_patrolled": rc_patrolled,
+    }
+
+
+class StoreTestCase(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = self.open_store()
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+    def open_store(self) -> RevisionStore:
+        path = Path(self.directory.name) / "revisions.sqlite"
+        store = RevisionStore(uri=f"file:{path}")
+        store.open()
+        return store
+
+    def count(self, table="revision_compat") -> int:
+        query = f"SELECT COUNT(*) FROM {table}"  # noqa: S608
+        return self.store.db.execute(query).fetchone()[0]
+
+
+class TestRevisionIngester(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.rows = generate_revisions(entity_count=5, edits_per_entity=20)
+        self.source = FakeRevisionSource(self.rows, bot_ids=bot_user_ids())
+
+    def ingester(self, **kwargs) -> RevisionIngester:
+        return RevisionIngester(store=self.store, source=self.source, **kwargs)
+
+    async def test_ingests_everything_in_batches(self):
+        ingester = self.ingester(batch_size=7)
+        assert await ingester.run_once(now=NOW) == len(self.rows)
+        assert self.count() == len(self.rows)
+        assert self.count("user_groups") == len(bot_user_ids())
+        assert self.store.high_water == max(row["rev_id"] for row in self.rows)
+        assert self.store.covered_from == "20250801000000"
+        assert self.store.synced_until == max(row["rev_timestamp"] for row in self.rows)
+
+    async def test_synced_until_follows_the_replica(self):
+        ingester = self.ingester()
+        await ingester.run_once(now=NOW)
+        newest = self.store.synced_until
+        assert newest < NOW
+        # Nothing new, the local clock moving on claims no more
+        await ingester.run_once(now="20250810000000")
+        assert self.store.synced_until == newest
+        assert not self.store.covers("20250802000000", "20250810000000")
+        self.source.add([revision(100000, "20250809120000")])
+        await ingester.run_once(now="20250810000000")
+        assert self.store.synced_until == "20250809120000"
+
+    async def test_tails_from_the_high_water_mark(self):
+        ingester = self.ingester(overlap_ids=0)
+        await ingester.run_once(now=NOW)
+        high_water = self.store.high_water
+        self.source.add([revision(high_water + 1, "20250808120000")])
+        assert await ingester.run_once(now=NOW) == 1
+        assert self.store.high_water == high_water + 1
+
+    async def test_overlap_picks_up_late_commits(self):
+        ingester = self.ingester(overlap_ids=10)
+        self.source.add([revision(1000, "20250808120000")])
+        await ingester.run_once(now=NOW)
+        # Committed after 1000 was read, but with a lower id
+        self.source.add([revision(995, "20250808120100")])
+        await ingester.run_once(now=NOW)
+        assert self.store.db.execute(
+            "SELECT 1 FROM revision_compat WHERE rev_id = 995"
+        ).fetchone()
+
+    async def test_retention(self):
+        ingester = self.ingester(retention_days=3)
+        await ingester.run_once(now=NOW)
+        assert self.store.covered_from == "20250806000000"
+        (oldest,) = self.store.db.execute(
+            "SELECT MIN(rev_timestamp) FROM revision_compat"
+        ).fetchone()
+        assert oldest >= "20250806000000"
+        assert self.count() == sum(
+            row["rev_timestamp"] >= "20250806000000" for row in self.rows
+        )
+        assert self.store.stats().rows_pruned > 0
+
+    async def test_refreshes_patrol_state(self):
+        self.source.add(
+            [
+                revision(1001, "20250808120000", rc_patrolled=0),
+                revision(1002, "20250808120000", rc_patrolled=0),
+            ]
+        )
+        ingester = self.ingester(overlap_ids=0)
+        await ingester.run_once(now=NOW)
+        self.source.rows[1001]["rc_patrolled"] = 2
+        del self.source.rows[1002]
+        await ingester.run_once(now=NOW)
+        patrolled = dict(
+            self.store.db.execute(
+                "SELECT rc_this_oldid, rc_patrolled FROM recentchanges "
+                "WHERE rc_this_oldid IN (1001, 1002)"
+            )
+        )
+        assert patrolled == {1001: 2}
+
+    async def test_recentchanges_row_after_the_revision(self):
+        self.source.add([revision(3000, "20250808120000", rc_patrolled=None)])
+        ingester = self.ingester(overlap_ids=0)
+        await ingester.run_once(now=NOW)
+        assert self.count("rc_pending") > 0
+        # The recentchanges row is written after the revision was read
+        self.source.rows[3000]["rc_patrolled"] = 0
+        await ingester.run_once(now=NOW)
+        assert self.store.db.execute(
+            "SELECT rc_patrolled FROM recentchanges WHERE rc_this_oldid = 3000"
+        ).fetchone() == (0,)
+        assert not self.store.db.execute(
+            "SELECT 1 FROM rc_pending WHERE rev_id = 3000"
+        ).fetchone()
+        params = Validator(
+            entities=["Q1"],
+            start_date="20250808",
+            end_date="20250808235959",
+            only_unpatrolled=True,
+        )
+        pool = AsyncConnectionPool(connect=self.store.connect_async, min_size=0)
+        try:
+            (result,) = await Fetcher(params=params, pool=pool).fetch()
+        finally:
+            await pool.close()
+        assert result.latest.rev_id == 3000
+
+    async def test_patrol_state_is_refreshed_in_pages(self):
+        self.source.add(
+            [revision(2000 + i, "20250808120000", rc_patrolled=0) for i in range(5)]
+        )
+        ingester = self.ingester(patrol_batch_size=2)
+        await ingester.run_once(now=NOW)
+        for i in range(5):
+            self.source.rows[2000 + i]["rc_patrolled"] = 2
+        unpatrolled = len(self.store.unpatrolled_rev_ids(0, 1000))
+        # Two per cycle, each continuing above the previous one
+        for _ in range(unpatrolled // 2 + 1):
+            await ingester.run_once(now=NOW)
+        assert not self.store.db.execute(
+            "SELECT 1 FROM recentchanges "
+            "WHERE rc_this_oldid >= 2000 AND rc_patrolled = 0"
+        ).fetchone()
+
+    async def test_state_survives_reopening(self):
+        await self.ingester().run_once(now=NOW)
+        high_water = self.store.high_water
+        self.store.close()
+        self.store = self.open_store()
+        assert self.store.high_water == high_water
+        assert self.store.covers("20250802000000", self.store.synced_until)
+
+    async def test_background_task_counts_failures(self):
+        async def fail(*args):
+            raise ValueError("malformed row")
+
+        self.source.first_rev_id = fail
+        ingester = self.ingester(interval=0.01)
+        with self.assertLogs("models.revision_store", level="ERROR"):
+            ingester.start()
+            await asyncio.sleep(0.05)
+            await ingester.stop()
+        stats = self.store.stats()
+        assert stats.failures >= 2
+        assert stats.cycles == 0
+
+    async def test_same_result_as_the_replica(self):
+        await self.ingester().run_once(now=NOW)
+        replica = Replica()
+        replica.load(self.rows, bot_ids=bot_user_ids())
+        replica_pool = AsyncConnectionPool(connect=replica.connect_async, min_size=0)
+        store_pool = AsyncConnectionPool(connect=self.store.connect_async, min_size=0)
+        try:
+            for options in ({}, {"no_bots": True}, {"only_unpatrolled": True}):
+                params = Validator(
+                    entities=["Q1", "Q3", "Q5"],
+                    start_date="20250802",
+                    end_date="20250806",
+                    **options,
+                )
+                expected = await Fetcher(params=params, pool=replica_pool).fetch()
+                result = await Fetcher(params=params, pool=store_pool).fetch()
+                assert result
+                assert normalize(result) == normalize(expected)
+        finally:
+            await replica_pool.close()
+            await store_pool.close()
+            replica.close()
+
+
+class TestCoverage(TestCase):
+    def test_covers(self):
+        store = RevisionStore(
+            uri="file:unused", covered_from="20250801000000", synced_until=NOW
+        )
+        assert store.covers("20250801000000", NOW)
+        assert store.covers("20250805000000", "20250809000100")
+        assert not store.covers("20250731235959", NOW)
+        assert not store.covers("20250805000000", "20250809000101")
+
+    def test_empty_store_covers_nothing(self):
+        assert not RevisionStore(uri="file:unused").covers("20250801", NOW)
+
+
+class TestReplicaSource(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.rows = generate_revisions(entity_count=3, edits_per_entity=10)
+        self.replica = Replica()
+        self.replica.load(self.rows, bot_ids=bot_user_ids())
+
+    def tearDown(self):
+        self.replica.close()
+
+    async def check(self, pool):
+        source = ReplicaSource(pool=pool)
+        rows = await source.fetch_after(5, limit=10)
+        assert [row["rev_id"] for row in rows] == list(range(6, 16))
+        assert rows[0] == {**self.rows[5], "page_namespace": 0}
+        assert await source.first_rev_id("20250801000000") == 1
+        assert await source.first_rev_id("20260101000000") is None
+        patrolled = await source.fetch_patrolled([1, 2, 999])
+        assert patrolled[999] is None
+        assert patrolled[1] == self.rows[0]["rc_patrolled"]
+        assert await source.fetch_bot_ids() == bot_user_ids()
+
+    async def test_sync_pool(self):
+        pool = ConnectionPool(connect=self.replica.connect, min_size=0)
+        try:
+            await self.check(pool)
+        finally:
+            pool.close()
+
+    async def test_async_pool(self):
+        pool = AsyncConnectionPool(connect=self.replica.connect_async, min_size=0)
+        try:
+            await self.check(pool)
+        finally:
+            await pool.close()
+
+
+class TestStoreSelection(StoreTestCase):
+    def test_make_fetcher_prefers_the_store_when_it_covers(self):
+        self.store.mark_synced(covered_from="20250801000000", synced_until=NOW)
+        state = SimpleNamespace(
+            pool=object(), store_pool=object(), revision_store=self.store
+        )
+        request = SimpleNamespace(app=SimpleNamespace(state=state))
+        covered = Validator(entities=["Q1"], start_date="20250802", end_date="20250803")
+        older = Validator(entities=["Q1"], start_date="20250701", end_date="20250803")
+        assert main.make_fetcher(request, covered).pool is state.store_pool
+        assert main.make_fetcher(request, older).pool is state.pool
+        stats = self.store.stats()
+        assert (stats.served, stats.fallbacks) == (1, 1)
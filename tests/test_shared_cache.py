@@ -0,0 +1,138 @@
+import tempfile
+from pathlib import Path
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+import httpx
+from starlette.datastructures import State
+
+import main
+from models.aggregator import RecordAggregator
+from models.revision_row import RevisionRow
+from models.shared_cache import SharedCacheBackend
+from tests.synthetic import generate_revisions
+
+
+def response_body() -> bytes:
+    rows = generate_revisions(entity_count=5, edits_per_entity=100)
+    return RecordAggregator.from_records(
+        [
+            RevisionRow(**{field: row[field] for field in RevisionRow._fields})
+            for row in rows
+        ]
+    ).dump_json()
+
+
+class TestSharedCacheBackend(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = str(Path(self.directory.name) / "cache.sqlite")
+        self.backends = []
+
+    def tearDown(self):
+        for backend in self.backends:
+            backend.close()
+        self.directory.cleanup()
+
+    def backend(self, **kwargs) -> SharedCacheBackend:
+        backend = SharedCacheBackend(path=self.path, **kwargs)
+        backend.open()
+        self.backends.append(backend)
+        return backend
+
+    async def test_workers_share_entries(self):
+        first, second = self.backend(), self.backend()
+        await first.set("revisions:a", b"body", expire=60)
+        assert await second.get("revisions:a") == b"body"
+        ttl, value = await second.get_with_ttl("revisions:a")
+        assert value == b"body"
+        assert 58 <= ttl <= 60
+        assert await second.get("revisions:b") is None
+
+    async def test_expiry(self):
+        backend = self.backend()
+        await backend.set("a", b"body", expire=60)
+        with patch("time.time", return_value=10**10):
+            assert await backend.get("a") is None
+        await backend.set("forever", b"body")
+        assert await backend.get_with_ttl("forever") == (-1, b"body")
+
+    async def test_responses_are_compressed(self):
+        backend = self.backend()
+        body = response_body()
+        await backend.set("a", body, expire=60)
+        assert await backend.get("a") == body
+        stats = backend.stats()
+        assert stats.entries == 1
+        assert stats.bytes * 3 < len(body)
+        assert stats.compression_ratio > 3
+
+    async def test_evicts_least_recently_used(self):
+        backend = self.backend(max_bytes=1000, compression_level=0, touch_interval=0)
+        for i in range(4):
+            await backend.set(f"k{i}", bytes(200), expire=60)
+        # k0 is used again, so k1 is the least recently used
+        assert await backend.get("k0") is not None
+        await backend.set("k4", bytes(200), expire=60)
+        assert await backend.get("k1") is None
+        assert await backend.get("k0") is not None
+        stats = backend.stats()
+        assert stats.bytes <= 1000
+        assert stats.evictions >= 1
+        assert stats.entries == 4
+
+    async def test_expired_entries_are_evicted_first(self):
+        backend = self.backend(max_bytes=1000, compression_level=0)
+        await backend.set("fresh", bytes(400), expire=60)
+        with patch("time.time", return_value=0):
+            await backend.set("stale", bytes(400), expire=1)
+        await backend.set("new", bytes(400), expire=60)
+        assert await backend.get("fresh") is not None
+        assert await backend.get("new") is not None
+        assert backend.stats().entries == 2
+
+    async def test_size_survives_replacing_entries(self):
+        backend = self.backend(compression_level=0)
+        for size in (100, 300, 200):
+            await backend.set("a", bytes(size), expire=60)
+        assert backend.stats().bytes < 300
+        assert await backend.clear(namespace="a") == 1
+        assert backend.stats().bytes == 0
+
+    async def test_too_large_values_are_not_cached(self):
+        backend = self.backend(max_bytes=100, compression_level=0)
+        await backend.set("a", bytes(500), expire=60)
+        assert await backend.get("a") is None
+
+    async def test_busy_file_is_a_miss(self):
+        backend = self.backend(busy_timeout=0.01)
+        other = self.backend()
+        await backend.set("a", b"body", expire=60)
+        other.db.execute("BEGIN EXCLUSIVE")
+        try:
+            await backend.set("b", b"body", expire=60)
+        finally:
+            other.db.execute("ROLLBACK")
+        assert backend.stats().busy == 1
+        assert await backend.get("b") is None
+
+
+class TestSharedCacheEndpoint(IsolatedAsyncioTestCase):
+    async def test_stats(self):
+        with tempfile.TemporaryDirectory() as directory:
+            backend = SharedCacheBackend(path=str(Path(directory) / "cache.sqlite"))
+            backend.open()
+            await backend.set("a", b"body", expire=60)
+            state = State()
+            state.shared_cache = backend
+            transport = httpx.ASGITransport(app=main.app)
+            try:
+                with patch.object(main.app, "state", state):
+                    async with httpx.AsyncClient(
+                        transport=transport, base_url="http://test"
+                    ) as client:
+                        stats = (await client.get("/api/v1/stats/shared-cache")).json()
+            finally:
+                backend.close()
+        assert stats["entries"] == 1
+        assert stats["sets"] == 1
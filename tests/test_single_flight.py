@@ -0,0 +1,123 @@
+import asyncio
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+import httpx
+from starlette.datastructures import State
+
+import main
+from models.pool import AsyncConnectionPool
+from models.single_flight import SingleFlight
+from tests.fakes import FakeAsyncConnection
+from tests.synthetic import generate_revisions
+
+
+class TestSingleFlight(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def call(self):
+        self.calls += 1
+        await self.release.wait()
+        return self.calls
+
+    async def test_concurrent_calls_share_one_execution(self):
+        flight = SingleFlight()
+        tasks = [asyncio.create_task(flight.run("k", self.call)) for _ in range(5)]
+        await asyncio.sleep(0)
+        assert flight.stats().in_flight == 1
+        self.release.set()
+        assert await asyncio.gather(*tasks) == [1] * 5
+        assert self.calls == 1
+        stats = flight.stats()
+        assert (stats.leaders, stats.coalesced, stats.max_waiters) == (1, 4, 4)
+        assert stats.in_flight == 0
+
+    async def test_nothing_is_kept_afterwards(self):
+        flight = SingleFlight()
+        self.release.set()
+        assert await flight.run("k", self.call) == 1
+        assert await flight.run("k", self.call) == 2
+
+    async def test_keys_run_separately(self):
+        flight = SingleFlight()
+        tasks = [asyncio.create_task(flight.run(key, self.call)) for key in "ab"]
+        await asyncio.sleep(0)
+        self.release.set()
+        await asyncio.gather(*tasks)
+        assert self.calls == 2
+
+    async def test_errors_are_shared(self):
+        async def fail():
+            await self.release.wait()
+            raise ValueError("boom")
+
+        flight = SingleFlight()
+        tasks = [asyncio.create_task(flight.run("k", fail)) for _ in range(3)]
+        await asyncio.sleep(0)
+        self.release.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+
+    async def test_a_cancelled_caller_does_not_cancel_the_others(self):
+        flight = SingleFlight()
+        first = asyncio.create_task(flight.run("k", self.call))
+        second = asyncio.create_task(flight.run("k", self.call))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        self.release.set()
+        assert await second == 1
+        assert first.cancelled()
+
+    async def test_the_call_is_cancelled_without_callers(self):
+        started = []
+
+        async def call():
+            started.append(asyncio.current_task())
+            return await self.call()
+
+        flight = SingleFlight()
+        caller = asyncio.create_task(flight.run("k", call))
+        while not started:
+            await asyncio.sleep(0)
+        (shared,) = started
+        caller.cancel()
+        await asyncio.gather(caller, return_exceptions=True)
+        await asyncio.gather(shared, return_exceptions=True)
+        assert shared.cancelled()
+
+
+class TestCoalescedEndpoint(IsolatedAsyncioTestCase):
+    async def test_identical_requests_run_one_query(self):
+        connection = FakeAsyncConnection(
+            rows=generate_revisions(entity_count=2, edits_per_entity=5), latency=0.05
+        )
+
+        async def connect():
+            return connection
+
+        state = State()
+        state.pool = AsyncConnectionPool(connect=connect, min_size=0)
+        state.single_flight = SingleFlight()
+        transport = httpx.ASGITransport(app=main.app)
+        with patch.object(main.app, "state", state):
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://test"
+            ) as client:
+                responses = await asyncio.gather(
+                    *[
+                        client.get(
+                            "/api/v1/revisions",
+                            params={"entities": entities, "start_date": "20250801"},
+                        )
+                        for entities in ("Q1,Q2", "Q2,Q1", "Q1,Q2", "Q1")
+                    ]
+                )
+        assert all(response.status_code == 200 for response in responses)
+        assert responses[0].content == responses[1].content == responses[2].content
+        # Q1,Q2 in any order share one query, Q1 has its own
+        assert len(connection.executed) == 2
+        stats = state.single_flight.stats()
+        assert (stats.leaders, stats.coalesced) == (2, 2)
@@ -0,0 +1,141 @@
+from unittest import IsolatedAsyncioTestCase, TestCase
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+import main
+from models.fetcher import Fetcher
+from models.pool import AsyncConnectionPool, ConnectionPool
+from models.read import Read
+from models.slow_query_log import SlowQueryLog, sql_shape
+from models.validator import Validator
+from tests.replica import Replica
+from tests.synthetic import generate_revisions
+
+
+def params(**kwargs) -> Validator:
+    return Validator(
+        entities=["Q1", "Q2"],
+        start_date="20250801",
+        end_date="20250808",
+        **kwargs,
+    )
+
+
+class TestSqlShape(TestCase):
+    def test_in_lists_are_collapsed(self):
+        sql, _ = Read(params=params(exclude_users=["A", "B", "C"])).build_query()
+        shape = sql_shape(sql)
+        assert "%s,%s" not in shape
+        assert "rev_user_text NOT IN (...)" in shape
+        assert "  " not in shape
+        other, _ = Read(params=params(exclude_users=["A"])).build_query()
+        assert sql_shape(other) == shape
+
+
+class TestSlowQueryLog(TestCase):
+    def test_ring_buffer(self):
+        log = SlowQueryLog(threshold=0.5, max_entries=2)
+        for seconds in (1.0, 2.0, 3.0):
+            log.record(
+                sql="SELECT 1", seconds=seconds, cardinalities={}, rows=0, explain=None
+            )
+        assert [entry.seconds for entry in log.entries()] == [3.0, 2.0]
+        assert log.is_slow(0.5)
+        assert not log.is_slow(0.4)
+
+
+class TestSlowQueries(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.replica = Replica()
+        self.replica.load(generate_revisions(entity_count=3, edits_per_entity=10))
+
+    def tearDown(self):
+        self.replica.close()
+
+    def check(self, log: SlowQueryLog):
+        (entry,) = log.entries()
+        assert entry.shape.startswith("SELECT")
+        assert entry.rows == 20
+        assert entry.cardinalities == {
+            "entities": 2,
+            "exclude_users": 1,
+            "bot_ids": 0,
+            "params": 5,
+        }
+        assert entry.explain
+
+    async def test_async(self):
+        log = SlowQueryLog(threshold=0)
+        pool = AsyncConnectionPool(connect=self.replica.connect_async, min_size=0)
+        try:
+            await Fetcher(
+                params=params(exclude_users=["Nobody"]), pool=pool, slow_query_log=log
+            ).fetch()
+        finally:
+            await pool.close()
+        self.check(log)
+
+    async def test_sync(self):
+        log = SlowQueryLog(threshold=0)
+        pool = ConnectionPool(connect=self.replica.connect, min_size=0)
+        try:
+            with patch("config.DB_MODE", "sync"):
+                await Fetcher(
+                    params=params(exclude_users=["Nobody"]),
+                    pool=pool,
+                    slow_query_log=log,
+                ).fetch()
+        finally:
+            pool.close()
+        self.check(log)
+
+    async def test_streamed(self):
+        log = SlowQueryLog(threshold=0)
+        pool = AsyncConnectionPool(connect=self.replica.connect_async, min_size=0)
+        try:
+            with patch("config.FETCH_STRATEGY", "stream"):
+                await Fetcher(
+                    params=params(exclude_users=["Nobody"]),
+                    pool=pool,
+                    slow_query_log=log,
+                ).fetch()
+        finally:
+            await pool.close()
+        self.check(log)
+
+    async def test_fast_queries_are_not_recorded(self):
+        log = SlowQueryLog(threshold=60)
+        pool = AsyncConnectionPool(connect=self.replica.connect_async, min_size=0)
+        try:
+            await Fetcher(params=params(), pool=pool, slow_query_log=log).fetch()
+        finally:
+            await pool.close()
+        assert log.entries() == []
+
+
+class TestSlowQueriesEndpoint(TestCase):
+    def setUp(self):
+        self.client = TestClient(main.app)
+        self.client.__enter__()
+        log = SlowQueryLog(threshold=0)
+        log.record(sql="SELECT  1", seconds=2.0, cardinalities={}, rows=1, explain=None)
+        main.app.state.slow_query_log = log
+
+    def tearDown(self):
+        self.client.__exit__(None, None, None)
+
+    def get(self, **headers):
+        return self.client.get("/api/v1/admin/slow-queries", headers=headers)
+
+    def test_needs_the_admin_token(self):
+        with patch("config.ADMIN_TOKEN", "secret"):
+            assert self.get().status_code == 403
+            assert self.get(**{"X-Admin-Token": "wrong"}).status_code == 403
+            response = self.get(**{"X-Admin-Token": "secret"})
+        assert response.status_code == 200
+        assert response.json()[0]["shape"] == "SELECT 1"
+
+    def test_disabled_without_admin_token(self):
+        with patch("config.ADMIN_TOKEN", None):
+            assert self.get(**{"X-Admin-Token": ""}).status_code == 403
@@ -0,0 +1,89 @@
+from unittest import IsolatedAsyncioTestCase, TestCase
+from unittest.mock import patch
+
+from models.aggregator import Aggregator, StreamingAggregator
+from models.fetcher import Fetcher
+from models.pool import AsyncConnectionPool, ConnectionPool
+from models.read import Read
+from models.validator import Validator
+from tests.fakes import FakeConnection
+from tests.replica import Replica
+from tests.synthetic import generate_revisions
+from tests.test_grouped import normalize
+
+
+class TestStreamingAggregator(TestCase):
+    def test_same_output_as_aggregator(self):
+        rows = generate_revisions(entity_count=4, edits_per_entity=250)
+        expected = Aggregator(revisions=rows).aggregate()
+        aggregator = StreamingAggregator()
+        for start in range(0, len(rows), 64):
+            aggregator.consume(rows[start : start + 64])
+        assert aggregator.aggregate() == expected
+
+    def test_consumes_an_iterator(self):
+        rows = generate_revisions(entity_count=2, edits_per_entity=10)
+        result = StreamingAggregator().consume(iter(rows)).aggregate()
+        assert sum(u.count for r in result for u in r.users) == len(rows)
+
+
+class TestIterRevisions(TestCase):
+    def setUp(self):
+        self.rows = generate_revisions(entity_count=2, edits_per_entity=10)
+        self.pool = ConnectionPool(
+            connect=lambda: FakeConnection(rows=self.rows), min_size=0
+        )
+        self.params = Validator(
+            entities=["Q1", "Q2"], start_date="20250801", end_date="20250808"
+        )
+
+    def test_yields_all_rows_in_batches(self):
+        read = Read(params=self.params, pool=self.pool)
+        assert list(read.iter_revisions(batch_size=3)) == self.rows
+        read.close()
+        assert self.pool.stats().idle == 1
+
+    def test_abandoned_iterator_discards_connection(self):
+        read = Read(params=self.params, pool=self.pool)
+        iterator = read.iter_revisions(batch_size=3)
+        next(iterator)
+        iterator.close()
+        read.close()
+        stats = self.pool.stats()
+        assert stats.size == 0
+        assert stats.closed == 1
+
+
+class TestStreamStrategy(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.replica = Replica()
+        self.replica.load(generate_revisions(entity_count=5, edits_per_entity=300))
+        self.params = Validator(
+            entities=["Q1", "Q2", "Q4"], start_date="20250801", end_date="20250805"
+        )
+
+    async def asyncTearDown(self):
+        self.replica.close()
+
+    async def fetch(self, strategy, db_mode, pool):
+        with (
+            patch("config.FETCH_STRATEGY", strategy),
+            patch("config.DB_MODE", db_mode),
+            patch("config.STREAM_BATCH_SIZE", 50),
+        ):
+            return await Fetcher(params=self.params, pool=pool).fetch()
+
+    async def test_parity_async(self):
+        pool = AsyncConnectionPool(connect=self.replica.connect_async, min_size=0)
+        expected = await self.fetch("rows", "async", pool)
+        assert normalize(await self.fetch("stream", "async", pool)) == normalize(
+            expected
+        )
+        assert pool.stats().idle == 1
+
+    async def test_parity_sync(self):
+        pool = ConnectionPool(connect=self.replica.connect, min_size=0)
+        expected = await self.fetch("rows", "sync", pool)
+        assert normalize(await self.fetch("stream", "sync", pool)) == normalize(
+            expected
+        )
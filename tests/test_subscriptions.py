@@ -0,0 +1,220 @@
+import asyncio
+import json
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+import httpx
+import orjson
+from starlette.datastructures import State
+
+import main
+from models.fetcher import Fetcher
+from models.pool import AsyncConnectionPool
+from models.revisions import Revisions
+from models.subscriptions import PoolSource, SubscriptionHub
+from models.validator import Validator
+from tests.fakes import FakeEntitySource
+from tests.replica import Replica
+from tests.synthetic import bot_user_ids, generate_revisions
+from tests.test_grouped import normalize
+
+START = "20250801000000"
+END = "20250807235959"
+
+
+def params(entities, **kwargs) -> Validator:
+    return Validator(entities=entities, start_date=START, end_date=END, **kwargs)
+
+
+def revisions(event: bytes) -> list[Revisions]:
+    return [Revisions(**r) for r in orjson.loads(event)]
+
+
+async def no_bots():
+    return set()
+
+
+class TestSubscriptionHub(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.rows = generate_revisions(entity_count=4, edits_per_entity=50)
+        self.source = FakeEntitySource(self.rows)
+        self.hub = SubscriptionHub(source=self.source, load_bots=no_bots)
+
+    def subscribe(self, entities, **kwargs):
+        subscription = self.hub.subscribe(params(entities, **kwargs))
+        subscription.since = START
+        return subscription
+
+    async def event(self, subscription) -> bytes:
+        event = await subscription.next_event(timeout=0)
+        assert event, "no event"
+        return event
+
+    async def test_one_fetch_for_all_subscribers(self):
+        first = self.subscribe(["Q1", "Q2"])
+        second = self.subscribe(["Q2", "Q3"])
+        self.subscribe(["Q2", "Q3"])
+        assert await self.hub.poll(now=END) == 150
+        assert self.source.fetches == [["Q1", "Q2", "Q3"]]
+        assert {r.entity_id for r in revisions(await self.event(first))} == {
+            "Q1",
+            "Q2",
+        }
+        assert {r.entity_id for r in revisions(await self.event(second))} == {
+            "Q2",
+            "Q3",
+        }
+        stats = self.hub.stats()
+        assert stats.subscribers == 3
+        assert stats.entities == 3
+        assert stats.pushed == 3
+
+    async def test_same_subscriptions_share_the_event(self):
+        first = self.subscribe(["Q1", "Q2"])
+        second = self.subscribe(["Q2", "Q1"])
+        await self.hub.poll(now=END)
+        assert await self.event(first) is await self.event(second)
+
+    async def test_only_new_revisions_are_pushed(self):
+        subscription = self.subscribe(["Q1"])
+        await self.hub.poll(now=END)
+        await self.event(subscription)
+        # The next poll re-reads the overlap but finds nothing new
+        assert await self.hub.poll(now=END) == 0
+        assert await subscription.next_event(timeout=0) == b""
+        self.source.add(
+            [{**self.rows[0], "rev_id": 10_000, "rev_timestamp": "20250807235900"}]
+        )
+        assert await self.hub.poll(now=END) == 1
+        (page,) = revisions(await self.event(subscription))
+        assert page.earliest.rev_id == page.latest.rev_id == 10_000
+        assert page.users[0].count == 1
+
+    async def test_revisions_before_the_subscription_are_not_pushed(self):
+        subscription = self.subscribe(["Q1"])
+        subscription.since = "20250807000000"
+        await self.hub.poll(now=END)
+        for page in revisions(await self.event(subscription)):
+            assert page.earliest.rev_timestamp >= "20250807000000"
+
+    async def test_slow_subscribers_are_dropped(self):
+        self.hub.queue_size = 1
+        slow = self.subscribe(["Q1"])
+        for i in range(2):
+            self.source.add(
+                [{**self.rows[0], "rev_id": 10_000 + i, "rev_timestamp": END}]
+            )
+            await self.hub.poll(now=END)
+        assert slow.closed
+        assert await slow.next_event(timeout=0) is None
+        assert self.hub.stats().dropped == 1
+        assert self.hub.stats().subscribers == 0
+
+    async def test_nothing_to_poll(self):
+        assert await self.hub.poll(now=END) == 0
+        subscription = self.subscribe(["Q1"])
+        self.hub.unsubscribe(subscription)
+        await self.hub.poll(now=END)
+        assert self.source.fetches == []
+
+    async def test_polling_goes_on_after_errors(self):
+        async def fail(*args):
+            raise ValueError("unexpected row")
+
+        self.source.fetch = fail
+        self.hub.interval = 0.01
+        self.subscribe(["Q1"])
+        with self.assertLogs("models.subscriptions", level="ERROR"):
+            self.hub.start()
+            await asyncio.sleep(0.05)
+            await self.hub.stop()
+        assert self.hub.stats().failures >= 2
+
+
+class TestSameAsRevisions(IsolatedAsyncioTestCase):
+    async def test_filters(self):
+        rows = generate_revisions(entity_count=4, edits_per_entity=100)
+        replica = Replica()
+        replica.load(rows, bot_ids=bot_user_ids())
+        pool = AsyncConnectionPool(connect=replica.connect_async, min_size=0)
+
+        async def bots():
+            return bot_user_ids()
+
+        hub = SubscriptionHub(source=PoolSource(pool=pool), load_bots=bots)
+        options = [
+            {},
+            {"no_bots": True},
+            {"only_unpatrolled": True},
+            {"exclude_users": ["User30", "Bot3"]},
+        ]
+        try:
+            subscriptions = []
+            for kwargs in options:
+                subscription = hub.subscribe(params(["Q1", "Q3"], **kwargs))
+                subscription.since = START
+                subscriptions.append(subscription)
+            await hub.poll(now=END)
+            for kwargs, subscription in zip(options, subscriptions, strict=True):
+                expected = await Fetcher(
+                    params=params(["Q1", "Q3"], **kwargs), pool=pool
+                ).fetch()
+                event = await subscription.next_event(timeout=0)
+                assert normalize(revisions(event)) == normalize(expected), kwargs
+        finally:
+            await pool.close()
+            replica.close()
+
+
+class TestSubscribeEndpoint(IsolatedAsyncioTestCase):
+    async def test_stream(self):
+        rows = generate_revisions(entity_count=2, edits_per_entity=5)
+        hub = SubscriptionHub(source=FakeEntitySource(rows), load_bots=no_bots)
+        state = State()
+        state.subscription_hub = hub
+        transport = httpx.ASGITransport(app=main.app)
+
+        async def publish():
+            while not hub.stats().subscribers:
+                await asyncio.sleep(0.001)
+            (subscription,) = hub.subscriptions()
+            subscription.since = START
+            await hub.poll(now=END)
+            while subscription.pending:
+                await asyncio.sleep(0.001)
+            subscription.close()
+
+        with patch.object(main.app, "state", state):
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://test"
+            ) as client:
+                response, _ = await asyncio.gather(
+                    client.get(
+                        "/api/v1/revisions/subscribe", params={"entities": "Q1"}
+                    ),
+                    publish(),
+                )
+                invalid = await client.get(
+                    "/api/v1/revisions/subscribe", params={"entities": "Q1;L1"}
+                )
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = [
+            dict(line.split(": ", 1) for line in block.splitlines())
+            for block in response.text.strip().split("\n\n")
+        ]
+        assert [event["event"] for event in events] == ["subscribed", "revisions"]
+        (page,) = json.loads(events[1]["data"])
+        assert page["entity_id"] == "Q1"
+        assert hub.stats().subscribers == 0
+        assert invalid.status_code == 422
+
+    async def test_disabled(self):
+        transport = httpx.ASGITransport(app=main.app)
+        with patch.object(main.app, "state", State()):
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://test"
+            ) as client:
+                response = await client.get(
+                    "/api/v1/revisions/subscribe", params={"entities": "Q1"}
+                )
+        assert response.status_code == 404
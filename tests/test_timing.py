@@ -0,0 +1,133 @@
+import asyncio
+from unittest import TestCase
+
+from fastapi.concurrency import run_in_threadpool
+from fastapi.testclient import TestClient
+
+import main
+from models.metrics import Histogram, Metrics
+from models.pool import AsyncConnectionPool
+from models.timing import RequestTimings, _current, add_time, count, timed
+from tests.fakes import FakeAsyncConnection, clear_in_memory_cache
+from tests.synthetic import generate_revisions
+
+
+class TestRequestTimings(TestCase):
+    def test_nothing_is_recorded_without_timings(self):
+        with timed("fetch"):
+            pass
+        add_time("pool_wait", 1.0)
+        count("rows", 10)
+        assert _current.get() is None
+
+    def test_records_into_the_current_timings(self):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            with timed("fetch"):
+                pass
+            with timed("fetch"):
+                pass
+            add_time("pool_wait", 0.5)
+            count("rows", 10)
+            count("rows", 5)
+        finally:
+            _current.reset(token)
+        assert set(timings.stages) == {"fetch", "pool_wait"}
+        assert timings.stages["pool_wait"] == 0.5
+        assert timings.counts == {"rows": 15}
+
+    def test_server_timing(self):
+        timings = RequestTimings(stages={"fetch": 0.0125}, counts={"rows": 3})
+        assert timings.server_timing() == 'fetch;dur=12.500, rows;desc="3"'
+
+
+class TestMetrics(TestCase):
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram(buckets=(1, 10))
+        for value in (0.5, 1, 5, 50):
+            histogram.observe(value)
+        assert histogram.render("x") == [
+            'x_bucket{le="1"} 2',
+            'x_bucket{le="10"} 3',
+            'x_bucket{le="+Inf"} 4',
+            "x_sum 56.5",
+            "x_count 4",
+        ]
+
+    def test_render(self):
+        metrics = Metrics()
+        metrics.observe(
+            "/api/v1/revisions",
+            RequestTimings(
+                stages={"fetch": 0.02}, counts={"rows": 50, "response_cache_hits": 1}
+            ),
+        )
+        text = metrics.render()
+        assert 'revisions_requests_total{path="/api/v1/revisions"} 1' in text
+        assert 'revisions_stage_seconds_bucket{stage="fetch",le="0.025"} 1' in text
+        assert 'revisions_rows_bucket{le="100"} 1' in text
+        assert "revisions_response_cache_hits_total 1" in text
+
+
+class TestInstrumentedEndpoint(TestCase):
+    def setUp(self):
+        clear_in_memory_cache()
+        self.rows = generate_revisions(entity_count=2, edits_per_entity=5)
+        self.client = TestClient(main.app)
+        self.client.__enter__()
+
+        async def connect():
+            return FakeAsyncConnection(rows=self.rows)
+
+        main.app.state.pool = AsyncConnectionPool(connect=connect, min_size=0)
+        main.app.state.metrics = Metrics()
+
+    def tearDown(self):
+        del main.app.state.metrics
+        self.client.__exit__(None, None, None)
+        clear_in_memory_cache()
+
+    def test_server_timing_and_metrics(self):
+        response = self.client.get("/api/v1/revisions", params={"entities": "Q1,Q2"})
+        assert response.status_code == 200
+        stages = {
+            entry.split(";")[0].strip()
+            for entry in response.headers["Server-Timing"].split(",")
+        }
+        assert {"split", "validate", "fetch", "total", "pool_wait"} <= stages
+        assert {"aggregate", "serialize", "rows", "entities"} <= stages
+        text = self.client.get("/metrics").text
+        assert 'revisions_stage_seconds_count{stage="fetch"} 1' in text
+        assert "revisions_rows_sum 10" in text
+        assert "revisions_entities_sum 2" in text
+
+    def test_cache_hits_are_counted(self):
+        params = {"entities": "Q1", "start_date": "20250801"}
+        self.client.get("/api/v1/revisions", params=params)
+        self.client.get("/api/v1/revisions", params=params)
+        assert (
+            "revisions_response_cache_hits_total 1" in self.client.get("/metrics").text
+        )
+
+    def test_other_endpoints_are_not_timed(self):
+        response = self.client.get("/api/v1/stats/pool")
+        assert "Server-Timing" not in response.headers
+
+    def test_disabled(self):
+        del main.app.state.metrics
+        response = self.client.get("/api/v1/revisions", params={"entities": "Q1"})
+        assert "Server-Timing" not in response.headers
+        assert self.client.get("/metrics").text == ""
+        main.app.state.metrics = Metrics()
+
+
+class TestThreadpoolPropagation(TestCase):
+    def test_sync_calls_record_into_the_request(self):
+        async def request():
+            timings = RequestTimings()
+            _current.set(timings)
+            await run_in_threadpool(count, "rows", 3)
+            return timings
+
+        assert asyncio.run(request()).counts == {"rows": 3}